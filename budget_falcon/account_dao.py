@@ -1,10 +1,13 @@
 import re
 import os
 import json
-from typing import Any, Set, TypedDict, Optional, Tuple
-from google.auth import load_credentials_from_dict
-from google.auth.credentials import Credentials
-from googleapiclient.discovery import build
+from typing import TYPE_CHECKING, Any, Set, TypedDict, Optional, Tuple
+
+# google-auth・googleapiclientは読み込みに時間がかかるため、コールドスタートを短くするために
+# 最初に使われるまで読み込まない
+if TYPE_CHECKING:
+    from google.auth.credentials import Credentials
+
 
 class AccountDAOParameters(TypedDict):
     SPREADSHEET_ID: str
@@ -37,13 +40,16 @@ class AccountDAO:
     from Google Sheets using Workload Identity Federation for authentication.
     """
     def __init__(self, PARAMS: AccountDAOParameters) -> None:
+        from google.auth import load_credentials_from_dict
+        from googleapiclient.discovery import build
+
         # Workload Identity Federationを使用した認証
         path: str = os.path.join(os.path.dirname(__file__), "config", "wif.json")
         try:
             with open(path, "r", encoding="utf-8") as f:
                 wif_config: dict[str, Any] = json.load(f)
-                credentials_and_project: Tuple[Credentials, Optional[str]] = load_credentials_from_dict(wif_config)
-                self.credentials = credentials_and_project[0]
+                credentials_and_project: Tuple["Credentials", Optional[str]] = load_credentials_from_dict(wif_config)
+                self.credentials: "Credentials" = credentials_and_project[0]
         except FileNotFoundError:
             raise RuntimeError(f"Workload Identity Federation configuration file not found: {path}. "
                              "Please copy wif.json.example to wif.json and configure it.") from None
@@ -56,6 +62,21 @@ class AccountDAO:
         self.spreadsheetId: str = PARAMS["SPREADSHEET_ID"]
         self.spreadsheetRange: str = PARAMS["SPREADSHEET_RANGE"]
 
+    def ensure_credentials(self) -> bool:
+        """
+        Refreshes the credentials only if they have expired.
+
+        Used as the health check when the DAO is reused across warm Lambda invocations.
+
+        Returns:
+            bool: True if the credentials are usable.
+        """
+        if not self.credentials.expired:
+            return True
+        from google.auth.transport.requests import Request
+        self.credentials.refresh(Request())
+        return self.credentials.valid
+
     def group_list(self) -> list[AccountGroup]:
         result: dict[str, Any] = (
             self.sheets.values()
@@ -0,0 +1,297 @@
+import io
+import re
+import csv
+import time
+import random
+import sqlite3
+import threading
+from functools import lru_cache
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional, Sequence
+
+# Athenaの代わりにローカルのSQLite上でCurDAOのクエリを実行する（AWSアカウントなしでの計測・テスト用）
+# boto3のAthenaクライアントのうちCurDAOが使うAPIだけを同じ形式で返す
+
+JST = timezone(timedelta(hours=9))
+
+# 合成するCURのサービス（line_item_product_code）
+SERVICES: list[str] = [
+    "AmazonEC2", "AmazonS3", "AmazonRDS", "AWSLambda", "AmazonCloudFront", "AmazonDynamoDB",
+    "AmazonVPC", "AmazonCloudWatch", "AmazonECS", "AmazonEKS", "AmazonSNS", "AmazonSQS",
+    "AWSGlue", "AmazonAthena", "AmazonRoute53", "AWSKMS", "AmazonElastiCache", "AmazonES",
+    "AWSSecretsManager", "AmazonKinesis",
+]
+
+LINE_ITEM_TYPES: tuple[str, ...] = ("Usage", "DiscountedUsage", "Tax", "Credit")
+
+CUR_COLUMNS: str = """
+    line_item_usage_start_date TEXT,
+    line_item_usage_account_id TEXT,
+    line_item_product_code TEXT,
+    line_item_line_item_type TEXT,
+    line_item_unblended_cost REAL,
+    billing_period TEXT
+"""
+
+
+def account_ids(accounts: int) -> list[str]:
+    """
+    Returns the account IDs used by generate_cur().
+    """
+    return [f"{100000000000 + i:012d}" for i in range(accounts)]
+
+
+def generate_cur(
+    conn: sqlite3.Connection,
+    table: str,
+    accounts: int = 10,
+    services: int = 10,
+    days: int = 30,
+    line_items: int = 4,
+    today: Optional[date] = None,
+    seed: int = 0,
+) -> int:
+    """
+    Creates a table of synthetic CUR 2.0 line items.
+
+    Each account uses a random subset of the services, and every (account, service, day)
+    gets line_items rows at random hours with random line item types. The usage start
+    dates are in UTC like CUR, and billing_period is the partition column (yyyy-MM).
+
+    Args:
+        conn: SQLite connection (e.g. LocalAthena.conn).
+        table: Table name (ATHENA_TABLE).
+        accounts: Number of accounts.
+        services: Number of distinct services.
+        days: Number of days up to today (JST).
+        line_items: Line items per account, service and day.
+        today: Last day in JST (defaults to now).
+        seed: Seed of the random values.
+
+    Returns:
+        int: Number of rows generated.
+    """
+    rng = random.Random(seed)
+    today = today or datetime.now(JST).date()
+    names: list[str] = (SERVICES + [f"Service{i}" for i in range(len(SERVICES), services)])[:services]
+    conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+    conn.execute(f'CREATE TABLE "{table}" ({CUR_COLUMNS})')
+
+    def rows():
+        for aid in account_ids(accounts):
+            used: list[str] = rng.sample(names, rng.randint(1, len(names)))
+            scales: dict[str, float] = {service: rng.lognormvariate(0, 2) for service in used}
+            for offset in range(days, -1, -1):
+                # JSTの日の始まりはUTCの前日15時
+                day_start: datetime = datetime.combine(today - timedelta(days=offset), datetime.min.time()) - timedelta(hours=9)
+                for service in used:
+                    for _ in range(line_items):
+                        start: datetime = day_start + timedelta(hours=rng.randrange(24))
+                        line_item_type: str = rng.choice(LINE_ITEM_TYPES)
+                        cost: float = scales[service] * rng.random()
+                        if line_item_type == "Credit":
+                            cost = -cost
+                        yield (
+                            start.strftime("%Y-%m-%d %H:%M:%S"),
+                            aid,
+                            service,
+                            line_item_type,
+                            cost,
+                            start.strftime("%Y-%m"),
+                        )
+
+    conn.executemany(f'INSERT INTO "{table}" VALUES (?, ?, ?, ?, ?, ?)', rows())
+    conn.commit()
+    count: int = conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+    return count
+
+
+# 明細の開始時刻は時間単位で重複が多いため、変換結果を使い回す
+@lru_cache(maxsize=65536)
+def _date_add(unit: str, value: int, timestamp: str) -> str:
+    # 日付のみ（yyyy-MM-dd）の場合は日付で返す
+    is_date: bool = len(timestamp) == 10
+    parsed: datetime = datetime.fromisoformat(timestamp)
+    parsed += timedelta(**{f"{unit}s": value})
+    return parsed.strftime("%Y-%m-%d" if is_date else "%Y-%m-%d %H:%M:%S")
+
+
+@lru_cache(maxsize=65536)
+def _date_format(timestamp: str, fmt: str) -> str:
+    # CurDAOが使う書式（%Y-%m-%d）はPythonのstrftimeと同じ
+    return datetime.fromisoformat(timestamp).strftime(fmt)
+
+
+def _greatest(*values: Any) -> Any:
+    # Athenaと同じく、NULLを含む場合はNULLを返す
+    if any(value is None for value in values):
+        return None
+    return max(values)
+
+
+class LocalAthena:
+    """
+    Stand-in for the boto3 Athena client that runs queries on SQLite.
+
+    Implements start_query_execution, get_query_execution, batch_get_query_execution,
+    get_query_results and stop_query_execution with the response shapes CurDAO reads.
+    Athena SQL is translated for SQLite: current_timestamp is fixed to now, and
+    date_add, date_format and greatest are registered as functions. Window functions,
+    CTEs and UNION ALL run natively.
+
+    Queries are executed when they are started. They report QUEUED and RUNNING until
+    latency seconds have passed, so the polling schedule can be exercised. Results are
+    paged page_size rows at a time (the header counts on the first page, like Athena),
+    and written as CSV to the output location when store (an object store) is given.
+    Result reuse returns the previous result of the same query within 60 minutes.
+
+    DataScannedInBytes is an estimate: the size of the table values, without the
+    columnar pruning that Parquet gives on Athena.
+    """
+    def __init__(
+        self,
+        conn: Optional[sqlite3.Connection] = None,
+        now: Optional[datetime] = None,
+        latency: float = 0.0,
+        page_size: int = 1000,
+        store: Optional[Any] = None,
+    ) -> None:
+        self.conn: sqlite3.Connection = conn or sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.create_function("date_add", 3, _date_add, deterministic=True)
+        self.conn.create_function("date_format", 2, _date_format, deterministic=True)
+        # SQLiteにはgreatestがないため登録する
+        self.conn.create_function("greatest", -1, _greatest, deterministic=True)
+        # current_timestamp はUTCの現在時刻
+        self.now: datetime = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        self.latency: float = latency
+        self.page_size: int = page_size
+        self.store: Optional[Any] = store
+        self.executions: dict[str, dict[str, Any]] = {}
+        self.results: dict[str, list[list[str]]] = {}
+        self.reusable: dict[str, tuple[str, float]] = {}  # QueryString -> (QueryExecutionId, 開始時刻)
+        self.lock = threading.Lock()
+        self.sequence: int = 0
+
+    def translate(self, query: str) -> str:
+        """
+        Translates an Athena query to SQLite.
+        """
+        query = re.sub(r"\bcurrent_timestamp\b", f"'{self.now.strftime('%Y-%m-%d %H:%M:%S')}'", query)
+        return re.sub(r"\btimestamp\s+('[^']*')", r"\1", query)
+
+    def start_query_execution(self, QueryString: str, **kwargs: Any) -> dict[str, Any]:
+        output_uri: str = kwargs.get("ResultConfiguration", {}).get("OutputLocation", "s3://local-athena/")
+        reuse: dict[str, Any] = kwargs.get("ResultReuseConfiguration", {}).get("ResultReuseByAgeConfiguration", {})
+        with self.lock:
+            self.sequence += 1
+            query_execution_id: str = f"local-{self.sequence:06d}"
+            started: float = time.monotonic()
+            previous: Optional[tuple[str, float]] = self.reusable.get(QueryString)
+            if reuse.get("Enabled") and previous and started - previous[1] < reuse.get("MaxAgeInMinutes", 60) * 60:
+                # 以前の結果を返す（スキャンなし）
+                source: dict[str, Any] = self.executions[previous[0]]
+                self.results[query_execution_id] = self.results[previous[0]]
+                self.executions[query_execution_id] = {
+                    "QueryExecutionId": query_execution_id,
+                    "Query": QueryString,
+                    "Status": {"State": "SUCCEEDED"},
+                    "ResultConfiguration": source["ResultConfiguration"],
+                    "Statistics": {
+                        "DataScannedInBytes": 0,
+                        "EngineExecutionTimeInMillis": 0,
+                        "QueryQueueTimeInMillis": 0,
+                        "QueryPlanningTimeInMillis": 0,
+                        "ResultReuseInformation": {"ReusedPreviousResult": True},
+                    },
+                    "ready_at": started,
+                }
+                return {"QueryExecutionId": query_execution_id}
+
+            execution: dict[str, Any] = {
+                "QueryExecutionId": query_execution_id,
+                "Query": QueryString,
+                "Status": {"State": "SUCCEEDED"},
+                "ResultConfiguration": {"OutputLocation": f"{output_uri.rstrip('/')}/{query_execution_id}.csv"},
+                "ready_at": started + self.latency,
+            }
+            try:
+                cursor: sqlite3.Cursor = self.conn.execute(self.translate(QueryString))
+                rows: list[list[str]] = [[column[0] for column in cursor.description or []]]
+                rows.extend(["" if value is None else str(value) for value in row] for row in cursor)
+            except sqlite3.Error as e:
+                execution["Status"] = {"State": "FAILED", "StateChangeReason": str(e)}
+                rows = []
+            elapsed_ms: int = int((time.monotonic() - started) * 1000)
+            execution["Statistics"] = {
+                "DataScannedInBytes": self._scanned_bytes(QueryString),
+                "EngineExecutionTimeInMillis": elapsed_ms,
+                "QueryQueueTimeInMillis": 0,
+                "QueryPlanningTimeInMillis": 0,
+                "ResultReuseInformation": {"ReusedPreviousResult": False},
+            }
+            self.executions[query_execution_id] = execution
+            self.results[query_execution_id] = rows
+            if execution["Status"]["State"] == "SUCCEEDED":
+                self.reusable[QueryString] = (query_execution_id, started)
+        if self.store is not None and rows:
+            self._write_csv(execution["ResultConfiguration"]["OutputLocation"], rows)
+        return {"QueryExecutionId": query_execution_id}
+
+    def get_query_execution(self, QueryExecutionId: str) -> dict[str, Any]:
+        return {"QueryExecution": self._execution(QueryExecutionId)}
+
+    def batch_get_query_execution(self, QueryExecutionIds: Sequence[str]) -> dict[str, Any]:
+        return {
+            "QueryExecutions": [self._execution(qid) for qid in QueryExecutionIds],
+            "UnprocessedQueryExecutionIds": [],
+        }
+
+    def get_query_results(self, QueryExecutionId: str, NextToken: Optional[str] = None, **kwargs: Any) -> dict[str, Any]:
+        page_size: int = kwargs.get("MaxResults", self.page_size)
+        rows: list[list[str]] = self.results[QueryExecutionId]
+        start: int = int(NextToken or 0)
+        end: int = start + page_size
+        response: dict[str, Any] = {"ResultSet": {"Rows": [
+            {"Data": [{"VarCharValue": value} for value in row]} for row in rows[start:end]
+        ]}}
+        if end < len(rows):
+            response["NextToken"] = str(end)
+        return response
+
+    def stop_query_execution(self, QueryExecutionId: str) -> dict[str, Any]:
+        with self.lock:
+            execution: dict[str, Any] = self.executions[QueryExecutionId]
+            if time.monotonic() < execution["ready_at"]:
+                execution["Status"] = {"State": "CANCELLED", "StateChangeReason": "Query was cancelled by user"}
+        return {}
+
+    def _execution(self, query_execution_id: str) -> dict[str, Any]:
+        with self.lock:
+            execution: dict[str, Any] = self.executions[query_execution_id]
+            response: dict[str, Any] = {key: value for key, value in execution.items() if key != "ready_at"}
+            remaining: float = execution["ready_at"] - time.monotonic()
+        if remaining > 0 and execution["Status"]["State"] == "SUCCEEDED":
+            # 実行中として返す（前半はキュー待ち）
+            state: str = "QUEUED" if remaining > self.latency / 2 else "RUNNING"
+            response = {**response, "Status": {"State": state}}
+            response.pop("Statistics", None)
+        return response
+
+    def _scanned_bytes(self, query: str) -> int:
+        tables: list[str] = re.findall(r'FROM\s+"([^"]+)"', query)
+        total: int = 0
+        for table in tables:
+            try:
+                total += self.conn.execute(
+                    f'SELECT COALESCE(SUM(length(line_item_usage_start_date) + length(line_item_usage_account_id)'
+                    f' + length(line_item_product_code) + length(line_item_line_item_type) + 8), 0) FROM "{table}"'
+                ).fetchone()[0]
+            except sqlite3.Error:
+                pass
+        return total
+
+    def _write_csv(self, uri: str, rows: list[list[str]]) -> None:
+        # Athenaと同じく全項目をダブルクォートで囲む
+        buffer = io.StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator="\n").writerows(rows)
+        self.store.put(uri, buffer.getvalue().encode("utf-8"))
@@ -0,0 +1,121 @@
+import json
+import time
+import threading
+from typing import Any, Callable, Optional
+
+try:
+    from .result_cache import ResultCache
+except ImportError:
+    # Lambdaではパッケージではなくフラットなモジュールとして読み込まれる
+    from result_cache import ResultCache
+
+# 描画済みのグラフ画像と、チャンネルごとの投稿済みのグラフのキャッシュ
+# Lambdaのリトライや再実行で同じグラフを描き直したり、同じチャンネルに重複して投稿したりしない
+# キーは graph_plotter.chart_fingerprint（集計結果・サービス設定・描画オプション・日付のハッシュ）
+
+"""
+Posted record structure (one JSON object per channel, "posted/<channel_id>.json" under the prefix):
+    {
+        "3f2a...": 1747700000.0,  # Fingerprint of a posted chart -> when it was posted (epoch seconds)
+    }
+"""
+
+
+class ImageCache(ResultCache):
+    """
+    ResultCache of encoded chart images (bytes) keyed by chart_fingerprint.
+    """
+    suffix: str = ".img"
+
+    def _dumps(self, image: bytes) -> bytes:
+        return bytes(image)
+
+    def _loads(self, body: bytes) -> bytes:
+        return body
+
+    def _describe(self, image: bytes) -> str:
+        return f"{len(image)} bytes"
+
+
+class ChartCache:
+    """
+    Cache of rendered charts and of the charts already posted to each channel.
+
+    Images are kept in an ImageCache under prefix_uri/images, so a chart with the same
+    fingerprint is not rendered again. When skip_posted is set, the fingerprints posted
+    to each channel are also recorded, and a chart already posted to the channel is
+    neither rendered nor posted again. Records older than ttl_seconds are dropped.
+
+    Both live in an object store (S3ObjectStore, or LocalObjectStore for /tmp). A
+    record is written only after the upload succeeded, so a failed post is retried by
+    the next run.
+    """
+    def __init__(
+        self,
+        store: Any,
+        prefix_uri: str,
+        ttl_seconds: float = 86400.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        skip_posted: bool = True,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.store: Any = store
+        self.prefix_uri: str = prefix_uri.rstrip("/")
+        self.ttl_seconds: float = ttl_seconds
+        self.skip_posted: bool = skip_posted
+        self.clock: Callable[[], float] = clock
+        self.images = ImageCache(store, f"{self.prefix_uri}/images", ttl_seconds, max_bytes, clock)
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the cached image of a chart, or None if it was not rendered recently.
+        """
+        return self.images.get(key)
+
+    def put(self, key: str, image: bytes) -> None:
+        """
+        Stores the image of a rendered chart.
+        """
+        self.images.put(key, image)
+
+    def is_posted(self, channel_id: str, key: str) -> bool:
+        """
+        Returns True if the chart was already posted to the channel and should be skipped.
+        """
+        if not self.skip_posted:
+            return False
+        posted_at: Optional[float] = self._load_posted(channel_id).get(key)
+        return posted_at is not None and self.clock() - posted_at <= self.ttl_seconds
+
+    def mark_posted(self, channel_id: str, key: str) -> None:
+        """
+        Records that the chart was posted to the channel.
+        """
+        if not self.skip_posted:
+            return
+        with self.lock:
+            now: float = self.clock()
+            posted: dict[str, float] = {
+                k: posted_at for k, posted_at in self._load_posted(channel_id).items()
+                if now - posted_at <= self.ttl_seconds
+            }
+            posted[key] = now
+            try:
+                self.store.put(self._posted_uri(channel_id), json.dumps(posted).encode("utf-8"))
+            except Exception as e:
+                # 記録できなくても投稿は済んでいるため続ける（次回は重複して投稿される）
+                print(f"Error saving posted charts of {channel_id}: {e}")
+
+    def _posted_uri(self, channel_id: str) -> str:
+        return f"{self.prefix_uri}/posted/{channel_id}.json"
+
+    def _load_posted(self, channel_id: str) -> dict[str, float]:
+        try:
+            posted: dict[str, float] = json.loads(self.store.get(self._posted_uri(channel_id)))
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error loading posted charts of {channel_id}: {e}")
+            return {}
+        return posted
@@ -0,0 +1,96 @@
+import time
+import threading
+from typing import Any, Callable, Optional, TypeVar
+
+# Lambdaのウォームスタート時に、DAOやAPIクライアント（とそのHTTPコネクションプール）を再利用する
+
+T = TypeVar("T")
+
+
+class ClientRegistry:
+    """
+    Registry of long-lived clients shared across warm Lambda invocations.
+
+    A client is created lazily by its factory on first use and then reused. It is
+    recreated when it is older than max_age_seconds, or when its health check returns
+    False or raises. Access is thread-safe.
+    """
+    def __init__(self, max_age_seconds: Optional[float] = None) -> None:
+        self.max_age_seconds: Optional[float] = max_age_seconds
+        self.entries: dict[str, tuple[Any, float]] = {}  # name -> (client, created_at)
+        self.lock = threading.RLock()
+
+    def get(
+        self,
+        name: str,
+        factory: Callable[[], T],
+        is_healthy: Optional[Callable[[T], bool]] = None,
+    ) -> T:
+        """
+        Returns the registered client, creating or recreating it when needed.
+
+        Args:
+            name: Registry key of the client.
+            factory: Creates a new client.
+            is_healthy: Checks a reused client. May also repair it in place (e.g. refresh
+                expired credentials) and return True.
+
+        Returns:
+            The client.
+        """
+        with self.lock:
+            entry: Optional[tuple[Any, float]] = self.entries.get(name)
+            if entry is not None:
+                client, created_at = entry
+                if self._is_reusable(name, client, created_at, is_healthy):
+                    return client
+                self._discard(name)
+            client = factory()
+            self.entries[name] = (client, time.monotonic())
+            return client
+
+    def _is_reusable(
+        self,
+        name: str,
+        client: Any,
+        created_at: float,
+        is_healthy: Optional[Callable[[Any], bool]],
+    ) -> bool:
+        if self.max_age_seconds is not None and time.monotonic() - created_at > self.max_age_seconds:
+            print(f"Recreating client {name}: max age exceeded")
+            return False
+        if is_healthy is None:
+            return True
+        try:
+            healthy: bool = is_healthy(client)
+        except Exception as e:
+            print(f"Recreating client {name}: health check failed: {e}")
+            return False
+        if not healthy:
+            print(f"Recreating client {name}: unhealthy")
+        return healthy
+
+    def _discard(self, name: str) -> None:
+        client, _ = self.entries.pop(name)
+        close: Optional[Callable[[], Any]] = getattr(client, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                print(f"Error closing client {name}: {e}")
+
+    def invalidate(self, name: str) -> None:
+        """
+        Discards a client so that the next get() creates a new one.
+        """
+        with self.lock:
+            if name in self.entries:
+                self._discard(name)
+
+    def clear(self) -> None:
+        """
+        Discards every client.
+        """
+        with self.lock:
+            for name in list(self.entries):
+                self._discard(name)
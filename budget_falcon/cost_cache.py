@@ -0,0 +1,197 @@
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional, TypedDict
+
+# 日次コストのキャッシュ
+# CURの修正（再計算）は直近数日分に限られるため、それより古い日付のコストはキャッシュから返し、
+# Athenaでは直近の確定していない日数分と、キャッシュにないアカウントだけを集計する
+
+JST = timezone(timedelta(hours=9))
+
+# キャッシュに保持する最大日数（QUERY_DAYS_RANGEの上限に合わせる）
+MAX_CACHED_DAYS: int = 31
+
+Record = tuple[str, str, str, float]  # (date, account_id, service, cost)
+
+"""
+Cache entry structure (one JSON object per account):
+    {
+        "covered_from": "2025-05-01",  # First settled date held in the cache
+        "covered_to": "2025-05-20",    # Last settled date held in the cache
+        "days": {                      # Costs by date and service (dates without cost are omitted)
+            "2025-05-01": {"AmazonEC2": 1.5, "AmazonS3": 0.25},
+        },
+    }
+"""
+class CacheEntry(TypedDict):
+    covered_from: str
+    covered_to: str
+    days: dict[str, dict[str, float]]
+
+
+class CachePlan(TypedDict):
+    fingerprint: str     # クエリの条件（テーブル・明細タイプ）の指紋
+    today: str
+    window_start: str    # 返す期間の初日
+    settled_before: str  # この日付より前のコストは確定済みとしてキャッシュする
+    queries: dict[int, list[str]]  # Athenaで集計する日数 -> 対象のアカウントID
+    entries: dict[str, Optional[CacheEntry]]  # アカウントID -> 読み込んだキャッシュ
+
+
+def _day(value: str) -> date:
+    return date.fromisoformat(value)
+
+
+class CostCache:
+    """
+    Persistent cache of settled daily costs per (date, account, service).
+
+    One JSON object per account is kept in an object store (S3ObjectStore, or
+    LocalObjectStore offline) under prefix_uri. Keys include a fingerprint of the query
+    scope (table and line item types), so a configuration change starts a new cache.
+
+    Days more than settle_days before today are treated as settled and served from the
+    cache. A run queries only the days after the cached range, and accounts that are not
+    cached yet are queried for the whole window.
+    """
+    def __init__(self, store: Any, prefix_uri: str, settle_days: int = 3, max_workers: int = 8) -> None:
+        self.store: Any = store
+        self.prefix_uri: str = prefix_uri.rstrip("/")
+        self.settle_days: int = max(0, settle_days)
+        self.max_workers: int = max_workers
+
+    def plan(
+        self,
+        account_ids: list[str],
+        days_range: int,
+        scope: list[str],
+        today: Optional[date] = None,
+    ) -> CachePlan:
+        """
+        Loads the cache entries and decides which queries are needed.
+
+        A query over N days also returns part of its first day (the range starts at
+        09:00 JST), so every query covers one more day than the first full day it needs.
+
+        Args:
+            account_ids: AWS account IDs to fetch.
+            days_range: Number of days to return.
+            scope: Values that identify the query (e.g. table and line item types).
+            today: Current date in JST (defaults to now).
+
+        Returns:
+            CachePlan: Pass it to merge() together with the query results.
+        """
+        today = today or datetime.now(JST).date()
+        window_start: date = today - timedelta(days=days_range)
+        settled_before: date = today - timedelta(days=self.settle_days)
+        fingerprint: str = hashlib.sha256("\n".join(scope).encode("utf-8")).hexdigest()[:16]
+
+        ids: list[str] = list(dict.fromkeys(aid.strip() for aid in account_ids))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            entries: dict[str, Optional[CacheEntry]] = dict(
+                zip(ids, executor.map(lambda aid: self._load(fingerprint, aid), ids))
+            )
+
+        queries: dict[int, list[str]] = {}
+        for aid in ids:
+            entry: Optional[CacheEntry] = entries[aid]
+            first_needed: date = window_start
+            if entry is not None and _day(entry["covered_from"]) <= window_start:
+                # キャッシュ済みの範囲の翌日から集計する
+                first_needed = min(max(_day(entry["covered_to"]) + timedelta(days=1), window_start), settled_before)
+            else:
+                entries[aid] = None
+            query_days: int = (today - first_needed).days + 1
+            queries.setdefault(query_days, []).append(aid)
+
+        cached: int = sum(1 for entry in entries.values() if entry is not None)
+        print(f"Cost cache: {cached}/{len(ids)} accounts cached, query days: {sorted(queries)}")
+        return {
+            "fingerprint": fingerprint,
+            "today": today.isoformat(),
+            "window_start": window_start.isoformat(),
+            "settled_before": settled_before.isoformat(),
+            "queries": queries,
+            "entries": entries,
+        }
+
+    def merge(self, plan: CachePlan, results: dict[int, list[Record]]) -> list[Record]:
+        """
+        Merges the query results with the cache, and saves the newly settled days.
+
+        Args:
+            plan: Plan returned by plan().
+            results: Query results keyed by the number of days queried.
+
+        Returns:
+            List of (date, account_id, service, cost) over the requested window,
+            sorted by date and account.
+        """
+        today: date = _day(plan["today"])
+        window_start: str = plan["window_start"]
+        settled_before: str = plan["settled_before"]
+        prune_before: str = (today - timedelta(days=MAX_CACHED_DAYS)).isoformat()
+
+        merged: list[Record] = []
+        updates: dict[str, CacheEntry] = {}
+        for query_days, aids in plan["queries"].items():
+            # 初日は途中からの集計になるため、翌日以降だけを使う
+            first_full: str = (today - timedelta(days=query_days - 1)).isoformat()
+            fresh: dict[str, list[Record]] = {aid: [] for aid in aids}
+            for rec in results.get(query_days, []):
+                if rec[1] in fresh and rec[0] >= first_full:
+                    fresh[rec[1]].append(rec)
+
+            for aid in aids:
+                entry: Optional[CacheEntry] = plan["entries"][aid]
+                days: dict[str, dict[str, float]] = {}
+                covered_from: str = first_full
+                if entry is not None and entry["covered_to"] >= (_day(first_full) - timedelta(days=1)).isoformat():
+                    days = {d: costs for d, costs in entry["days"].items() if prune_before <= d < first_full}
+                    covered_from = entry["covered_from"]
+                for rec in fresh[aid]:
+                    if rec[0] < settled_before:
+                        days.setdefault(rec[0], {})[rec[2]] = rec[3]
+                    elif rec[0] >= window_start:
+                        merged.append(rec)
+                new_entry: CacheEntry = {
+                    "covered_from": max(covered_from, prune_before),
+                    "covered_to": (_day(settled_before) - timedelta(days=1)).isoformat(),
+                    "days": dict(sorted(days.items())),
+                }
+                if new_entry != entry:
+                    updates[aid] = new_entry
+                for d, costs in new_entry["days"].items():
+                    if window_start <= d < settled_before:
+                        merged.extend((d, aid, service, cost) for service, cost in costs.items())
+
+        if updates:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                list(executor.map(lambda item: self._save(plan["fingerprint"], *item), updates.items()))
+        # 元のクエリと同じく日付・アカウント順に並べる
+        merged.sort(key=lambda rec: (rec[0], rec[1]))
+        return merged
+
+    def _uri(self, fingerprint: str, account_id: str) -> str:
+        return f"{self.prefix_uri}/{fingerprint}/{account_id}.json"
+
+    def _load(self, fingerprint: str, account_id: str) -> Optional[CacheEntry]:
+        try:
+            entry: CacheEntry = json.loads(self.store.get(self._uri(fingerprint, account_id)))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # 壊れたキャッシュは使わずに集計し直す
+            print(f"Error loading cost cache for {account_id}: {e}")
+            return None
+        return entry
+
+    def _save(self, fingerprint: str, account_id: str, entry: CacheEntry) -> None:
+        try:
+            self.store.put(self._uri(fingerprint, account_id), json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+        except Exception as e:
+            # キャッシュの保存に失敗しても通知は続ける
+            print(f"Error saving cost cache for {account_id}: {e}")
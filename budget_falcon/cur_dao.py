@@ -1,6 +1,17 @@
+import csv
 import time
-import boto3
-from typing import Any, Optional, TypedDict
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Iterator, NotRequired, Optional, TypedDict
+
+try:
+    from .cur_records import CurRecord, CurRecords
+    from .result_cache import fingerprint
+except ImportError:
+    # Lambdaではパッケージではなくフラットなモジュールとして読み込まれる
+    from cur_records import CurRecord, CurRecords
+    from result_cache import fingerprint
 
 # fetch CUR(Cost and Usage Report) data from AWS Athena
 
@@ -11,9 +22,386 @@ class CurDAOParameters(TypedDict):
     ATHENA_OUTPUT_URI: str
     ATHENA_LINE_ITEM_TYPES: list[str]
     QUERY_DAYS_RANGE: int
+    ATHENA_QUERY_TIMEOUT: NotRequired[float]        # クエリのタイムアウト秒数（超えたら停止する）
+    ATHENA_POLL_INITIAL_DELAY: NotRequired[float]   # 状態確認の初回の待ち秒数
+    ATHENA_POLL_MAX_DELAY: NotRequired[float]       # 状態確認の待ち秒数の上限
+    ATHENA_BILLING_PERIOD_PARTITION: NotRequired[bool]  # テーブルが billing_period（yyyy-MM）でパーティション分割されているか
+    ATHENA_ROLLUP_TABLE: NotRequired[str]           # 日次のロールアップテーブル（指定時は明細ではなくこちらを読む）
+    ATHENA_TOP_N_SERVICES: NotRequired[int]         # 指定時はクエリでアカウントごとの上位N件以外をOthersにまとめる
+    ATHENA_OTHERS_LABEL: NotRequired[str]           # まとめたサービスの名前（グラフのOthersと合わせる）
+
+
+# batch_get_query_execution で一度に問い合わせできるクエリ数の上限
+BATCH_GET_MAX_IDS: int = 50
+
+JST = timezone(timedelta(hours=9))
+
+
+def billing_periods(days_range: int, today: Optional[date] = None) -> list[str]:
+    """
+    Lists the billing periods (yyyy-MM) that a query over the last days_range days touches.
+
+    The query range starts at 00:00 UTC of the first date, and billing periods follow
+    UTC months, so one extra day before the range is included to stay on the safe side.
+
+    Args:
+        days_range: Number of days queried.
+        today: Current date in JST (defaults to now).
+
+    Returns:
+        list[str]: Billing periods in ascending order.
+    """
+    today = today or datetime.now(JST).date()
+    month: date = (today - timedelta(days=days_range + 1)).replace(day=1)
+    periods: list[str] = []
+    while month <= today:
+        periods.append(month.strftime("%Y-%m"))
+        month = (month + timedelta(days=31)).replace(day=1)
+    return periods
+
+
+class QueryWait(TypedDict):
+    query_execution_id: str
+    attempt: int       # 何回目の待ちか（0始まり）
+    state: str         # 確認時点のクエリの状態
+    elapsed: float     # クエリ開始からの経過秒数
+    delay: float       # 次の状態確認までの待ち秒数（打ち切る場合は0）
+    timed_out: bool    # タイムアウトでクエリを停止した場合はTrue
+
+
+class QueryStatistics(TypedDict):
+    query_execution_id: str
+    data_scanned_bytes: int     # Athenaの課金対象のスキャン量
+    engine_execution_ms: int    # Athenaでの実行時間
+    queue_ms: int               # 実行開始までのキュー待ち時間
+    planning_ms: int            # クエリの計画時間
+    result_reused: bool         # 以前のクエリ結果を再利用した場合はTrue
+    poll_seconds: float         # 開始から完了を確認するまでの経過秒数
+    read_seconds: float         # 結果の読み込みにかかった秒数
+    result_pages: int           # GetQueryResultsの呼び出し回数（結果CSVを読んだ場合は0）
+    result_rows: int
+
+
+class BackoffPolicy:
+    """
+    Polling schedule for Athena query status checks.
+
+    The n-th wait (0-based) is initial_delay * multiplier ** n, capped at max_delay and
+    never past the timeout. A query still running after timeout seconds is stopped.
+    """
+    def __init__(
+        self,
+        initial_delay: float = 0.05,
+        max_delay: float = 2.0,
+        multiplier: float = 2.0,
+        timeout: float = 300.0,
+    ) -> None:
+        self.initial_delay: float = initial_delay
+        self.max_delay: float = max_delay
+        self.multiplier: float = multiplier
+        self.timeout: float = timeout
+
+    def delay(self, attempt: int, elapsed: float) -> float:
+        """
+        Returns the wait before the next check, never past the timeout.
+
+        Args:
+            attempt: Number of waits before this one (0-based).
+            elapsed: Seconds since the query started.
+        """
+        backoff: float = min(self.max_delay, self.initial_delay * (self.multiplier ** attempt))
+        return max(0.0, min(backoff, self.timeout - elapsed))
+
+    def timed_out(self, elapsed: float) -> bool:
+        return elapsed >= self.timeout
+
+
+class _PendingQuery(TypedDict):
+    future: Future
+    started: float     # time.monotonic() の開始時刻
+    attempt: int
+    next_check: float  # 次に状態確認する time.monotonic() の時刻
+
+
+class AthenaQueryEngine:
+    """
+    Non-blocking runner for Athena queries.
+
+    Queries are started immediately and registered in a shared registry. A single
+    background thread polls the registered queries that are due (or due within
+    initial_delay), together with batch_get_query_execution (up to 50 IDs per call),
+    and resolves each query's future when it finishes. Each query follows its own
+    BackoffPolicy schedule and is stopped with stop_query_execution on timeout.
+    The thread stops when no query is left in flight, or when the engine is closed.
+    """
+    def __init__(
+        self,
+        client: Any,
+        database: str,
+        output_uri: str,
+        policy: Optional[BackoffPolicy] = None,
+        on_wait: Optional[Callable[[QueryWait], None]] = None,
+    ) -> None:
+        self.client = client
+        self.database: str = database
+        self.output_uri: str = output_uri
+        self.policy: BackoffPolicy = policy or BackoffPolicy()
+        # 待ち時間の判断ごとに呼ばれる（計測用）
+        self.on_wait: Optional[Callable[[QueryWait], None]] = on_wait
+        self.pending: dict[str, _PendingQuery] = {}  # QueryExecutionId -> 状態
+        # 完了したクエリの結果CSVの場所（結果を再利用した場合は元のクエリの結果を指す）
+        self.output_locations: dict[str, str] = {}
+        # 完了したクエリの Statistics と、開始から完了を確認するまでの経過秒数
+        self.statistics: dict[str, tuple[dict[str, Any], float]] = {}
+        self.lock = threading.Condition()
+        self.poller: Optional[threading.Thread] = None
+        self.closed: bool = False
+
+    def start_query(self, query: str, reuse: bool = True) -> str:
+        """
+        Starts an Athena query without waiting for it.
+
+        Args:
+            query: SQL query string.
+            reuse: Reuse the result of the same query run within the last hour.
+
+        Returns:
+            str: QueryExecutionId of the started query.
+        """
+        response: dict[str, Any] = self.client.start_query_execution(
+            QueryString=query,
+            QueryExecutionContext={"Database": self.database},
+            ResultConfiguration={"OutputLocation": self.output_uri},
+            # クエリ結果の再利用設定（UNLOADなど結果以外を書き出すクエリでは無効にする）
+            ResultReuseConfiguration={
+                "ResultReuseByAgeConfiguration": (
+                    {"Enabled": True, "MaxAgeInMinutes": 60} if reuse else {"Enabled": False}
+                )
+            },
+        )
+        query_execution_id: str = response["QueryExecutionId"]
+        print("QueryExecutionId:", query_execution_id)
+        return query_execution_id
 
+    def wait(self, query_execution_id: str) -> None:
+        """
+        Blocks until a query finishes, polling it alone with get_query_execution.
+
+        Args:
+            query_execution_id: QueryExecutionId of a started query.
+
+        Raises:
+            Exception: The query failed or was cancelled.
+            TimeoutError: The query ran past the policy timeout and was stopped.
+        """
+        started: float = time.monotonic()
+        attempt: int = 0
+        # 結果の再利用で即座に完了する場合に備えて、初回の確認は待たずに行う
+        while True:
+            status: dict[str, Any] = self.client.get_query_execution(
+                QueryExecutionId=query_execution_id
+            )
+            state: str = status["QueryExecution"]["Status"]["State"]
+            if state in ["FAILED", "CANCELLED"]:
+                reason: str = status["QueryExecution"]["Status"]["StateChangeReason"]
+                raise Exception(f"Query failed: {state} {reason}")
+            if state == "SUCCEEDED":
+                self._record_execution(query_execution_id, status["QueryExecution"], time.monotonic() - started)
+                return
+            elapsed: float = time.monotonic() - started
+            if self.policy.timed_out(elapsed):
+                self._notify(query_execution_id, attempt, state, elapsed, 0.0, True)
+                raise self._stop(query_execution_id, elapsed)
+            delay: float = self.policy.delay(attempt, elapsed)
+            self._notify(query_execution_id, attempt, state, elapsed, delay, False)
+            time.sleep(delay)
+            attempt += 1
+
+    def submit(self, query: str, reuse: bool = True) -> Future:
+        """
+        Starts an Athena query and tracks it in the registry.
+
+        Args:
+            query: SQL query string.
+            reuse: Reuse the result of the same query run within the last hour.
+
+        Returns:
+            Future: Resolves to the QueryExecutionId when the query succeeds,
+            or raises when it fails, is cancelled or times out.
+        """
+        if self.closed:
+            raise RuntimeError("AthenaQueryEngine is closed")
+        future: Future = Future()
+        query_execution_id: str = self.start_query(query, reuse)
+        now: float = time.monotonic()
+        # 初回の確認は短く待ち、同時に開始されたクエリをまとめて問い合わせる
+        delay: float = self.policy.delay(0, 0.0)
+        self._notify(query_execution_id, 0, "SUBMITTED", 0.0, delay, False)
+        with self.lock:
+            self.pending[query_execution_id] = {
+                "future": future,
+                "started": now,
+                "attempt": 1,
+                "next_check": now + delay,
+            }
+            if self.poller is None:
+                self.poller = threading.Thread(target=self._poll_loop, name="athena-poller", daemon=True)
+                self.poller.start()
+            self.lock.notify_all()
+        return future
+
+    def _poll_loop(self) -> None:
+        while True:
+            with self.lock:
+                if not self.pending or self.closed:
+                    self.poller = None
+                    return
+                # 最も早く確認が必要なクエリの時刻まで待つ（新しいクエリが登録されたら起きる）
+                next_check: float = min(entry["next_check"] for entry in self.pending.values())
+                wait: float = next_check - time.monotonic()
+                if wait > 0:
+                    self.lock.wait(timeout=wait)
+                    continue
+                # 間もなく確認予定のクエリも同じ呼び出しにまとめる
+                horizon: float = time.monotonic() + self.policy.initial_delay
+                ids: list[str] = [qid for qid, entry in self.pending.items() if entry["next_check"] <= horizon]
+            for i in range(0, len(ids), BATCH_GET_MAX_IDS):
+                try:
+                    self._poll_batch(ids[i:i + BATCH_GET_MAX_IDS])
+                except Exception as e:
+                    # API呼び出し自体の失敗は対象クエリすべてに伝える
+                    self._resolve(ids[i:i + BATCH_GET_MAX_IDS], error=e)
+
+    def close(self) -> None:
+        """
+        Stops the polling thread and waits for it to exit.
+
+        Queries still in flight fail with RuntimeError (they are not stopped on Athena).
+        """
+        with self.lock:
+            self.closed = True
+            ids: list[str] = list(self.pending)
+            poller: Optional[threading.Thread] = self.poller
+            self.lock.notify_all()
+        self._resolve(ids, error=RuntimeError("AthenaQueryEngine is closed"))
+        if poller is not None and poller is not threading.current_thread():
+            poller.join(timeout=5)
+
+    def _poll_batch(self, ids: list[str]) -> None:
+        response: dict[str, Any] = self.client.batch_get_query_execution(QueryExecutionIds=ids)
+        checked: float = time.monotonic()
+        states: dict[str, str] = {}
+        for execution in response.get("QueryExecutions", []):
+            query_execution_id: str = execution["QueryExecutionId"]
+            state: str = execution["Status"]["State"]
+            states[query_execution_id] = state
+            if state in ["FAILED", "CANCELLED"]:
+                reason: str = execution["Status"].get("StateChangeReason", "")
+                self._resolve([query_execution_id], error=Exception(f"Query failed: {state} {reason}"))
+            elif state == "SUCCEEDED":
+                with self.lock:
+                    entry: Optional[_PendingQuery] = self.pending.get(query_execution_id)
+                self._record_execution(query_execution_id, execution, checked - entry["started"] if entry else 0.0)
+                self._resolve([query_execution_id])
+        # 未完了のクエリ（UnprocessedQueryExecutionIds を含む）は次の確認時刻を決める
+        now: float = time.monotonic()
+        for query_execution_id in ids:
+            state = states.get(query_execution_id, "UNPROCESSED")
+            if state in ["FAILED", "CANCELLED", "SUCCEEDED"]:
+                continue
+            with self.lock:
+                entry = self.pending.get(query_execution_id)
+                if entry is None:
+                    continue
+                elapsed: float = now - entry["started"]
+                attempt: int = entry["attempt"]
+                timed_out: bool = self.policy.timed_out(elapsed)
+                delay: float = 0.0 if timed_out else self.policy.delay(attempt, elapsed)
+                entry["attempt"] = attempt + 1
+                entry["next_check"] = now + delay
+            self._notify(query_execution_id, attempt, state, elapsed, delay, timed_out)
+            if timed_out:
+                self._resolve([query_execution_id], error=self._stop(query_execution_id, elapsed))
+
+    def output_location(self, query_execution_id: str) -> str:
+        """
+        Returns the S3 URI of the result CSV of a succeeded query.
+
+        Args:
+            query_execution_id: QueryExecutionId of a succeeded query.
+
+        Returns:
+            str: OutputLocation reported by Athena when the query finished.
+        """
+        with self.lock:
+            location: Optional[str] = self.output_locations.pop(query_execution_id, None)
+        if location is None:
+            status: dict[str, Any] = self.client.get_query_execution(QueryExecutionId=query_execution_id)
+            location = status["QueryExecution"]["ResultConfiguration"]["OutputLocation"]
+        return location
+
+    def pop_statistics(self, query_execution_id: str) -> tuple[dict[str, Any], float]:
+        """
+        Returns what was recorded when a query finished, and forgets it.
+
+        Args:
+            query_execution_id: QueryExecutionId of a succeeded query.
+
+        Returns:
+            tuple[dict[str, Any], float]: (Statistics reported by Athena, seconds from the
+            start of the wait until the query was seen finished). Empty and 0.0 if unknown.
+        """
+        with self.lock:
+            return self.statistics.pop(query_execution_id, ({}, 0.0))
+
+    def _record_execution(self, query_execution_id: str, execution: dict[str, Any], elapsed: float) -> None:
+        location: Optional[str] = execution.get("ResultConfiguration", {}).get("OutputLocation")
+        with self.lock:
+            if location:
+                self.output_locations[query_execution_id] = location
+            self.statistics[query_execution_id] = (execution.get("Statistics", {}), elapsed)
+
+    def _stop(self, query_execution_id: str, elapsed: float) -> TimeoutError:
+        try:
+            self.client.stop_query_execution(QueryExecutionId=query_execution_id)
+        except Exception as e:
+            print(f"Error stopping query {query_execution_id}: {e}")
+        return TimeoutError(f"Query timed out after {elapsed:.1f}s and was stopped: {query_execution_id}")
+
+    def _notify(
+        self,
+        query_execution_id: str,
+        attempt: int,
+        state: str,
+        elapsed: float,
+        delay: float,
+        timed_out: bool,
+    ) -> None:
+        if self.on_wait is None:
+            return
+        try:
+            self.on_wait({
+                "query_execution_id": query_execution_id,
+                "attempt": attempt,
+                "state": state,
+                "elapsed": elapsed,
+                "delay": delay,
+                "timed_out": timed_out,
+            })
+        except Exception as e:
+            print(f"Error in query wait callback: {e}")
+
+    def _resolve(self, ids: list[str], error: Optional[Exception] = None) -> None:
+        for query_execution_id in ids:
+            with self.lock:
+                entry: Optional[_PendingQuery] = self.pending.pop(query_execution_id, None)
+            if entry is None:
+                continue
+            if error:
+                entry["future"].set_exception(error)
+            else:
+                entry["future"].set_result(query_execution_id)
 
-CurRecord = tuple[str, str, str, float]  # (date, account_id, service, cost)
 
 class CurDAO:
     """
@@ -21,16 +409,71 @@ class CurDAO:
     
     This class provides methods to query AWS cost data stored in S3 as Parquet files
     through Amazon Athena service.
+
+    By default results are paged through GetQueryResults. When result_store is given
+    (S3ObjectStore, or LocalObjectStore offline), the result CSV that Athena writes to
+    ATHENA_OUTPUT_URI is streamed and parsed row by row instead.
+
+    When cost_cache (CostCache) is given, settled days are served from the cache and
+    only the recent days, or accounts that are not cached yet, are queried.
+
+    When result_cache (ResultCache) is given, fetch() and fetch_async() first look up
+    the result of the same query (accounts, settings, days range and run date), so a
+    retry or rerun on the same day does not touch Athena.
+
+    client replaces the boto3 Athena client, e.g. with LocalAthena to run offline.
+
+    With ATHENA_TOP_N_SERVICES, the query keeps only the top N services of each account
+    (by daily maximum) and folds the rest into one ATHENA_OTHERS_LABEL series, like
+    plot_graph does. The records then carry service_max, the daily maximum of every
+    service, so that colors and hatches are assigned as with the full data. The cost
+    cache is not used in this mode.
     """
-    def __init__(self, PARAMS: CurDAOParameters) -> None:
-        self.client = boto3.client("athena", region_name=PARAMS["AWS_REGION"])
+    def __init__(
+        self,
+        PARAMS: CurDAOParameters,
+        result_store: Optional[Any] = None,
+        cost_cache: Optional[Any] = None,
+        result_cache: Optional[Any] = None,
+        client: Optional[Any] = None,
+    ) -> None:
+        if client is None:
+            # boto3は読み込みに時間がかかるため、DAOの生成時に読み込む
+            import boto3
+            client = boto3.client("athena", region_name=PARAMS["AWS_REGION"])
+        self.client = client
         self.database: str = PARAMS["ATHENA_DATABASE"]
         self.table: str = PARAMS["ATHENA_TABLE"]
         self.output_uri: str = PARAMS["ATHENA_OUTPUT_URI"]
         self.line_item_types: list[str] = PARAMS["ATHENA_LINE_ITEM_TYPES"]
         self.query_days_range: int = max(7, min(30, PARAMS["QUERY_DAYS_RANGE"]))
+        self.billing_period_partition: bool = PARAMS.get("ATHENA_BILLING_PERIOD_PARTITION", False)
+        self.rollup_table: Optional[str] = PARAMS.get("ATHENA_ROLLUP_TABLE") or None
+        self.top_n_services: int = max(0, PARAMS.get("ATHENA_TOP_N_SERVICES", 0))
+        self.others_label: str = PARAMS.get("ATHENA_OTHERS_LABEL", "Others")
+        self.engine = AthenaQueryEngine(
+            self.client,
+            self.database,
+            self.output_uri,
+            policy=BackoffPolicy(
+                initial_delay=PARAMS.get("ATHENA_POLL_INITIAL_DELAY", 0.05),
+                max_delay=PARAMS.get("ATHENA_POLL_MAX_DELAY", 2.0),
+                timeout=PARAMS.get("ATHENA_QUERY_TIMEOUT", 300.0),
+            ),
+        )
+        # 結果CSVの読み込み先（Noneの場合はGetQueryResultsで取得する）
+        self.result_store: Optional[Any] = result_store
+        # 確定済みの日次コストのキャッシュ（Noneの場合は毎回全期間を集計する）
+        self.cost_cache: Optional[Any] = cost_cache
+        # クエリ結果のキャッシュ（Noneの場合は毎回クエリする）
+        self.result_cache: Optional[Any] = result_cache
+        # 非同期取得時の結果の読み込み用（ポーリングのスレッドを止めないように別スレッドで読む）
+        self.reader: Optional[ThreadPoolExecutor] = None
+        # 実行したクエリの統計（pop_query_log()で取り出す）
+        self.query_log: list[QueryStatistics] = []
+        self.lock = threading.Lock()
 
-    def fetch(self, account_ids: list[str]) -> list[CurRecord]:
+    def fetch(self, account_ids: list[str]) -> CurRecords:
         """
         Fetches cost and usage report data for given AWS account IDs.
 
@@ -38,11 +481,259 @@ class CurDAO:
             account_ids: List of AWS account IDs to fetch data for.
 
         Returns:
-            List of (date, account_id, service, cost) where cost is a float and others are strings.
+            CurRecords of (date, account_id, service, cost) where cost is a float and others are strings.
+        """
+        key: Optional[str] = None
+        if self.result_cache is not None:
+            key = self._result_key(account_ids)
+            cached: Optional[CurRecords] = self.result_cache.get(key)
+            if cached is not None:
+                return cached
+        records: CurRecords = self._fetch(account_ids)
+        if key is not None:
+            self.result_cache.put(key, records)
+        return records
+
+    def _fetch(self, account_ids: list[str]) -> CurRecords:
+        if self.cost_cache is not None and not self.top_n_services:
+            plan: dict[str, Any] = self.cost_cache.plan(account_ids, self.query_days_range, self._cache_scope())
+            # 日数ごとのクエリはまとめて開始し、状態確認も一緒に行う
+            futures: dict[int, Future] = {
+                days_range: self.engine.submit(self._build_query(ids, days_range))
+                for days_range, ids in plan["queries"].items()
+            }
+            results: dict[int, CurRecords] = {
+                days_range: self._read_results(future.result()) for days_range, future in futures.items()
+            }
+            return self._merge_cached(plan, results)
+        query_execution_id: str = self.execute(self._build_query(account_ids))
+        return self._read_results(query_execution_id)
+
+    def fetch_async(self, account_ids: list[str]) -> Future:
+        """
+        Starts a query for given AWS account IDs without waiting for it.
+
+        Status polling is shared with every other query in flight on this DAO.
+
+        Args:
+            account_ids: List of AWS account IDs to fetch data for.
+
+        Returns:
+            Future: Resolves to the CurRecords of (date, account_id, service, cost).
+        """
+        if self.result_cache is None:
+            return self._fetch_async(account_ids)
+        key: str = self._result_key(account_ids)
+        cached: Optional[CurRecords] = self.result_cache.get(key)
+        if cached is not None:
+            result: Future = Future()
+            result.set_result(cached)
+            return result
+        future: Future = self._fetch_async(account_ids)
+
+        def on_done(f: Future) -> None:
+            if f.exception() is None:
+                self.result_cache.put(key, f.result())
+
+        future.add_done_callback(on_done)
+        return future
+
+    def _fetch_async(self, account_ids: list[str]) -> Future:
+        if self.cost_cache is None or self.top_n_services:
+            return self._query_async(account_ids)
+        plan: dict[str, Any] = self.cost_cache.plan(account_ids, self.query_days_range, self._cache_scope())
+        result: Future = Future()
+        futures: dict[int, Future] = {
+            days_range: self._query_async(ids, days_range) for days_range, ids in plan["queries"].items()
+        }
+        remaining: list[int] = [len(futures)]
+        lock = threading.Lock()
+
+        def on_done(f: Future) -> None:
+            with lock:
+                remaining[0] -= 1
+                if remaining[0] > 0:
+                    return
+            try:
+                results: dict[int, CurRecords] = {
+                    days_range: future.result() for days_range, future in futures.items()
+                }
+                result.set_result(self._merge_cached(plan, results))
+            except Exception as e:
+                result.set_exception(e)
+
+        if not futures:
+            result.set_result(CurRecords())
+        for future in futures.values():
+            future.add_done_callback(on_done)
+        return result
+
+    def _merge_cached(self, plan: dict[str, Any], results: dict[int, CurRecords]) -> CurRecords:
+        merged: CurRecords = CurRecords(self.cost_cache.merge(plan, results))
+        merged.queries = [stats for records in results.values() for stats in records.queries]
+        return merged
+
+    def record_statistics(self, query_execution_id: str) -> QueryStatistics:
+        """
+        Adds a query whose results are not read (e.g. UNLOAD) to the query log.
+
+        Args:
+            query_execution_id: QueryExecutionId of a succeeded query run through the engine.
+
+        Returns:
+            QueryStatistics: The recorded statistics (no result pages or rows).
+        """
+        return self._query_statistics(query_execution_id, 0.0, {"pages": 0, "rows": 0})
+
+    def pop_query_log(self) -> list[QueryStatistics]:
+        """
+        Returns the statistics of the queries read since the last call, and clears them.
+        """
+        with self.lock:
+            query_log: list[QueryStatistics] = self.query_log
+            self.query_log = []
+        return query_log
+
+    def close(self) -> None:
+        """
+        Releases the poller thread and the reader threads.
+
+        Called by ClientRegistry when the DAO is recreated on a warm container. Reads in
+        progress are finished before the reader threads exit.
+        """
+        self.engine.close()
+        with self.lock:
+            reader: Optional[ThreadPoolExecutor] = self.reader
+            self.reader = None
+        if reader is not None:
+            reader.shutdown(wait=True)
+
+    def _query_async(self, account_ids: list[str], days_range: Optional[int] = None) -> Future:
+        result: Future = Future()
+        query_future: Future = self.engine.submit(self._build_query(account_ids, days_range))
+        with self.lock:
+            if self.reader is None:
+                self.reader = ThreadPoolExecutor(max_workers=4, thread_name_prefix="athena-reader")
+            reader: ThreadPoolExecutor = self.reader
+
+        def read(query_execution_id: str) -> None:
+            try:
+                result.set_result(self._read_results(query_execution_id))
+            except Exception as e:
+                result.set_exception(e)
+
+        def on_done(f: Future) -> None:
+            error: Optional[BaseException] = f.exception()
+            if error is not None:
+                result.set_exception(error)
+            else:
+                reader.submit(read, f.result())
+
+        query_future.add_done_callback(on_done)
+        return result
+
+    def fetch_groups(self, account_id_groups: list[list[str]]) -> list[CurRecords]:
+        """
+        Fetches cost and usage report data for several account groups with a single query.
+
+        The query covers the union of all account IDs, and the results are split in memory
+        into one record list per group. An account that belongs to several groups appears
+        in each of their lists.
+
+        Args:
+            account_id_groups: List of AWS account ID lists, one per group.
+
+        Returns:
+            List of CurRecords in the same order as account_id_groups.
+        """
+        union_ids: list[str] = sorted({aid.strip() for ids in account_id_groups for aid in ids})
+        records: CurRecords = self.fetch(union_ids) if union_ids else CurRecords()
+        # 結果は日付・アカウント順のため、グループのアカウントだけを順序を保って取り出す
+        return [records.select_accounts(aid.strip() for aid in ids) for ids in account_id_groups]
+
+    def _cache_scope(self) -> list[str]:
+        # クエリの結果を変える設定（変わったら別のキャッシュを使う）
+        return [self.database, self.table, *sorted(lit.strip() for lit in self.line_item_types)]
+
+    def _result_key(self, account_ids: list[str]) -> str:
+        # 上位N件にまとめる場合は結果が変わるため、その設定も含める
+        scope: list[str] = [*self._cache_scope(), f"top_n={self.top_n_services}", self.others_label]
+        return fingerprint(account_ids, scope, self.query_days_range)
+
+    def partition_filter(self, days_range: int) -> str:
+        """
+        Returns the predicate that prunes the CUR table to the billing periods of a query.
+
+        Args:
+            days_range: Number of days queried.
+
+        Returns:
+            str: "AND billing_period IN (...)", or an empty string if the table is not partitioned.
         """
+        if not self.billing_period_partition:
+            return ""
+        # パーティションの絞り込みはリテラルで指定する（式では partition projection で絞り込まれない）
+        periods_str: str = ",".join([f"'{period}'" for period in billing_periods(days_range)])
+        return f"AND billing_period IN ({periods_str})"
+
+    def _build_query(self, account_ids: list[str], days_range: Optional[int] = None) -> str:
+        days_range = days_range or self.query_days_range
+        daily_query: str = self._build_daily_query(account_ids, days_range)
+        if not self.top_n_services:
+            return f"""{daily_query}
+            ORDER BY 1, 2
+        """
+        # アカウントごとにサービスを日次の最大値で順位付けし、上位N件以外はOthersにまとめる
+        # 同じ値の順位はサービス名の順で決める（plot_graphの集計と同じ）
+        # クレジットだけのサービスは最大値が負になるため、plot_graphの集計と同じく0を下限にする
+        # 色・模様の割り当て用に、全サービスの日次の最大値も日付を空にした行で返す
+        others_label: str = self.others_label.replace("'", "''")
+        return f"""
+            WITH daily AS ({daily_query}
+            ),
+            ranked AS (
+                SELECT
+                    account_id,
+                    service,
+                    GREATEST(MAX(cost), 0) AS max_daily,
+                    row_number() OVER (PARTITION BY account_id ORDER BY GREATEST(MAX(cost), 0) DESC, service) AS service_rank
+                FROM daily
+                GROUP BY 1, 2
+            )
+            SELECT
+                daily.date,
+                daily.account_id,
+                CASE WHEN ranked.service_rank <= {self.top_n_services} THEN daily.service ELSE '{others_label}' END AS service,
+                SUM(daily.cost) AS cost
+            FROM daily
+            JOIN ranked ON daily.account_id = ranked.account_id AND daily.service = ranked.service
+            GROUP BY 1, 2, 3
+            UNION ALL
+            SELECT '' AS date, account_id, service, max_daily AS cost
+            FROM ranked
+            ORDER BY 1, 2
+        """
+
+    def _build_daily_query(self, account_ids: list[str], days_range: int) -> str:
         ids_str: str = ",".join([f"'{aid.strip()}'" for aid in account_ids])
         line_item_types_str: str = ",".join([f"'{lit.strip()}'" for lit in self.line_item_types])
-        query: str = f"""
+        if self.rollup_table:
+            # ロールアップは日付（JST）でパーティション分割されているため、初日もリテラルで指定する
+            start_date: str = (datetime.now(JST).date() - timedelta(days=days_range)).isoformat()
+            return f"""
+            SELECT
+                "date",
+                account_id,
+                product_code AS service,
+                SUM(cost) AS cost
+            FROM "{self.rollup_table}"
+            WHERE
+                account_id IN ({ids_str})
+                AND "date" >= '{start_date}'
+                AND line_item_type IN ({line_item_types_str})
+            GROUP BY 1, 2, 3"""
+        partition_filter: str = self.partition_filter(days_range)
+        return f"""
             SELECT
                 date_format(date_add('hour', 9, line_item_usage_start_date), '%Y-%m-%d') AS date,
                 line_item_usage_account_id AS account_id,
@@ -51,40 +742,85 @@ class CurDAO:
             FROM "{self.table}"
             WHERE
                 line_item_usage_account_id IN ({ids_str})
-                AND line_item_usage_start_date >= date_add('day', -{self.query_days_range}, date(date_add('hour', 9, current_timestamp)))
+                AND line_item_usage_start_date >= date_add('day', -{days_range}, date(date_add('hour', 9, current_timestamp)))
                 AND line_item_line_item_type IN ({line_item_types_str})
-            GROUP BY 1, 2, 3
-            ORDER BY 1, 2
+                {partition_filter}
+            GROUP BY 1, 2, 3"""
+
+    def execute(self, query: str) -> str:
         """
-        response: dict[str, Any] = self.client.start_query_execution(
-            QueryString=query,
-            QueryExecutionContext={"Database": self.database},
-            ResultConfiguration={"OutputLocation": self.output_uri},
-            # クエリ結果の再利用設定
-            ResultReuseConfiguration={
-                "ResultReuseByAgeConfiguration": {
-                    "Enabled": True,
-                    "MaxAgeInMinutes": 60,
-                }
-            },
+        Starts an Athena query and waits for it to finish.
+
+        Args:
+            query: SQL query string.
+
+        Returns:
+            str: QueryExecutionId of the succeeded query.
+        """
+        query_execution_id: str = self.engine.start_query(query)
+        self.engine.wait(query_execution_id)
+        return query_execution_id
+
+    def _read_results(self, query_execution_id: str) -> CurRecords:
+        started: float = time.monotonic()
+        counters: dict[str, int] = {"pages": 0, "rows": 0}
+        # 1行ずつ変換しながら列ごとのコンテナに詰める
+        records: CurRecords = CurRecords()
+        if not self.top_n_services:
+            records.extend(self._iter_results(query_execution_id, counters))
+        else:
+            service_max: dict[str, dict[str, float]] = {}
+            for rec in self._iter_results(query_execution_id, counters):
+                if rec[0]:
+                    records.append(rec)
+                else:
+                    # 日付が空の行はサービスごとの日次の最大値
+                    service_max.setdefault(rec[1], {})[rec[2]] = rec[3]
+            records.service_max = service_max
+        records.queries = [self._query_statistics(query_execution_id, time.monotonic() - started, counters)]
+        return records
+
+    def _query_statistics(self, query_execution_id: str, read_seconds: float, counters: dict[str, int]) -> QueryStatistics:
+        statistics, poll_seconds = self.engine.pop_statistics(query_execution_id)
+        stats: QueryStatistics = {
+            "query_execution_id": query_execution_id,
+            "data_scanned_bytes": statistics.get("DataScannedInBytes", 0),
+            "engine_execution_ms": statistics.get("EngineExecutionTimeInMillis", 0),
+            "queue_ms": statistics.get("QueryQueueTimeInMillis", 0),
+            "planning_ms": statistics.get("QueryPlanningTimeInMillis", 0),
+            "result_reused": statistics.get("ResultReuseInformation", {}).get("ReusedPreviousResult", False),
+            "poll_seconds": poll_seconds,
+            "read_seconds": read_seconds,
+            "result_pages": counters["pages"],
+            "result_rows": counters["rows"],
+        }
+        with self.lock:
+            self.query_log.append(stats)
+        return stats
+
+    def _iter_results(self, query_execution_id: str, counters: dict[str, int]) -> Iterator[CurRecord]:
+        rows: Iterator[CurRecord] = (
+            self._iter_csv_results(query_execution_id)
+            if self.result_store is not None
+            else self._iter_api_results(query_execution_id, counters)
         )
-        query_execution_id: str = response["QueryExecutionId"]
-        print("QueryExecutionId:", query_execution_id)
-        while True:
-            status: dict[str, Any] = self.client.get_query_execution(
-                QueryExecutionId=query_execution_id
-            )
-            state: str = status["QueryExecution"]["Status"]["State"]
-            if state in ["FAILED", "CANCELLED"]:
-                reason: str = status["QueryExecution"]["Status"]["StateChangeReason"]
-                raise Exception(f"Query failed: {state} {reason}")
-            if state == "SUCCEEDED":
-                break
-            time.sleep(1)
+        for rec in rows:
+            counters["rows"] += 1
+            yield rec
+
+    def _iter_csv_results(self, query_execution_id: str) -> Iterator[CurRecord]:
+        # 結果CSVを先頭から読みながら1行ずつ変換する（全件をメモリに載せない）
+        location: str = self.engine.output_location(query_execution_id)
+        reader = csv.reader(self.result_store.iter_lines(location))
+        next(reader, None)  # ヘッダーの除外
+        for date, account_id, service, cost in reader:
+            yield (date, account_id, service, float(cost))
 
+    def _iter_api_results(self, query_execution_id: str, counters: dict[str, int]) -> Iterator[CurRecord]:
         # ページネーションで全件取得
-        query_results: list[dict[str, Any]] = []
         next_token: Optional[str] = None
+        response: dict[str, Any]
+        header: bool = True
         while True:
             if next_token:
                 response = self.client.get_query_results(
@@ -95,17 +831,16 @@ class CurDAO:
                 response = self.client.get_query_results(
                     QueryExecutionId=query_execution_id,
                 )
-            query_results.extend(response["ResultSet"]["Rows"])
+            counters["pages"] += 1
+            for row in response["ResultSet"]["Rows"]:
+                if header:
+                    # ヘッダーの除外
+                    header = False
+                    continue
+                date, account_id, service, cost = [
+                    col["VarCharValue"] for col in row["Data"]
+                ]
+                yield (date, account_id, service, float(cost))
             next_token = response.get("NextToken")
             if not next_token:
                 break
-
-        # クエリ結果を整形
-        query_results = query_results[1:]  # ヘッダーの除外
-        results: list[CurRecord] = []
-        for row in query_results:
-            date, account_id, service, cost = [
-                col["VarCharValue"] for col in row["Data"]
-            ]
-            results.append((date, account_id, service, float(cost)))
-        return results
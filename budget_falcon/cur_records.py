@@ -0,0 +1,179 @@
+from array import array
+from typing import Any, Iterable, Iterator, Optional, Union
+
+# CURの集計結果を列ごとに保持するコンテナ
+# 日付・アカウントID・サービスは辞書（重複のない値の一覧）へのインデックスで、コストはfloat64の配列で持つ
+# アカウント数が多い場合でも、同じ文字列やfloatのオブジェクトを行ごとに持たずに済む
+
+CurRecord = tuple[str, str, str, float]  # (date, account_id, service, cost)
+
+COLUMNS: tuple[str, str, str] = ("date", "account_id", "service")
+
+
+class Dictionary:
+    """
+    Dictionary encoding of a string column: each distinct value is stored once.
+    """
+    def __init__(self) -> None:
+        self.values: list[str] = []
+        self.index: dict[str, int] = {}
+
+    def encode(self, value: str) -> int:
+        code: Optional[int] = self.index.get(value)
+        if code is None:
+            code = len(self.values)
+            self.index[value] = code
+            self.values.append(value)
+        return code
+
+
+class CurRecords:
+    """
+    Columnar container of (date, account_id, service, cost) records.
+
+    The string columns are dictionary-encoded (see Dictionary) and the costs are kept in
+    a float64 array, which cost_array() exposes to NumPy without copying. For
+    compatibility it also behaves as a read-only sequence of CurRecord tuples: len(),
+    indexing, iteration and comparison with a list of tuples work as before.
+
+    Containers derived with take() or split_by_account() share the dictionaries of
+    their source.
+
+    service_max is set when the services were already folded into top N and Others by
+    the query: account_id -> service -> daily maximum, for every service of the account.
+
+    queries holds the statistics of the Athena queries that produced the container
+    (CurDAO's QueryStatistics). It is empty for derived containers and cached results.
+    """
+    def __init__(
+        self,
+        rows: Iterable[CurRecord] = (),
+        dictionaries: Optional[dict[str, Dictionary]] = None,
+    ) -> None:
+        self.dictionaries: dict[str, Dictionary] = dictionaries or {name: Dictionary() for name in COLUMNS}
+        self.codes: dict[str, array] = {name: array("i") for name in COLUMNS}
+        self.costs: array = array("d")
+        self.service_max: Optional[dict[str, dict[str, float]]] = None
+        self.queries: list[dict[str, Any]] = []
+        self.extend(rows)
+
+    def append(self, record: CurRecord) -> None:
+        date, account_id, service, cost = record
+        self.codes["date"].append(self.dictionaries["date"].encode(date))
+        self.codes["account_id"].append(self.dictionaries["account_id"].encode(account_id))
+        self.codes["service"].append(self.dictionaries["service"].encode(service))
+        self.costs.append(cost)
+
+    def extend(self, rows: Iterable[CurRecord]) -> None:
+        for record in rows:
+            self.append(record)
+
+    def column(self, name: str) -> tuple[list[str], array]:
+        """
+        Returns a dictionary-encoded column.
+
+        Args:
+            name: "date", "account_id" or "service".
+
+        Returns:
+            tuple[list[str], array]: (distinct values, code of each row into the values).
+        """
+        return self.dictionaries[name].values, self.codes[name]
+
+    def cost_array(self) -> Any:
+        """
+        Returns the costs as a float64 NumPy array sharing memory with the container.
+        """
+        import numpy as np
+        return np.frombuffer(self.costs, dtype=np.float64) if self.costs else np.zeros(0)
+
+    def take(self, indices: Iterable[int]) -> "CurRecords":
+        """
+        Returns a new container with the given rows, sharing the dictionaries.
+        """
+        taken = CurRecords(dictionaries=self.dictionaries)
+        taken.service_max = self.service_max
+        for i in indices:
+            for name in COLUMNS:
+                taken.codes[name].append(self.codes[name][i])
+            taken.costs.append(self.costs[i])
+        return taken
+
+    def select_accounts(self, account_ids: Iterable[str]) -> "CurRecords":
+        """
+        Returns the rows of the given accounts, keeping their order.
+        """
+        account_index: dict[str, int] = self.dictionaries["account_id"].index
+        codes: set[int] = {account_index[aid] for aid in account_ids if aid in account_index}
+        return self.take(i for i, code in enumerate(self.codes["account_id"]) if code in codes)
+
+    def split_by_account(self, account_ids: Iterable[str]) -> dict[str, "CurRecords"]:
+        """
+        Splits the rows by account in one pass, keeping their order.
+
+        Args:
+            account_ids: Accounts to keep. Rows of other accounts are dropped.
+
+        Returns:
+            dict[str, CurRecords]: Rows of each account (empty if it has none).
+        """
+        account_index: dict[str, int] = self.dictionaries["account_id"].index
+        rows_by_code: dict[int, list[int]] = {}
+        result: dict[str, list[int]] = {}
+        for aid in account_ids:
+            rows: list[int] = result.setdefault(aid, [])
+            code: Optional[int] = account_index.get(aid)
+            if code is not None:
+                rows_by_code[code] = rows
+        for i, code in enumerate(self.codes["account_id"]):
+            rows = rows_by_code.get(code)
+            if rows is not None:
+                rows.append(i)
+        return {aid: self.take(rows) for aid, rows in result.items()}
+
+    def sorted_by_date_account(self) -> "CurRecords":
+        """
+        Returns the rows sorted by date and account (stable for ties).
+        """
+        dates: list[str] = self.dictionaries["date"].values
+        accounts: list[str] = self.dictionaries["account_id"].values
+        date_codes: array = self.codes["date"]
+        account_codes: array = self.codes["account_id"]
+        order: list[int] = sorted(
+            range(len(self)), key=lambda i: (dates[date_codes[i]], accounts[account_codes[i]])
+        )
+        return self.take(order)
+
+    def __len__(self) -> int:
+        return len(self.costs)
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[CurRecord, list[CurRecord]]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("CurRecords index out of range")
+        return (
+            self.dictionaries["date"].values[self.codes["date"][index]],
+            self.dictionaries["account_id"].values[self.codes["account_id"][index]],
+            self.dictionaries["service"].values[self.codes["service"][index]],
+            self.costs[index],
+        )
+
+    def __iter__(self) -> Iterator[CurRecord]:
+        dates: list[str] = self.dictionaries["date"].values
+        accounts: list[str] = self.dictionaries["account_id"].values
+        services: list[str] = self.dictionaries["service"].values
+        for date, account, service, cost in zip(
+            self.codes["date"], self.codes["account_id"], self.codes["service"], self.costs
+        ):
+            yield (dates[date], accounts[account], services[service], cost)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (CurRecords, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"CurRecords({list(self)!r})"
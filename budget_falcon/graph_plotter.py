@@ -1,41 +1,107 @@
+import io
 import os
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from collections import defaultdict
-from datetime import datetime
-import yaml
-from matplotlib.font_manager import FontProperties
-from typing import Any
+import json
+import hashlib
+import functools
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Iterable, NotRequired, Optional, TypedDict, Union
 
+try:
+    from .cur_records import CurRecords
+except ImportError:
+    # Lambdaではパッケージではなくフラットなモジュールとして読み込まれる
+    from cur_records import CurRecords
+
+
+# matplotlib.pyplot・matplotlib.font_manager・yamlは読み込みに時間がかかるため、
+# コールドスタートを短くするために初回のグラフ描画時まで読み込まない
+@functools.cache
+def _pyplot() -> Any:
+    import matplotlib.pyplot as plt
+    # グラフ生成の高速化のための設定
+    plt.style.use('fast')
+    plt.rcParams['path.simplify'] = True
+    plt.rcParams['path.simplify_threshold'] = 1.0
+    plt.rcParams['agg.path.chunksize'] = 10000
+    return plt
 
-# グラフ生成の高速化のための設定
-plt.style.use('fast')
-plt.rcParams['path.simplify'] = True
-plt.rcParams['path.simplify_threshold'] = 1.0
-plt.rcParams['agg.path.chunksize'] = 10000
 
 # フォント設定
 font_path: str = os.path.join(os.path.dirname(__file__), "fonts", "NotoSansJP-Light.ttf")
-jp_font_prop = FontProperties(fname=font_path)
 title_fontsize: int = 30
 label_fontsize: int = 10
 tick_fontsize: int = 20
 legend_fontsize: int = 20
 
+
+@functools.cache
+def _font_prop() -> Any:
+    from matplotlib.font_manager import FontProperties
+    return FontProperties(fname=font_path)
+
+
+JST = timezone(timedelta(hours=9))
+
 # Y軸のtopの最小値
 y_top_min: float = 0.01
 
 # サービス設定ファイルの読み込み
+# services.yml から生成した services.json（YAMLのハッシュ付き）が最新であればそちらを使い、YAMLのパースを省く
 service_config_path: str = os.path.join(os.path.dirname(__file__), "config", "services.yml")
+service_config_cache_path: str = os.path.join(os.path.dirname(__file__), "config", "services.json")
+
+
+def _parse_service_yaml(source: bytes) -> dict[str, Any]:
+    import yaml
+    try:
+        return yaml.safe_load(source)
+    except yaml.YAMLError as e:
+        raise ValueError(e) from e
+
+
+def _load_service_config() -> dict[str, Any]:
+    with open(service_config_path, 'rb') as f:
+        source: bytes = f.read()
+    try:
+        with open(service_config_cache_path, 'r', encoding='utf-8') as f:
+            cache: dict[str, Any] = json.load(f)
+        if cache.get("source_sha256") == hashlib.sha256(source).hexdigest():
+            return cache["config"]
+        print(f"{service_config_cache_path} is outdated, parsing {service_config_path}")
+    except (FileNotFoundError, json.JSONDecodeError):
+        pass
+    return _parse_service_yaml(source)
+
+
+def write_service_config_cache() -> str:
+    """
+    Writes services.json, the pre-parsed form of services.yml loaded at import time.
+
+    Run this after editing services.yml (python budget_falcon/graph_plotter.py).
+
+    Returns:
+        str: Path of the written file
+    """
+    with open(service_config_path, 'rb') as f:
+        source: bytes = f.read()
+    cache: dict[str, Any] = {
+        "source_sha256": hashlib.sha256(source).hexdigest(),
+        "config": _parse_service_yaml(source),
+    }
+    with open(service_config_cache_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    return service_config_cache_path
+
+
 try:
-    with open(service_config_path, 'r', encoding='utf-8') as f:
-        config: dict[str, Any] = yaml.safe_load(f)
-        SERVICE_LABEL_MAP: dict[str, list[str]] = config['services']
-        CATEGORY_COLOR_MAP: dict[str, str] = config['colors']
-        OTHERS: str = config['others']['label']
-        OTHERS_COLOR: str = config['others']['color']
-        OTHERS_HATCH: str = config['others']['hatch']
-except (FileNotFoundError, yaml.YAMLError, KeyError) as e:
+    config: dict[str, Any] = _load_service_config()
+    SERVICE_LABEL_MAP: dict[str, list[str]] = config['services']
+    CATEGORY_COLOR_MAP: dict[str, str] = config['colors']
+    OTHERS: str = config['others']['label']
+    OTHERS_COLOR: str = config['others']['color']
+    OTHERS_HATCH: str = config['others']['hatch']
+except (FileNotFoundError, ValueError, KeyError) as e:
     raise RuntimeError(f"Failed to load services configuration: {e}") from e
 
 HATCH_PATTERNS: list[str] = ["", "...", "////", "xxxx", "|||", "+++", "\\\\\\\\", "oo", "OO", "**"]
@@ -44,15 +110,30 @@ HATCH_PATTERNS: list[str] = ["", "...", "////", "xxxx", "|||", "+++", "\\\\\\\\"
 ServiceRecord = tuple[str, str, str, float]  # (date, account_id, service, cost)
 Account = tuple[str, str]  # (account_id, account_name)
 
+
+def preload() -> None:
+    """
+    Imports matplotlib and loads the font file ahead of the first chart.
+
+    The service configuration is already loaded at import time. Intended as the
+    initializer of render worker processes, so each process pays these costs once.
+    """
+    from matplotlib.font_manager import get_font
+    _pyplot()
+    _font_prop()
+    get_font(font_path)
+
 def _color_hatch_map(
-    records_by_account: dict[str, list[ServiceRecord]] = {},
-    service_order: list[str] = []
+    records_by_account: dict[str, Iterable[ServiceRecord]] = {},
+    service_order: list[str] = [],
+    all_services: Optional[Iterable[str]] = None,
 ) -> tuple[dict[str, str], dict[str, str]]:
-    # サービスごとにカテゴリを集計
-    all_services: set[str] = set()
-    for recs in records_by_account.values():
-        for _, _, service, _ in recs:
-            all_services.add(service)
+    # サービスごとにカテゴリを集計（all_services の指定がなければレコードから集める）
+    if all_services is None:
+        all_services = set()
+        for recs in records_by_account.values():
+            for _, _, service, _ in recs:
+                all_services.add(service)
     services: list[str] = sorted(list(all_services))
 
     # カテゴリごとにサービスをまとめる
@@ -98,68 +179,570 @@ def _color_hatch_map(
     return service_color_map, service_hatch_map
 
 
-def plot_graph(
-    records: list[ServiceRecord],
+class AccountSeries(TypedDict):
+    dates: list[datetime]  # 記録のある日付（昇順）
+    services: list[str]    # 積み上げる順のサービス（上位N件、必要ならOthers）
+    values: Any            # サービス x 日付 のコスト（numpy.ndarray）
+    bottoms: Any           # サービス x 日付 の積み上げの下端（numpy.ndarray）
+    max_total: float       # 日次合計の最大値（記録がなければ0）
+
+
+# 集計結果（全アカウントのサービス順序, アカウントごとの系列）
+Aggregate = tuple[list[str], dict[str, AccountSeries]]
+
+
+def _parse_date(date_str: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(date_str, "%Y-%m-%d")
+    except Exception:
+        return None
+
+
+def _aggregate(
+    records: Iterable[ServiceRecord],
+    account_ids: list[str],
+    top_n_services: int,
+) -> tuple[list[str], dict[str, AccountSeries]]:
+    """
+    Aggregates the records into the series drawn for each account.
+
+    The records are read once into a dense account x date x service cost cube, and the
+    service order, the top services of each account, the Others series, the stacking
+    bottoms and the daily totals are derived from it. Ties in the rankings are broken by
+    service name, the same as the top N query of CurDAO, so the result does not depend on
+    the order of the records.
+
+    Args:
+        records: (date, account_id, service, cost) records, as a list or CurRecords
+        account_ids: Accounts to draw. Records of other accounts are ignored.
+        top_n_services: Number of top services drawn for each account
+
+    Returns:
+        tuple[list[str], dict[str, AccountSeries]]: (services by descending daily maximum
+        over all accounts, series of each account)
+    """
+    import numpy as np
+
+    # 列ごとのコンテナに揃える（日付・サービスの文字列は重複のない値ごとに1回だけ扱う）
+    columns: Any = records if hasattr(records, "column") else CurRecords(records)
+    date_values, date_codes = columns.column("date")
+    account_values, account_codes = columns.column("account_id")
+    service_values, service_codes = columns.column("service")
+    costs: Any = columns.cost_array()
+
+    account_index: dict[str, int] = {}
+    for aid in account_ids:
+        account_index.setdefault(aid, len(account_index))
+    parsed_dates: list[Optional[datetime]] = [_parse_date(d) for d in date_values]
+    dates: list[datetime] = sorted({d for d in parsed_dates if d is not None})
+    date_index: dict[datetime, int] = {d: i for i, d in enumerate(dates)}
+
+    # 行ごとのアカウント・日付の位置（対象外のアカウントや日付として読めない行は-1）
+    account_lut = np.array([account_index.get(a, -1) for a in account_values], dtype=np.intp)
+    date_lut = np.array([date_index[d] if d is not None else -1 for d in parsed_dates], dtype=np.intp)
+    row_accounts = account_lut[np.asarray(account_codes, dtype=np.intp)]
+    row_dates = date_lut[np.asarray(date_codes, dtype=np.intp)]
+    rows = np.flatnonzero((row_accounts >= 0) & (row_dates >= 0))
+    row_accounts, row_dates = row_accounts[rows], row_dates[rows]
+    row_services = np.asarray(service_codes, dtype=np.intp)[rows]
+
+    # サービスはアカウント順・行順で最初に現れた順に並べる
+    appearance = np.lexsort((rows, row_accounts))
+    codes, first = np.unique(row_services[appearance], return_index=True)
+    codes = codes[np.argsort(first)]
+    services: list[str] = [service_values[c] for c in codes]
+    service_lut = np.full(len(service_values), -1, dtype=np.intp)
+    service_lut[codes] = np.arange(len(codes))
+    row_services = service_lut[row_services]
+    # 同じ値の順位はサービス名の順で決める（CurDAOの上位N件のクエリと同じ）
+    name_rank = np.empty(len(services), dtype=np.intp)
+    name_rank[sorted(range(len(services)), key=services.__getitem__)] = np.arange(len(services))
+
+    shape: tuple[int, int, int] = (len(account_index), len(dates), len(services))
+    cube = np.zeros(shape)
+    np.add.at(cube, (row_accounts, row_dates, row_services), costs[rows])
+    present = np.zeros(shape, dtype=bool)
+    present[row_accounts, row_dates, row_services] = True
+
+    # 日次の最大値（記録のない日は0として扱う）
+    service_max_daily = cube.max(axis=1, initial=0.0)
+    service_max: Optional[dict[str, dict[str, float]]] = getattr(records, "service_max", None)
+    if service_max is not None:
+        # クエリで上位N件とOthersにまとめ済みの場合は、クエリが返した全サービスの日次の最大値を使う
+        global_service_max_daily: dict[str, float] = {}
+        for aid in account_index:
+            for service, cost in service_max.get(aid, {}).items():
+                global_service_max_daily[service] = max(global_service_max_daily.get(service, 0.0), cost)
+        global_service_order: list[str] = [
+            k for k, _ in sorted(global_service_max_daily.items(), key=lambda x: (-x[1], x[0]))
+        ]
+    else:
+        global_max = service_max_daily.max(axis=0, initial=0.0)
+        global_service_order = [services[i] for i in np.lexsort((name_rank, -global_max))]
+
+    others_index: int = services.index(OTHERS) if OTHERS in services else -1
+    series_by_account: dict[str, AccountSeries] = {}
+    for aid, a in account_index.items():
+        date_mask = present[a].any(axis=1)
+        service_mask = present[a].any(axis=0)
+        daily = cube[a][date_mask]  # 日付 x サービス
+        # まとめ済みのOthersは順位付けせず、常に最後に積む
+        candidates = np.flatnonzero(service_mask & (np.arange(len(services)) != others_index))
+        ranked = candidates[np.lexsort((name_rank[candidates], -service_max_daily[a, candidates]))]
+        top = ranked[:top_n_services]
+        stacked = daily[:, top].T
+        series_services: list[str] = [services[i] for i in top]
+        if service_mask.sum() > top_n_services:
+            others_mask = np.ones(len(services), dtype=bool)
+            others_mask[top] = False
+            stacked = np.vstack([stacked, daily[:, others_mask].sum(axis=1)])
+            series_services.append(OTHERS)
+        bottoms = np.zeros_like(stacked)
+        if len(stacked) > 1:
+            bottoms[1:] = np.cumsum(stacked[:-1], axis=0)
+        series_by_account[aid] = {
+            "dates": [d for d, m in zip(dates, date_mask) if m],
+            "services": series_services,
+            "values": stacked,
+            "bottoms": bottoms,
+            "max_total": float(daily.sum(axis=1).max(initial=0.0)) if len(daily) else 0.0,
+        }
+    return global_service_order, series_by_account
+
+
+# 棒の幅（日付の数値で1日 = 1.0、ax.barのデフォルトと同じ）
+BAR_WIDTH: float = 0.8
+
+
+def _draw_bars_patches(
+    ax: Any,
+    dates_num: Any,
+    series: AccountSeries,
+    service_color_map: dict[str, Any],
+    service_hatch_map: dict[str, str],
+) -> None:
+    # サービスごとにax.barで描く（棒1本ごとにRectangleが作られる）
+    for s, values, bottom in zip(series["services"], series["values"], series["bottoms"]):
+        ax.bar(
+            dates_num,
+            values,
+            width=BAR_WIDTH,
+            bottom=bottom,
+            label=s,
+            color=service_color_map.get(s, OTHERS_COLOR),
+            hatch=service_hatch_map.get(s, OTHERS_HATCH),
+        )
+
+
+def _draw_bars_collections(
+    ax: Any,
+    dates_num: Any,
+    series: AccountSeries,
+    service_color_map: dict[str, Any],
+    service_hatch_map: dict[str, str],
+) -> None:
+    # サービスごとに全日付の棒を1つのPolyCollectionで描く（アーティスト数が日数に比例しない）
+    import numpy as np
+    from matplotlib.collections import PolyCollection
+    if not len(dates_num):
+        return
+    left = np.asarray(dates_num) - BAR_WIDTH / 2
+    right = left + BAR_WIDTH
+    for s, values, bottom in zip(series["services"], series["values"], series["bottoms"]):
+        top = bottom + values
+        # ax.barのRectangleと同じ頂点の順（左下・右下・右上・左上）
+        verts = np.stack([
+            np.column_stack([left, bottom]),
+            np.column_stack([right, bottom]),
+            np.column_stack([right, top]),
+            np.column_stack([left, top]),
+        ], axis=1)
+        collection = PolyCollection(
+            verts,
+            closed=True,
+            facecolors=service_color_map.get(s, OTHERS_COLOR),
+            edgecolors="none",
+            hatch=service_hatch_map.get(s, OTHERS_HATCH),
+            label=s,
+        )
+        # ax.barと同じく棒の下端で余白を止める（Y軸の自動範囲を合わせる）
+        collection.sticky_edges.y.extend(bottom.tolist())
+        ax.add_collection(collection, autolim=True)
+    ax.autoscale_view()
+
+
+BAR_RENDERERS: dict[str, Any] = {
+    "patches": _draw_bars_patches,
+    "collections": _draw_bars_collections,
+}
+
+
+# tight: tight_layoutとbbox_inches="tight"で文字の大きさを測って余白を決める
+# fixed: 余白・凡例の寸法をサブプロットの行・列数と凡例の項目から計算し、1回の描画で保存する
+LAYOUTS: tuple[str, str] = ("tight", "fixed")
+
+# 固定レイアウトの寸法（インチ）
+CELL_SIZE: tuple[float, float] = (8.0, 4.0)  # サブプロット1つ分の幅・高さ（tightのfigsizeと同じ）
+AXES_MARGIN_LEFT: float = 0.55    # Y軸の目盛りとラベル
+AXES_MARGIN_RIGHT: float = 0.15
+AXES_MARGIN_TOP: float = 0.35     # タイトル
+AXES_MARGIN_BOTTOM: float = 0.4   # 2行になるX軸の目盛り
+FIGURE_PAD: float = 0.1           # 図の外周
+LEGEND_GAP: float = 0.1           # サブプロットと凡例の間
+
+# 凡例の寸法（フォントサイズに対する比、matplotlibのlegend.*の既定値と同じ）
+LEGEND_BORDER_PAD: float = 0.4
+LEGEND_HANDLE_LENGTH: float = 2.0
+LEGEND_HANDLE_TEXT_PAD: float = 0.8
+LEGEND_LABEL_SPACING: float = 0.5
+LEGEND_LINE_HEIGHT: float = 1.05  # 1行の文字の高さ
+# 文字幅（全角は1文字がフォントサイズと同じ幅、半角は平均の幅より少し大きめに見積もる）
+WIDE_CHAR_WIDTH: float = 1.0
+NARROW_CHAR_WIDTH: float = 0.6
+
+
+class FixedLayout(TypedDict):
+    figsize: tuple[float, float]        # 図の幅・高さ（インチ）
+    subplot_params: dict[str, float]    # left, right, bottom, top, wspace, hspace（図に対する比）
+    legend_anchor: tuple[float, float]  # 凡例の左端・中央の位置（図に対する比）
+
+
+def _text_width(text: str) -> float:
+    # 文字数から見積もる幅（フォントサイズ単位）
+    import unicodedata
+    return sum(
+        WIDE_CHAR_WIDTH if unicodedata.east_asian_width(c) in ("W", "F") else NARROW_CHAR_WIDTH
+        for c in text
+    )
+
+
+def _fixed_layout(nrows: int, ncols: int, legend_labels: list[str], legend_font_size: float) -> FixedLayout:
+    """
+    Computes the figure geometry without measuring any text.
+
+    The subplots keep the CELL_SIZE cells of the tight layout, with fixed margins for
+    the titles and tick labels. The legend is placed on the right of the grid, sized
+    from its number of entries and the character widths of its labels, and the figure
+    is made tall enough to hold it.
+
+    Args:
+        nrows: Number of subplot rows
+        ncols: Number of subplot columns
+        legend_labels: Labels of the legend entries
+        legend_font_size: Font size of the legend in points
+
+    Returns:
+        FixedLayout: Figure size, subplot parameters and legend position
+    """
+    em: float = legend_font_size / 72
+    legend_width: float = em * (
+        2 * LEGEND_BORDER_PAD + LEGEND_HANDLE_LENGTH + LEGEND_HANDLE_TEXT_PAD
+        + max((_text_width(label) for label in legend_labels), default=0.0)
+    )
+    legend_height: float = em * (
+        2 * LEGEND_BORDER_PAD
+        + len(legend_labels) * LEGEND_LINE_HEIGHT
+        + max(len(legend_labels) - 1, 0) * LEGEND_LABEL_SPACING
+    )
+
+    cell_width, cell_height = CELL_SIZE
+    grid_width: float = ncols * cell_width
+    grid_height: float = nrows * cell_height
+    width: float = FIGURE_PAD + grid_width + LEGEND_GAP + legend_width + FIGURE_PAD
+    height: float = max(grid_height, legend_height) + 2 * FIGURE_PAD
+    # 凡例の方が高い場合は、サブプロットを上下の中央に置く
+    grid_bottom: float = (height - grid_height) / 2
+    axes_width: float = cell_width - AXES_MARGIN_LEFT - AXES_MARGIN_RIGHT
+    axes_height: float = cell_height - AXES_MARGIN_TOP - AXES_MARGIN_BOTTOM
+    return {
+        "figsize": (width, height),
+        "subplot_params": {
+            "left": (FIGURE_PAD + AXES_MARGIN_LEFT) / width,
+            "right": (FIGURE_PAD + grid_width - AXES_MARGIN_RIGHT) / width,
+            "bottom": (grid_bottom + AXES_MARGIN_BOTTOM) / height,
+            "top": (grid_bottom + grid_height - AXES_MARGIN_TOP) / height,
+            "wspace": (AXES_MARGIN_LEFT + AXES_MARGIN_RIGHT) / axes_width,
+            "hspace": (AXES_MARGIN_TOP + AXES_MARGIN_BOTTOM) / axes_height,
+        },
+        "legend_anchor": ((FIGURE_PAD + grid_width + LEGEND_GAP) / width, 0.5),
+    }
+
+
+def aggregate_records(
+    records: Iterable[ServiceRecord],
     accounts: list[Account],
-    output_path: str,
-    top_n_services: int = 8
+    top_n_services: int = 8,
+) -> Aggregate:
+    """
+    Aggregates the records of a chart once, to pass to chart_fingerprint and plot_graph_pages.
+
+    Args:
+        records: (date, account_id, service, cost) records, as a list or CurRecords
+        accounts: List of (account_id, account_name) pairs
+        top_n_services: Number of top services to show in the chart
+
+    Returns:
+        Aggregate: (services by descending daily maximum over all accounts, series of each account)
+    """
+    return _aggregate(records, [a[0] for a in accounts], top_n_services)
+
+
+def chart_fingerprint(
+    records: Iterable[ServiceRecord],
+    accounts: list[Account],
+    top_n_services: int = 8,
+    today: Optional[date] = None,
+    aggregated: Optional[Aggregate] = None,
+    **options: Any,
 ) -> str:
+    """
+    Returns a key identifying the chart plot_graph would draw, without drawing it.
+
+    The key covers the aggregated series of each account (costs rounded to 1e-6 USD,
+    so the summation order of the query does not change it), the account names, the
+    service configuration, the drawing options and the run date.
+
+    Args:
+        records: (date, account_id, service, cost) records, as a list or CurRecords
+        accounts: List of (account_id, account_name) pairs
+        top_n_services: Number of top services to show in the chart
+        today: Run date in JST (defaults to now)
+        aggregated: Result of aggregate_records for the same arguments, to skip the aggregation
+        options: Other keyword arguments of plot_graph (e.g. layout, encoding)
+
+    Returns:
+        str: Hex digest identifying the chart
+    """
+    import numpy as np
+
+    today = today or datetime.now(JST).date()
+    global_service_order, series_by_account = (
+        aggregated if aggregated is not None else aggregate_records(records, accounts, top_n_services)
+    )
+    digest = hashlib.sha256()
+    header: dict[str, Any] = {
+        "accounts": [list(account) for account in accounts],
+        "top_n_services": top_n_services,
+        "service_order": global_service_order,
+        "config": config,
+        "options": options,
+        "date": today.isoformat(),
+    }
+    digest.update(json.dumps(header, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+    for account_id, series in series_by_account.items():
+        digest.update(json.dumps(
+            [account_id, [d.strftime("%Y-%m-%d") for d in series["dates"]], series["services"]]
+        ).encode("utf-8"))
+        # -0.0 は 0.0 に揃える
+        digest.update((np.round(series["values"], 6) + 0.0).astype(np.float64).tobytes())
+    return digest.hexdigest()[:32]
+
+
+IMAGE_FORMATS: tuple[str, str] = ("png", "webp")
+
+
+class ImageEncoding(TypedDict):
+    format: NotRequired[str]          # "png"（デフォルト）または "webp"
+    compress_level: NotRequired[int]  # PNGのzlibの圧縮レベル 0-9（デフォルト6、小さいほど速く大きい）
+    palette_colors: NotRequired[int]  # 指定時はPNGをこの色数以下のパレット画像にする（2-256）
+    quality: NotRequired[int]         # WebPの画質 1-100（デフォルト80）
+    lossless: NotRequired[bool]       # WebPを可逆圧縮にする
+    dpi: NotRequired[float]           # 解像度（デフォルトはmatplotlibの設定、通常100）
+    max_pixels: NotRequired[int]      # 画像の長辺の上限（ピクセル、超える場合は解像度を下げる）
+
+
+def _save_figure(fig: Any, output: Any, encoding: ImageEncoding, tight: bool) -> None:
+    """
+    Encodes the figure into a path or a binary file object.
+
+    PNG and WebP are written by matplotlib through Pillow. A palette PNG is first
+    rendered as an uncompressed PNG, then quantized to palette_colors colors (the
+    charts only use the few category colors of services.yml, white hatches and the
+    antialiased text) and compressed once.
+
+    Args:
+        fig: matplotlib Figure
+        output: Path or binary file object
+        encoding: Output format options
+        tight: Crop the image to its content (bbox_inches="tight")
+    """
+    image_format: str = encoding.get("format", "png")
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Unknown image format: {image_format}")
+    dpi: float = encoding.get("dpi") or fig.dpi
+    max_pixels: Optional[int] = encoding.get("max_pixels")
+    if max_pixels:
+        # 図の寸法から見積もる（tightでは切り抜きで多少変わる）
+        dpi = min(dpi, max_pixels / max(fig.get_size_inches()))
+    save_kwargs: dict[str, Any] = {"dpi": dpi}
+    if tight:
+        save_kwargs["bbox_inches"] = "tight"
+    compress_level: int = encoding.get("compress_level", 6)
+    palette_colors: int = encoding.get("palette_colors", 0)
+
+    if image_format == "webp":
+        pil_kwargs: dict[str, Any] = {"quality": encoding.get("quality", 80), "lossless": encoding.get("lossless", False)}
+        fig.savefig(output, format="webp", pil_kwargs=pil_kwargs, **save_kwargs)
+    elif palette_colors:
+        from PIL import Image
+        raw = io.BytesIO()
+        fig.savefig(raw, format="png", pil_kwargs={"compress_level": 0}, **save_kwargs)
+        raw.seek(0)
+        # 背景は不透明なのでRGBに落としてから減色する（ディザリングはしない）
+        image = Image.open(raw).convert("RGB").quantize(
+            colors=palette_colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE
+        )
+        image.save(output, format="png", compress_level=compress_level)
+    else:
+        fig.savefig(output, format="png", pil_kwargs={"compress_level": compress_level}, **save_kwargs)
+
+
+def paginate_accounts(accounts: list[Account], max_subplots: int) -> list[list[Account]]:
+    """
+    Splits the accounts of a chart into pages of at most max_subplots accounts.
+
+    The accounts are spread evenly over the fewest pages, so the last page is not left
+    with a few subplots in a different grid.
+
+    Args:
+        accounts: List of (account_id, account_name) pairs
+        max_subplots: Maximum number of subplots per page (0 or less for a single page)
+
+    Returns:
+        list[list[Account]]: Accounts of each page, in order
+    """
+    if max_subplots <= 0 or len(accounts) <= max_subplots:
+        return [accounts]
+    n_pages: int = -(-len(accounts) // max_subplots)
+    page_size: int = -(-len(accounts) // n_pages)
+    return [accounts[i:i + page_size] for i in range(0, len(accounts), page_size)]
+
+
+def _grid(n_accounts: int) -> tuple[int, int]:
+    # サブプロットの行・列数を決定
+    if n_accounts <= 3:
+        return n_accounts, 1
+    if n_accounts <= 12:
+        return (n_accounts + 1) // 2, 2
+    return (n_accounts + 2) // 3, 3
+
+
+def _page_path(output_path: Optional[str], page: int, n_pages: int) -> Optional[str]:
+    # 複数ページの場合は chart_0.png -> chart_0_1.png, chart_0_2.png ... とする
+    if output_path is None or n_pages == 1:
+        return output_path
+    root, ext = os.path.splitext(output_path)
+    return f"{root}_{page + 1}{ext}"
+
+
+def plot_graph(
+    records: Iterable[ServiceRecord],
+    accounts: list[Account],
+    output_path: Optional[str] = None,
+    top_n_services: int = 8,
+    bar_renderer: str = "collections",
+    layout: str = "tight",
+    encoding: Optional[ImageEncoding] = None,
+) -> Union[str, bytes]:
     """
     Creates a stacked bar chart of AWS costs by service for each account.
 
     Args:
-        records: List of (date, account_id, service, cost) records
+        records: (date, account_id, service, cost) records, as a list or CurRecords
         accounts: List of (account_id, account_name) pairs
-        output_path: Path where the chart image should be saved
+        output_path: Path where the chart image should be saved. If omitted, the image
+            is encoded in memory and returned as bytes, without touching the disk.
         top_n_services: Number of top services to show in the chart (default: 8)
+        bar_renderer: "collections" (default) draws each service of a subplot as one
+            collection, "patches" draws one ax.bar per service. Both give the same image.
+        layout: "tight" (default) fits the margins and the legend by measuring the text,
+            "fixed" computes them from the grid and the legend entries (see _fixed_layout)
+            and saves the chart in a single draw.
+        encoding: Image format, compression, palette quantization and resolution
+            (see ImageEncoding). Defaults to a PNG at the default resolution.
+
+    Returns:
+        Union[str, bytes]: Path to the generated chart image, or the encoded image if no
+        output_path is given
+    """
+    return _render_pages(
+        records, accounts, [accounts], output_path, top_n_services, bar_renderer, layout, encoding
+    )[0]
+
+
+def plot_graph_pages(
+    records: Iterable[ServiceRecord],
+    accounts: list[Account],
+    output_path: Optional[str] = None,
+    top_n_services: int = 8,
+    max_subplots: int = 0,
+    bar_renderer: str = "collections",
+    layout: str = "tight",
+    encoding: Optional[ImageEncoding] = None,
+    aggregated: Optional[Aggregate] = None,
+) -> list[Union[str, bytes]]:
+    """
+    Creates the chart of plot_graph split into pages of at most max_subplots accounts.
+
+    The services are ranked, colored and hatched over all the accounts, and every page
+    carries the legend of the whole group, so the pages read as one chart. Each page is
+    a separate figure, closed before the next one is drawn, so the memory use is bounded
+    by the page size instead of the group size.
+
+    Args:
+        records: (date, account_id, service, cost) records, as a list or CurRecords
+        accounts: List of (account_id, account_name) pairs
+        output_path: Path of the image. With several pages, the page number is appended
+            to the file name (chart.png -> chart_1.png, chart_2.png, ...). If omitted,
+            the pages are encoded in memory.
+        top_n_services: Number of top services to show in each subplot (default: 8)
+        max_subplots: Maximum number of accounts per page (0 for a single page)
+        bar_renderer, layout, encoding: See plot_graph
+        aggregated: Result of aggregate_records for the same records, accounts and
+            top_n_services (e.g. computed for chart_fingerprint), to skip the aggregation
 
     Returns:
-        str: Path to the generated chart image
+        list[Union[str, bytes]]: Path or encoded image of each page, in order
     """
+    return _render_pages(
+        records, accounts, paginate_accounts(accounts, max_subplots), output_path,
+        top_n_services, bar_renderer, layout, encoding, aggregated,
+    )
+
+
+def _render_pages(
+    records: Iterable[ServiceRecord],
+    accounts: list[Account],
+    pages: list[list[Account]],
+    output_path: Optional[str],
+    top_n_services: int,
+    bar_renderer: str,
+    layout: str,
+    encoding: Optional[ImageEncoding],
+    aggregated: Optional[Aggregate] = None,
+) -> list[Union[str, bytes]]:
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    plt = _pyplot()
+    import matplotlib.dates as mdates
+    import matplotlib.patches as mpatches
+    jp_font_prop = _font_prop()
     plt.rcParams["axes.unicode_minus"] = False
     plt.rcParams["hatch.color"] = "#ffffff"
 
     account_ids: list[str] = [account[0] for account in accounts]
-    account_names: list[str] = [account[1] for account in accounts]
-
-    # アカウントごとにデータ分割
-    records_by_account: dict[str, list[ServiceRecord]] = {aid: [] for aid in account_ids}
-    for rec in records:
-        _, account_id, _, _ = rec
-        if account_id in records_by_account:
-            records_by_account[account_id].append(rec)
 
-    # サブプロットの行・列数を決定
-    n_accounts = len(account_ids)
-    if n_accounts <= 3:
-        nrows, ncols = n_accounts, 1
-    elif n_accounts <= 12:
-        nrows = (n_accounts + 1) // 2
-        ncols = 2
-    else:
-        nrows = (n_accounts + 2) // 3
-        ncols = 3
-
-    # まず全アカウントのservice_max_dailyを集計し、サービス順序を決める
-    # service -> cost(日次の最大値)
-    global_service_max_daily: dict[str, float] = defaultdict(float)
-    for recs in records_by_account.values():
-        tmp_daily: dict[tuple[str, datetime], float] = defaultdict(float)
-        for date_str, _, service, cost in recs:
-            try:
-                date: datetime = datetime.strptime(date_str, "%Y-%m-%d")
-            except Exception:
-                continue
-            tmp_daily[(service, date)] += cost
-            global_service_max_daily[service] = max(global_service_max_daily[service], tmp_daily[(service, date)])
-    # cost降順でサービスリスト
-    global_service_order: list[str] = [k for k, _ in sorted(global_service_max_daily.items(), key=lambda x:x[1], reverse=True)]
+    # 全アカウントのサービス順序と、アカウントごとの積み上げる系列を1回の集計で求める
+    global_service_order, series_by_account = (
+        aggregated if aggregated is not None else aggregate_records(records, accounts, top_n_services)
+    )
 
     # --- グラフ描画 ---
     # 色と模様の組み合わせでサービスを区別（サービス順序を渡す）
-    service_color_map, service_hatch_map = _color_hatch_map(records_by_account, service_order=global_service_order)
-    fig, axes = plt.subplots(nrows, ncols, figsize=(8 * ncols, 4 * nrows), sharex=False)
-    axes = axes.flatten() if n_accounts > 1 else [axes]
+    service_color_map, service_hatch_map = _color_hatch_map(
+        service_order=global_service_order,
+        all_services=global_service_order,
+    )
 
     def get_service_label(s):
         if s == OTHERS:
@@ -168,91 +751,17 @@ def plot_graph(
             return SERVICE_LABEL_MAP[s][0]
         return s
 
-    legend_handles_dict: dict[str, Any] = {}  # Any is used for matplotlib.patches.Rectangle
+    # 凡例の項目（固定レイアウトでは図の寸法を決めるため、描画の前に求める）
     legend_labels_dict: dict[str, str] = {}
     legend_category_dict: dict[str, str | None] = {}  # service -> category
-    for idx, account_id in enumerate(account_ids):
-        ax = axes[idx]
-        # 日付・サービスごとにコストを集計
-        cost_dict: dict[datetime, dict[str, float]] = defaultdict(lambda: defaultdict(float))
-        service_totals: dict[str, float] = defaultdict(float)
-        service_max_daily: dict[str, float] = defaultdict(float)
-        dates: set[datetime] = set()
-        for date_str, _, service, cost in records_by_account[account_id]:
-            try:
-                date = datetime.strptime(date_str, "%Y-%m-%d")
-            except Exception:
-                continue
-            cost_dict[date][service] += cost
-            service_totals[service] += cost
-            dates.add(date)
-            service_max_daily[service] = max(service_max_daily[service], cost_dict[date][service])
-        top_services: list[str] = [k for k, _ in sorted(service_max_daily.items(), key=lambda x:x[1], reverse=True)[:top_n_services]]
-        services: list[str] = top_services + (
-            [OTHERS] if len(service_max_daily) > top_n_services else []
-        )
-        dates_list: list[datetime] = sorted(list(dates))
-        values: dict[str, list[float]] = {s: [] for s in services}
-        for d in dates_list:
-            others_sum: float = 0
-            for s in service_totals:
-                v = cost_dict[d].get(s, 0)
-                if s in top_services:
-                    values[s].append(v)
-                else:
-                    others_sum += v
-            if OTHERS in values:
-                values[OTHERS].append(others_sum)
-        bottom = [0] * len(dates)
-        dates_num = mdates.date2num(dates_list)  # 日付を数値に変換
-        # 色割り当てを共通マップから取得
-        for s in services:
-            bars = ax.bar(
-                dates_num,
-                values[s],
-                bottom=bottom,
-                label=s,
-                color=service_color_map.get(s, OTHERS_COLOR),
-                hatch=service_hatch_map.get(s, OTHERS_HATCH),
-            )
-            if s not in legend_handles_dict:
-                legend_handles_dict[s] = bars[0]
+    for account_id in account_ids:
+        if not series_by_account[account_id]["dates"]:
+            continue
+        for s in series_by_account[account_id]["services"]:
+            if s not in legend_labels_dict:
                 legend_labels_dict[s] = get_service_label(s)
                 # カテゴリ情報も記録
                 legend_category_dict[s] = SERVICE_LABEL_MAP.get(s, [None, None])[1]
-            bottom = [b + v for b, v in zip(bottom, values[s])]
-        account_name = account_names[idx] if idx < len(account_names) else ""
-        ax.set_title(f"{account_name} - {account_id}", fontsize=title_fontsize, fontproperties=jp_font_prop)
-        ax.set_ylabel("USD", fontsize=label_fontsize, fontproperties=jp_font_prop, rotation=0, ha="right")
-        ax.yaxis.set_label_coords(-0.0135, 1)
-        ax.tick_params(axis="both", labelsize=tick_fontsize)
-        for label in ax.get_xticklabels() + ax.get_yticklabels():
-            label.set_fontproperties(jp_font_prop)
-        def format_date_labels(dates):
-            labels = []
-            for i, d in enumerate(dates):
-                # x軸の最初と最後、または月初めの日付の場合
-                if i == 0 or i == len(dates) - 1 or d.day == 1:
-                    # 月日を2行で表示
-                    labels.append(d.strftime("%-d\n%b"))
-                else:
-                    # 日のみ1行で表示
-                    labels.append(d.strftime("%-d"))
-            return labels
-        ax.set_xticks(dates_num)  # 数値に変換した日付を使用
-        ax.set_xticklabels(format_date_labels(dates_list), rotation=0)
-        # サブプロットごとのax.legend()は削除
-
-        # Y軸の設定: コストが極端に小さい場合のみ定数でtopを設定
-        account_max_cost = max(sum(cost_dict[date].values()) for date in dates)
-        if account_max_cost < y_top_min:
-            ax.set_ylim(bottom=0, top=y_top_min)
-        else:
-            ax.set_ylim(bottom=0)  # 最大値は自動設定
-
-    # 不要なサブプロットを非表示
-    for i in range(len(account_ids), len(axes)):
-        axes[i].set_visible(False)
 
     # --- 凡例の順序 カテゴリ順→hatch順→カテゴリなし→Others ---
     category_order = list(CATEGORY_COLOR_MAP.keys())
@@ -283,18 +792,92 @@ def plot_graph(
     if OTHERS in legend_labels_dict:
         legend_keys.append(OTHERS)
 
-    fig.legend(
-        handles=[legend_handles_dict[s] for s in legend_keys],
-        labels=[legend_labels_dict[s] for s in legend_keys],
-        bbox_to_anchor=(1, 0.5),
-        loc="center left",
-        borderaxespad=0,
-        fontsize=legend_fontsize,
-        prop=jp_font_prop,
-        frameon=False,
-    )
-    plt.tight_layout(pad=2.0)
-    plt.subplots_adjust(bottom=0.08)
-    plt.savefig(output_path, bbox_inches="tight")
-    plt.close()
-    return output_path
+    # 凡例は描画した棒とは別に、同じ色・模様のパッチで作る
+    legend_handles: list[Any] = [  # Any is used for matplotlib.patches.Patch
+        mpatches.Patch(facecolor=service_color_map.get(s, OTHERS_COLOR), hatch=service_hatch_map.get(s, OTHERS_HATCH))
+        for s in legend_keys
+    ]
+
+    # ページごとに図を作って保存し、閉じてから次のページを描く（凡例と色・模様は全ページで共通）
+    outputs: list[Union[str, bytes]] = []
+    for page_index, page in enumerate(pages):
+        page_ids: list[str] = [account[0] for account in page]
+        account_names: list[str] = [account[1] for account in page]
+        n_accounts = len(page_ids)
+        nrows, ncols = _grid(n_accounts)
+        geometry: Optional[FixedLayout] = None
+        if layout == "fixed":
+            geometry = _fixed_layout(
+                nrows, ncols, [legend_labels_dict[s] for s in legend_keys], jp_font_prop.get_size_in_points()
+            )
+            fig, axes = plt.subplots(
+                nrows, ncols, figsize=geometry["figsize"], sharex=False, gridspec_kw=geometry["subplot_params"]
+            )
+        else:
+            fig, axes = plt.subplots(nrows, ncols, figsize=(8 * ncols, 4 * nrows), sharex=False)
+        axes = axes.flatten() if n_accounts > 1 else [axes]
+
+        for idx, account_id in enumerate(page_ids):
+            ax = axes[idx]
+            series: AccountSeries = series_by_account[account_id]
+            dates_list: list[datetime] = series["dates"]
+            dates_num = mdates.date2num(dates_list)  # 日付を数値に変換
+            # 色割り当てを共通マップから取得
+            BAR_RENDERERS[bar_renderer](ax, dates_num, series, service_color_map, service_hatch_map)
+            account_name = account_names[idx] if idx < len(account_names) else ""
+            ax.set_title(f"{account_name} - {account_id}", fontsize=title_fontsize, fontproperties=jp_font_prop)
+            ax.set_ylabel("USD", fontsize=label_fontsize, fontproperties=jp_font_prop, rotation=0, ha="right")
+            ax.yaxis.set_label_coords(-0.0135, 1)
+            ax.tick_params(axis="both", labelsize=tick_fontsize)
+            for label in ax.get_xticklabels() + ax.get_yticklabels():
+                label.set_fontproperties(jp_font_prop)
+            def format_date_labels(dates):
+                labels = []
+                for i, d in enumerate(dates):
+                    # x軸の最初と最後、または月初めの日付の場合
+                    if i == 0 or i == len(dates) - 1 or d.day == 1:
+                        # 月日を2行で表示
+                        labels.append(d.strftime("%-d\n%b"))
+                    else:
+                        # 日のみ1行で表示
+                        labels.append(d.strftime("%-d"))
+                return labels
+            ax.set_xticks(dates_num)  # 数値に変換した日付を使用
+            ax.set_xticklabels(format_date_labels(dates_list), rotation=0)
+            # サブプロットごとのax.legend()は削除
+
+            # Y軸の設定: コストが極端に小さい場合のみ定数でtopを設定
+            if series["max_total"] < y_top_min:
+                ax.set_ylim(bottom=0, top=y_top_min)
+            else:
+                ax.set_ylim(bottom=0)  # 最大値は自動設定
+
+        # 不要なサブプロットを非表示
+        for i in range(len(page_ids), len(axes)):
+            axes[i].set_visible(False)
+
+        fig.legend(
+            handles=legend_handles,
+            labels=[legend_labels_dict[s] for s in legend_keys],
+            bbox_to_anchor=geometry["legend_anchor"] if geometry else (1, 0.5),
+            loc="center left",
+            borderaxespad=0,
+            fontsize=legend_fontsize,
+            prop=jp_font_prop,
+            frameon=False,
+        )
+        # 出力先の指定がなければ、ファイルに書かずにメモリ上でエンコードする
+        page_path: Optional[str] = _page_path(output_path, page_index, len(pages))
+        output: Union[str, io.BytesIO] = page_path if page_path is not None else io.BytesIO()
+        if not geometry:
+            plt.tight_layout(pad=2.0)
+            plt.subplots_adjust(bottom=0.08)
+        # 固定レイアウトでは寸法は計算済みのため、文字の大きさを測る描画をせずにそのまま保存する
+        _save_figure(fig, output, encoding or {}, tight=not geometry)
+        plt.close()
+        outputs.append(output.getvalue() if isinstance(output, io.BytesIO) else output)
+    return outputs
+
+
+if __name__ == "__main__":
+    print(f"Generated {write_service_config_cache()}")
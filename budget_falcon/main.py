@@ -1,12 +1,30 @@
 import os
+from concurrent.futures import Future
 from datetime import datetime
-import pytz
-from typing import Any
+from typing import Any, Optional, Union
 
+# 重いライブラリ（matplotlib・boto3・googleapiclient等）は各モジュールで初回利用時に読み込む
 from account_dao import AccountDAO, AccountGroup, AccountDAOParameters
-from cur_dao import CurDAO, CurDAOParameters
-from graph_plotter import plot_graph, ServiceRecord
+from cur_dao import CurDAO, CurDAOParameters, CurRecords
+from graph_plotter import plot_graph_pages, paginate_accounts, preload, chart_fingerprint, aggregate_records, Aggregate, ImageEncoding, OTHERS
 from slack_notice import SlackClient
+from pipeline import Pipeline, NOT_STARTED
+from render_pool import RenderPool
+from clients import ClientRegistry
+from object_store import S3ObjectStore, LocalObjectStore
+from cost_cache import CostCache
+from result_cache import ResultCache
+from chart_cache import ChartCache
+from rollup import RollupBuilder
+from metrics import emit_query_metrics
+from scheduler import (
+    DeadlineScheduler,
+    LambdaDispatcher,
+    LocalDispatcher,
+    dispatch_groups,
+    group_event_state,
+    start_continuation,
+)
 
 
 ACCOUNT_DAO_PARAMS: AccountDAOParameters = {
@@ -21,52 +39,394 @@ CUR_DAO_PARAMS: CurDAOParameters = {
     "ATHENA_OUTPUT_URI": os.environ["ATHENA_OUTPUT_URI"],
     "ATHENA_LINE_ITEM_TYPES": os.environ["ATHENA_LINE_ITEM_TYPES"].split(","),
     "QUERY_DAYS_RANGE": int(os.environ.get("QUERY_DAYS_RANGE", "14")),
+    "ATHENA_QUERY_TIMEOUT": float(os.environ.get("ATHENA_QUERY_TIMEOUT_SECONDS", "120")),
+    "ATHENA_POLL_INITIAL_DELAY": float(os.environ.get("ATHENA_POLL_INITIAL_DELAY", "0.05")),
+    "ATHENA_POLL_MAX_DELAY": float(os.environ.get("ATHENA_POLL_MAX_DELAY", "2.0")),
+    "ATHENA_BILLING_PERIOD_PARTITION": os.environ.get("ATHENA_BILLING_PERIOD_PARTITION", "false").lower() == "true",
+    "ATHENA_ROLLUP_TABLE": os.environ.get("ATHENA_ROLLUP_TABLE", ""),
 }
 
 SLACK_TOKEN: str = os.environ["SLACK_TOKEN"]
 
 TOP_N_SERVICES: int = int(os.environ.get("TOP_N_SERVICES", "8"))
 
+# グラフ画像を書き出すディレクトリ（空の場合はファイルに書かず、メモリ上の画像をそのままアップロードする）
+# 書き出したファイルはアップロード後に削除する
+CHART_OUTPUT_DIR: str = os.environ.get("CHART_OUTPUT_DIR", "")
+
+# グラフ画像の形式（png / webp）と、エンコードの設定（未指定の項目はplot_graphのデフォルト）
+CHART_ENCODING: ImageEncoding = {"format": os.environ.get("CHART_FORMAT", "png").lower()}
+if os.environ.get("CHART_COMPRESS_LEVEL"):
+    CHART_ENCODING["compress_level"] = int(os.environ["CHART_COMPRESS_LEVEL"])
+if os.environ.get("CHART_PALETTE_COLORS"):
+    # サービスの色は少数のため、256色以下のパレットにするとPNGが数分の1になる
+    CHART_ENCODING["palette_colors"] = int(os.environ["CHART_PALETTE_COLORS"])
+if os.environ.get("CHART_WEBP_QUALITY"):
+    CHART_ENCODING["quality"] = int(os.environ["CHART_WEBP_QUALITY"])
+if os.environ.get("CHART_DPI"):
+    CHART_ENCODING["dpi"] = float(os.environ["CHART_DPI"])
+if os.environ.get("CHART_MAX_PIXELS"):
+    CHART_ENCODING["max_pixels"] = int(os.environ["CHART_MAX_PIXELS"])
+
+# 描画済み・投稿済みのグラフのキャッシュの保存先（s3://bucket/prefix または /tmp 以下のディレクトリ、空の場合はキャッシュしない）
+# 集計結果・サービス設定・描画オプション・日付が同じグラフは描き直さない
+CHART_CACHE_URI: str = os.environ.get("CHART_CACHE_URI", "")
+CHART_CACHE_TTL_SECONDS: float = float(os.environ.get("CHART_CACHE_TTL_SECONDS", "86400"))
+CHART_CACHE_MAX_BYTES: int = int(os.environ.get("CHART_CACHE_MAX_MB", "64")) * 1024 * 1024
+# 同じチャンネルに投稿済みのグラフは投稿もしない
+CHART_CACHE_SKIP_POSTED: bool = os.environ.get("CHART_CACHE_SKIP_POSTED", "true").lower() == "true"
+
+# 1枚のグラフ画像に描くアカウント数の上限（超えるグループは複数の画像に分けて順に投稿する、0の場合は分けない）
+# アカウント数の多いグループで画像のメモリ使用量が大きくなりすぎないようにする
+CHART_MAX_SUBPLOTS: int = max(0, int(os.environ.get("CHART_MAX_SUBPLOTS", "0")))
+
+# グラフのレイアウト（tight: 文字の大きさを測って余白を詰める / fixed: 寸法を計算して1回の描画で保存する）
+GRAPH_LAYOUT: str = os.environ.get("GRAPH_LAYOUT", "tight").lower()
+
+# サービスの上位N件以外のOthersへのまとめをAthenaのクエリで行う（コストのキャッシュは使われない）
+if os.environ.get("ATHENA_TOP_N_QUERY", "false").lower() == "true":
+    CUR_DAO_PARAMS["ATHENA_TOP_N_SERVICES"] = TOP_N_SERVICES
+    CUR_DAO_PARAMS["ATHENA_OTHERS_LABEL"] = OTHERS
+
+# クエリ結果の取得方法（s3: 結果CSVをS3から読む / api: GetQueryResultsでページごとに取得する）
+RESULT_MODE: str = os.environ.get("ATHENA_RESULT_MODE", "s3").lower()
+
+# CURの修正（再計算）があり得るため、毎回集計し直す直近の日数
+CUR_SETTLE_DAYS: int = int(os.environ.get("CUR_SETTLE_DAYS", "3"))
+
+# 確定済みの日次コストのキャッシュの保存先（s3://bucket/prefix または /tmp 以下のディレクトリ、空の場合はキャッシュしない）
+COST_CACHE_URI: str = os.environ.get("COST_CACHE_URI", "")
+
+# クエリ結果のキャッシュの保存先（s3://bucket/prefix または /tmp 以下のディレクトリ、空の場合はキャッシュしない）
+RESULT_CACHE_URI: str = os.environ.get("RESULT_CACHE_URI", "")
+RESULT_CACHE_TTL_SECONDS: float = float(os.environ.get("RESULT_CACHE_TTL_SECONDS", "3600"))
+RESULT_CACHE_MAX_BYTES: int = int(os.environ.get("RESULT_CACHE_MAX_MB", "64")) * 1024 * 1024
+
+# 日次のロールアップの保存先（空の場合は作成せず、明細のテーブルを読む）
+ROLLUP_URI: str = os.environ.get("ROLLUP_URI", "")
+
+# クエリのスキャン量・実行時間をEMFで出力するCloudWatchの名前空間（空の場合は出力しない）
+# 実行ごとの合計と、グループごとのクエリを出力する
+# バッチモード（ATHENA_BATCH_FETCH）では全グループで1回のクエリを共有するため、実行ごとの合計だけを出力する
+METRICS_NAMESPACE: str = os.environ.get("METRICS_NAMESPACE", "BudgetFalcon")
+
+# 全グループのアカウントを1回のAthenaクエリでまとめて取得する
+BATCH_FETCH: bool = os.environ.get("ATHENA_BATCH_FETCH", "true").lower() == "true"
+
+# パイプラインの各ステージの並列数（AthenaとSlackのクォータに合わせて調整する）
+# グループごとの取得では、クエリは全グループ分を先に開始し、取得ステージは完了を待って結果を受け取る
+FETCH_WORKERS: int = max(1, int(os.environ.get("PIPELINE_FETCH_WORKERS", "2")))
+UPLOAD_WORKERS: int = max(1, int(os.environ.get("PIPELINE_UPLOAD_WORKERS", "2")))
+
+# グラフ描画に使うプロセス数（2以上でプロセスプールを使って並列に描画する）
+RENDER_PROCESSES: int = max(1, int(os.environ.get("RENDER_PROCESSES", "1")))
+
+# 残り実行時間がこの秒数を下回ったら新しいグループを開始せず、継続実行に回す
+DEADLINE_RESERVE_SECONDS: int = int(os.environ.get("DEADLINE_RESERVE_SECONDS", "60"))
+# 継続実行の最大回数
+MAX_CONTINUATIONS: int = int(os.environ.get("MAX_CONTINUATIONS", "5"))
+
+# single: 1回の実行で全グループを処理する / fanout: グループを分割してワーカー呼び出しに分配する
+EXECUTION_MODE: str = os.environ.get("EXECUTION_MODE", "single").lower()
+# fanoutモードで1回のワーカー呼び出しが処理するグループ数
+FANOUT_CHUNK_SIZE: int = max(1, int(os.environ.get("FANOUT_CHUNK_SIZE", "1")))
+# ローカル実行時は"local"を指定すると、ワーカー・継続実行を同じプロセス内で順に実行する
+DISPATCHER: str = os.environ.get("DISPATCHER", "lambda").lower()
+
+# DAOやAPIクライアントはウォームスタート時に再利用し、この秒数を超えたら作り直す
+CLIENT_MAX_AGE_SECONDS: int = int(os.environ.get("CLIENT_MAX_AGE_SECONDS", "3600"))
+CLIENTS = ClientRegistry(max_age_seconds=CLIENT_MAX_AGE_SECONDS)
+
 
 def lambda_handler(event: dict[str, Any], context: Any) -> None:
     """
     AWS Lambda function to fetch AWS cost and usage data, generate graphs, and post them to Slack.
-    event and context are provided by AWS Lambda, but they are not used in this function.
+
+    A scheduled event processes every group (EXECUTION_MODE=single), or, as a coordinator,
+    dispatches one worker invocation per chunk of groups (EXECUTION_MODE=fanout).
+    An event carrying groups (worker or continuation) processes only those groups.
 
     Args:
-        event
-        context
+        event: Scheduled event, or a worker/continuation event carrying the groups to process
+        context: Lambda context, used for the remaining time and the function ARN
 
     Returns:
         None
     """
+    import pytz
     jst = pytz.timezone("Asia/Tokyo")
     exec_time_jst: str = datetime.now(jst).strftime("%Y-%m-%d %H:%M:%S %Z")
     print(f"Execution time: {exec_time_jst}")
 
-    account_dao = AccountDAO(ACCOUNT_DAO_PARAMS)
-    cur_dao = CurDAO(CUR_DAO_PARAMS)
-    slack_client = SlackClient(SLACK_TOKEN)
+    dispatcher: Any = _dispatcher(context)
+
+    # ワーカー・継続実行の場合はイベントで渡されたグループだけを処理する
+    state = group_event_state(event)
+    if state:
+        print(f"Processing {len(state['groups'])} groups from event (depth: {state['depth']})")
+        process_groups(state["groups"], context, dispatcher, depth=state["depth"])
+        return
 
+    account_dao: AccountDAO = CLIENTS.get(
+        "account_dao",
+        lambda: AccountDAO(ACCOUNT_DAO_PARAMS),
+        lambda dao: dao.ensure_credentials(),
+    )
     account_groups: list[AccountGroup] = account_dao.group_list()
-    for i, group in enumerate(account_groups):
-        print("execute for group:", group["name"])
+    # ロールアップの更新はスケジュール実行（コーディネーター）でのみ行う
+    if ROLLUP_URI:
+        _refresh_rollup()
+    if EXECUTION_MODE == "fanout":
+        dispatch_groups(dispatcher, account_groups, chunk_size=FANOUT_CHUNK_SIZE)
+        return
+    process_groups(account_groups, context, dispatcher)
+
+
+def _dispatcher(context: Any) -> Any:
+    if DISPATCHER == "local":
+        return LocalDispatcher(lambda_handler, context)
+    function_name: str = getattr(context, "invoked_function_arn", None) or os.environ.get("AWS_LAMBDA_FUNCTION_NAME", "")
+    import boto3
+    lambda_client: Any = CLIENTS.get(
+        "lambda",
+        lambda: boto3.client("lambda", region_name=CUR_DAO_PARAMS["AWS_REGION"]),
+    )
+    return LambdaDispatcher(lambda_client, function_name)
+
+
+def _object_store() -> S3ObjectStore:
+    # boto3は読み込みに時間がかかるため、使う時に読み込む
+    import boto3
+    return S3ObjectStore(boto3.client("s3", region_name=CUR_DAO_PARAMS["AWS_REGION"]))
+
+
+def _cache_location(uri: str) -> tuple[Any, str]:
+    # キャッシュの保存先（S3のURIか、ローカルのディレクトリ）を、オブジェクトストアとプレフィックスにする
+    if uri.startswith("s3://"):
+        return CLIENTS.get("object_store", _object_store), uri
+    # ローカルのディレクトリは、親ディレクトリをベースにディレクトリ名をバケットとして扱う
+    path: str = os.path.abspath(uri)
+    return LocalObjectStore(os.path.dirname(path)), f"s3://{os.path.basename(path)}"
+
+
+def _result_cache() -> Optional[ResultCache]:
+    if not RESULT_CACHE_URI:
+        return None
+    store, prefix_uri = _cache_location(RESULT_CACHE_URI)
+    return ResultCache(store, prefix_uri, RESULT_CACHE_TTL_SECONDS, RESULT_CACHE_MAX_BYTES)
+
+
+def _chart_cache() -> Optional[ChartCache]:
+    if not CHART_CACHE_URI:
+        return None
+    store, prefix_uri = _cache_location(CHART_CACHE_URI)
+    return ChartCache(store, prefix_uri, CHART_CACHE_TTL_SECONDS, CHART_CACHE_MAX_BYTES, CHART_CACHE_SKIP_POSTED)
+
+
+def _cost_cache() -> Optional[CostCache]:
+    if not COST_CACHE_URI:
+        return None
+    store, prefix_uri = _cache_location(COST_CACHE_URI)
+    return CostCache(store, prefix_uri, CUR_SETTLE_DAYS)
+
+
+def _cur_dao() -> CurDAO:
+    # Athenaの結果CSVは常にS3にあるため、結果の読み込みにはS3のオブジェクトストアを使う
+    result_store: Optional[S3ObjectStore] = (
+        CLIENTS.get("object_store", _object_store) if RESULT_MODE == "s3" else None
+    )
+    return CurDAO(
+        CUR_DAO_PARAMS,
+        result_store=result_store,
+        cost_cache=_cost_cache(),
+        result_cache=_result_cache(),
+    )
+
+
+def _chart_filename(i: int, page: int = 0, n_pages: int = 1) -> str:
+    # plot_graph_pagesの出力ファイル名と揃える
+    if n_pages == 1:
+        return f"chart_{i}.{CHART_ENCODING['format']}"
+    return f"chart_{i}_{page + 1}.{CHART_ENCODING['format']}"
+
+
+def _refresh_rollup() -> None:
+    cur_dao: CurDAO = CLIENTS.get("cur_dao", _cur_dao)
+    store: S3ObjectStore = CLIENTS.get("object_store", _object_store)
+    try:
+        RollupBuilder(cur_dao, store, ROLLUP_URI, CUR_SETTLE_DAYS).refresh()
+    except Exception as e:
+        # 失敗した日付は前回のロールアップが残っているため、そのまま通知は続ける
+        print(f"Error refreshing rollup: {e}")
+    # fanoutモードのコーディネーターはグループを処理しないため、ロールアップのクエリはここで出力する
+    query_log: list[Any] = cur_dao.pop_query_log()
+    if METRICS_NAMESPACE and query_log:
+        emit_query_metrics(METRICS_NAMESPACE, query_log, {"Stage": "Rollup"})
+
+
+def process_groups(account_groups: list[AccountGroup], context: Any, dispatcher: Any, depth: int = 0) -> None:
+    """
+    Fetches, renders and posts the charts of the given account groups.
+
+    The remaining time is checked before a group enters each of fetch, render and upload.
+    Once it drops below DEADLINE_RESERVE_SECONDS, groups stop before their next stage and
+    every group that was not posted is handed to a continuation invocation.
+
+    Args:
+        account_groups: Account groups to process
+        context: Lambda context, used for the remaining time
+        dispatcher: Dispatcher used to start the continuation invocation
+        depth: Number of continuations before this invocation
+
+    Returns:
+        None
+    """
+    import pytz
+    jst = pytz.timezone("Asia/Tokyo")
+    cur_dao: CurDAO = CLIENTS.get("cur_dao", _cur_dao)
+    slack_client: SlackClient = CLIENTS.get("slack", lambda: SlackClient(SLACK_TOKEN))
+    chart_cache: Optional[ChartCache] = CLIENTS.get("chart_cache", _chart_cache)
+    scheduler = DeadlineScheduler(context, DEADLINE_RESERVE_SECONDS * 1000)
+
+    # バッチモードでは全グループ分を1回のクエリで取得し、グループごとに分割しておく
+    batch_records: Optional[list[CurRecords]] = None
+    if BATCH_FETCH:
         try:
-            # ループごとに再計算
-            exec_time_jst = datetime.now(jst).strftime("%Y-%m-%d %H:%M")
-            account_ids: list[str] = [aid[0] for aid in group["accounts"]]
-
-            records: list[ServiceRecord] = cur_dao.fetch(account_ids)
-            filepath: str = plot_graph(
-                records,
-                accounts=group["accounts"],
-                output_path=f"/tmp/chart_{i}.png",
-                top_n_services=TOP_N_SERVICES,
-            )
-            slack_client.post_file(
-                group["target_channel"],
-                filepath,
-                title=f"AWS日次コスト{exec_time_jst}",
+            batch_records = cur_dao.fetch_groups(
+                [[aid[0] for aid in group["accounts"]] for group in account_groups]
             )
         except Exception as e:
-            print(f"Error processing group {group['name']}: {e}")
+            print(f"Error fetching cost data: {e}")
+            return
+
+    # グループごとに取得する場合は、全グループのクエリを先に開始しておく
+    # （実行中の全クエリの状態確認がまとめて行われ、取得ステージは完了を待つだけになる）
+    group_fetches: dict[int, Future] = {}
+    if batch_records is None:
+        for i, group in enumerate(account_groups):
+            try:
+                group_fetches[i] = cur_dao.fetch_async([aid[0] for aid in group["accounts"]])
+            except Exception as e:
+                # 開始に失敗したグループは、取得ステージでそのグループのエラーとして扱う
+                group_fetches[i] = Future()
+                group_fetches[i].set_exception(e)
+
+    GroupItem = tuple[int, AccountGroup]
+
+    def fetch_stage(item: GroupItem) -> tuple[int, AccountGroup, CurRecords]:
+        i, group = item
+        print("execute for group:", group["name"])
+        if batch_records is not None:
+            return i, group, batch_records[i]
+        records: CurRecords = group_fetches.pop(i).result()
+        if METRICS_NAMESPACE and records.queries:
+            emit_query_metrics(METRICS_NAMESPACE, records.queries, {"Group": group["name"]})
+        return i, group, records
+
+    # (番号, グループ, ページごとのグラフ（投稿済みで投稿しない場合は空）, グラフのキー)
+    Rendered = tuple[int, AccountGroup, list[Union[str, bytes]], Optional[str]]
+
+    def render_stage(fetched: tuple[int, AccountGroup, CurRecords]) -> Rendered:
+        i, group, records = fetched
+        key: Optional[str] = None
+        # グラフのキーを求めた場合は、その集計を描画でも使う（キャッシュがなければ描画側で集計する）
+        aggregated: Optional[Aggregate] = None
+        if chart_cache:
+            aggregated = aggregate_records(records, group["accounts"], TOP_N_SERVICES)
+            key = chart_fingerprint(
+                records, group["accounts"], TOP_N_SERVICES, aggregated=aggregated,
+                max_subplots=CHART_MAX_SUBPLOTS, layout=GRAPH_LAYOUT, encoding=CHART_ENCODING,
+            )
+            if chart_cache.is_posted(group["target_channel"], key):
+                print(f"Skipping group {group['name']}: the same chart was already posted")
+                return i, group, [], key
+            # 全ページの画像が揃っている場合のみ描画を省く
+            n_pages: int = len(paginate_accounts(group["accounts"], CHART_MAX_SUBPLOTS))
+            cached: list[Union[str, bytes]] = []
+            for page in range(n_pages):
+                image: Optional[bytes] = chart_cache.get(f"{key}-{page}")
+                if image is None:
+                    break
+                cached.append(image)
+            if len(cached) == n_pages:
+                return i, group, cached, key
+        render = render_pool.render if render_pool else plot_graph_pages
+        charts: list[Union[str, bytes]] = render(
+            records,
+            accounts=group["accounts"],
+            output_path=os.path.join(CHART_OUTPUT_DIR, _chart_filename(i)) if CHART_OUTPUT_DIR else None,
+            top_n_services=TOP_N_SERVICES,
+            max_subplots=CHART_MAX_SUBPLOTS,
+            layout=GRAPH_LAYOUT,
+            encoding=CHART_ENCODING,
+            aggregated=aggregated,
+        )
+        if chart_cache and key:
+            for page, chart in enumerate(charts):
+                # ファイルに書き出した画像はキャッシュしない
+                if isinstance(chart, bytes):
+                    chart_cache.put(f"{key}-{page}", chart)
+        return i, group, charts, key
+
+    def upload_stage(rendered: Rendered) -> None:
+        i, group, charts, key = rendered
+        if not charts:
+            return
+        # グループごとに再計算
+        exec_time_jst: str = datetime.now(jst).strftime("%Y-%m-%d %H:%M")
+        posted: bool = True
+        try:
+            # 複数ページの場合は順に投稿し、タイトルにページ番号を付ける
+            for page, chart in enumerate(charts):
+                page_label: str = f" ({page + 1}/{len(charts)})" if len(charts) > 1 else ""
+                posted = slack_client.post_file(
+                    group["target_channel"],
+                    chart,
+                    title=f"AWS日次コスト{exec_time_jst}{page_label}",
+                    filename=_chart_filename(i, page, len(charts)),
+                ) and posted
+        finally:
+            # ウォームスタートで/tmpが溜まらないように、書き出したファイルは削除する
+            for chart in charts:
+                if isinstance(chart, str) and os.path.exists(chart):
+                    os.remove(chart)
+        if posted and chart_cache and key:
+            chart_cache.mark_posted(group["target_channel"], key)
+
+    def on_error(item: GroupItem, stage: str, e: Exception) -> None:
+        print(f"Error processing group {item[1]['name']} ({stage}): {e}")
+
+    # 取得・描画・投稿を重ねて実行する
+    # pyplotはスレッドセーフではないため、プロセスプールを使わない場合は描画を1並列にする
+    # プロセスプールもウォームスタート時に再利用する
+    render_pool: Optional[RenderPool] = None
+    if RENDER_PROCESSES > 1:
+        render_pool = CLIENTS.get(
+            "render_pool",
+            lambda: RenderPool(RENDER_PROCESSES, plot_graph_pages, initializer=preload),
+            lambda pool: pool.is_alive(),
+        )
+    pipeline = Pipeline(
+        [
+            ("fetch", fetch_stage, FETCH_WORKERS),
+            ("render", render_stage, RENDER_PROCESSES),
+            ("upload", upload_stage, UPLOAD_WORKERS),
+        ],
+        on_error=on_error,
+    )
+    results: list[Any] = pipeline.run(list(enumerate(account_groups)), can_start=scheduler.can_start)
+    # この実行で読み込んだ全クエリの合計（全てキャッシュから返した場合など、クエリがなければ出力しない）
+    # ウォームスタートで溜まらないように、出力しない場合も取り出しておく
+    query_log: list[Any] = cur_dao.pop_query_log()
+    if METRICS_NAMESPACE and query_log:
+        emit_query_metrics(METRICS_NAMESPACE, query_log)
+
+    # 時間内に投稿まで進めなかったグループは継続実行に回す
+    unfinished: list[AccountGroup] = [
+        group for group, result in zip(account_groups, results) if result is NOT_STARTED
+    ]
+    if unfinished:
+        if depth >= MAX_CONTINUATIONS:
+            print(f"Continuation limit reached, {len(unfinished)} groups were not processed")
+            return
+        start_continuation(dispatcher, unfinished, depth + 1)
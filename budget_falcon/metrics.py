@@ -0,0 +1,83 @@
+import json
+import time
+from typing import Any, Iterable, Optional
+
+# クエリごとのスキャン量・実行時間などを CloudWatch Embedded Metric Format (EMF) のログとして出力する
+# ログに出力するだけでメトリクスになるため、PutMetricData の呼び出しや権限は不要
+
+# メトリクス名 -> (QueryStatistics のキー, 単位)
+QUERY_METRICS: dict[str, tuple[str, str]] = {
+    "DataScannedBytes": ("data_scanned_bytes", "Bytes"),
+    "EngineExecutionTime": ("engine_execution_ms", "Milliseconds"),
+    "QueueTime": ("queue_ms", "Milliseconds"),
+    "PlanningTime": ("planning_ms", "Milliseconds"),
+    "ReusedResults": ("result_reused", "Count"),
+    "PollTime": ("poll_seconds", "Seconds"),
+    "ReadTime": ("read_seconds", "Seconds"),
+    "ResultPages": ("result_pages", "Count"),
+    "ResultRows": ("result_rows", "Count"),
+}
+
+
+def emf_line(
+    namespace: str,
+    dimensions: dict[str, str],
+    metrics: dict[str, tuple[float, str]],
+    properties: Optional[dict[str, Any]] = None,
+    timestamp: Optional[float] = None,
+) -> str:
+    """
+    Formats one CloudWatch Embedded Metric Format log line.
+
+    Args:
+        namespace: CloudWatch metric namespace.
+        dimensions: Dimension names and values (empty for metrics without dimensions).
+        metrics: Metric name -> (value, unit).
+        properties: Extra fields kept in the log line only (not metrics).
+        timestamp: Epoch seconds (defaults to now).
+
+    Returns:
+        str: JSON log line.
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    line: dict[str, Any] = {
+        "_aws": {
+            "Timestamp": int(timestamp * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": namespace,
+                "Dimensions": [list(dimensions)],
+                "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in metrics.items()],
+            }],
+        },
+        **(properties or {}),
+        **dimensions,
+        **{name: value for name, (value, _) in metrics.items()},
+    }
+    return json.dumps(line, ensure_ascii=False)
+
+
+def emit_query_metrics(
+    namespace: str,
+    queries: Iterable[dict[str, Any]],
+    dimensions: Optional[dict[str, str]] = None,
+) -> str:
+    """
+    Prints the totals of the given query statistics as an EMF log line.
+
+    Args:
+        namespace: CloudWatch metric namespace.
+        queries: CurDAO's QueryStatistics of the queries to total.
+        dimensions: Dimensions of the metrics (e.g. {"Group": name}, or none for the run).
+
+    Returns:
+        str: The printed log line.
+    """
+    queries = list(queries)
+    metrics: dict[str, tuple[float, str]] = {"Queries": (len(queries), "Count")}
+    for name, (key, unit) in QUERY_METRICS.items():
+        metrics[name] = (sum(float(stats[key]) for stats in queries), unit)
+    # クエリIDはメトリクスにせず、ログから個々のクエリを追えるように残す
+    properties: dict[str, Any] = {"QueryExecutionIds": [stats["query_execution_id"] for stats in queries]}
+    line: str = emf_line(namespace, dimensions or {}, metrics, properties)
+    print(line)
+    return line
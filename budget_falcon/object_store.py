@@ -0,0 +1,150 @@
+import os
+import codecs
+import tempfile
+from typing import Any, Iterator
+
+# Athenaのクエリ結果（S3）などのオブジェクトを s3://bucket/key 形式のURIで読み書きする
+# S3ObjectStore と同じインターフェースのローカル実装（LocalObjectStore）でオフラインでも動作させる
+
+
+def parse_s3_uri(uri: str) -> tuple[str, str]:
+    """
+    Splits an S3 URI into bucket and key.
+
+    Args:
+        uri: URI like s3://bucket/path/to/object.
+
+    Returns:
+        tuple[str, str]: (bucket, key). The key is empty for a bucket URI.
+    """
+    if not uri.startswith("s3://"):
+        raise ValueError(f"Not an S3 URI: {uri}")
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    if not bucket:
+        raise ValueError(f"Missing bucket in S3 URI: {uri}")
+    return bucket, key
+
+
+class S3ObjectStore:
+    """
+    Object store backed by Amazon S3.
+    """
+    def __init__(self, client: Any) -> None:
+        self.client: Any = client
+
+    def get(self, uri: str) -> bytes:
+        """
+        Reads a whole object.
+
+        Raises:
+            FileNotFoundError: The object does not exist.
+        """
+        bucket, key = parse_s3_uri(uri)
+        try:
+            response: dict[str, Any] = self.client.get_object(Bucket=bucket, Key=key)
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(uri)
+        return response["Body"].read()
+
+    def put(self, uri: str, data: bytes) -> None:
+        bucket, key = parse_s3_uri(uri)
+        self.client.put_object(Bucket=bucket, Key=key, Body=data)
+
+    def copy(self, src_uri: str, dst_uri: str) -> None:
+        """
+        Copies an object within S3 without downloading it.
+        """
+        src_bucket, src_key = parse_s3_uri(src_uri)
+        bucket, key = parse_s3_uri(dst_uri)
+        self.client.copy_object(Bucket=bucket, Key=key, CopySource={"Bucket": src_bucket, "Key": src_key})
+
+    def delete(self, uri: str) -> None:
+        bucket, key = parse_s3_uri(uri)
+        self.client.delete_object(Bucket=bucket, Key=key)
+
+    def list(self, prefix_uri: str) -> list[str]:
+        """
+        Lists the URIs of the objects under a prefix.
+        """
+        bucket, prefix = parse_s3_uri(prefix_uri)
+        uris: list[str] = []
+        paginator: Any = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                uris.append(f"s3://{bucket}/{obj['Key']}")
+        return uris
+
+    def iter_lines(self, uri: str) -> Iterator[str]:
+        """
+        Streams an object as decoded text lines (line endings kept) without reading it whole.
+
+        Raises:
+            FileNotFoundError: The object does not exist.
+        """
+        bucket, key = parse_s3_uri(uri)
+        try:
+            response: dict[str, Any] = self.client.get_object(Bucket=bucket, Key=key)
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(uri)
+        body: Any = response["Body"]
+        try:
+            yield from codecs.getreader("utf-8")(body)
+        finally:
+            body.close()
+
+
+class LocalObjectStore:
+    """
+    Object store on the local file system, for offline runs and tests.
+
+    s3://bucket/key is stored at base_dir/bucket/key.
+    """
+    def __init__(self, base_dir: str) -> None:
+        self.base_dir: str = base_dir
+
+    def path(self, uri: str) -> str:
+        bucket, key = parse_s3_uri(uri)
+        return os.path.join(self.base_dir, bucket, *key.split("/"))
+
+    def get(self, uri: str) -> bytes:
+        with open(self.path(uri), "rb") as f:
+            return f.read()
+
+    def put(self, uri: str, data: bytes) -> None:
+        path: str = self.path(uri)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 書き込み途中のファイルを読まないように、一時ファイルに書いてから置き換える
+        # 一時ファイル名は書き込みごとに変え、複数のスレッドが同じキーに書いても混ざらないようにする
+        with tempfile.NamedTemporaryFile(
+            dir=os.path.dirname(path), prefix=f"{os.path.basename(path)}.", suffix=".tmp", delete=False
+        ) as f:
+            try:
+                f.write(data)
+            except BaseException:
+                os.remove(f.name)
+                raise
+        os.replace(f.name, path)
+
+    def copy(self, src_uri: str, dst_uri: str) -> None:
+        self.put(dst_uri, self.get(src_uri))
+
+    def delete(self, uri: str) -> None:
+        try:
+            os.remove(self.path(uri))
+        except FileNotFoundError:
+            pass
+
+    def list(self, prefix_uri: str) -> list[str]:
+        bucket, prefix = parse_s3_uri(prefix_uri)
+        bucket_dir: str = os.path.join(self.base_dir, bucket)
+        uris: list[str] = []
+        for root, _, files in os.walk(bucket_dir):
+            for name in files:
+                key: str = os.path.relpath(os.path.join(root, name), bucket_dir).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    uris.append(f"s3://{bucket}/{key}")
+        return sorted(uris)
+
+    def iter_lines(self, uri: str) -> Iterator[str]:
+        with open(self.path(uri), encoding="utf-8", newline="") as f:
+            yield from f
@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# 処理を段階(ステージ)に分け、ステージごとに上限付きの並列数で実行する
+
+PipelineStage = tuple[str, Callable[[Any], Any], int]  # (name, func, max_workers)
+ErrorHandler = Callable[[Any, str, Exception], None]  # (item, stage_name, error)
+
+# run()の結果で、期限により開始されなかった（または途中のステージで止めた）アイテムを表す
+NOT_STARTED: Any = object()
+
+
+class Pipeline:
+    """
+    Pipelined executor that runs each item through a sequence of stages.
+
+    Every stage has its own bounded worker pool, so while item N is in the second stage,
+    item N+1 can already be in the first one. The output of a stage is passed to the next
+    stage as its input. An item whose stage raises is dropped from the later stages and
+    reported to the error handler, and the remaining items keep going.
+
+    A stage accepts at most as many items as it has workers. An item that finishes a stage
+    waits (holding its worker) until the next stage has room, so a fast stage is held back
+    by a slow one instead of queueing every item in front of it.
+    """
+    def __init__(self, stages: list[PipelineStage], on_error: Optional[ErrorHandler] = None) -> None:
+        if not stages:
+            raise ValueError("Pipeline requires at least one stage")
+        for name, _, max_workers in stages:
+            if max_workers < 1:
+                raise ValueError(f"Stage {name} requires at least one worker: {max_workers}")
+        self.stages: list[PipelineStage] = stages
+        self.on_error: Optional[ErrorHandler] = on_error
+
+    def run(self, items: list[Any], can_start: Optional[Callable[[], bool]] = None) -> list[Any]:
+        """
+        Runs all items through the stages and waits for them to finish.
+
+        Args:
+            items: Inputs of the first stage. They are started in list order.
+            can_start: Checked right before an item enters any stage. Once it returns False,
+                that item and every item that has not finished yet stop before their next
+                stage. Stages that are already running are not interrupted.
+
+        Returns:
+            List of the last stage outputs in the same order as items.
+            None is stored for items that failed in any stage, and NOT_STARTED for items
+            that were stopped before a stage.
+        """
+        results: list[Any] = [None] * len(items)
+        remaining: list[int] = [len(items)]
+        finished = threading.Condition()
+        executors: list[ThreadPoolExecutor] = [
+            ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"pipeline-{name}")
+            for name, _, max_workers in self.stages
+        ]
+        # ステージごとの受け入れ数（実行中と待ちの合計）の上限
+        slots: list[threading.Semaphore] = [
+            threading.Semaphore(max_workers) for _, _, max_workers in self.stages
+        ]
+
+        def done() -> None:
+            with finished:
+                remaining[0] -= 1
+                finished.notify_all()
+
+        stopped: list[bool] = [False]
+
+        def gated(func: Callable[[Any], Any], index: int) -> Callable[[Any], Any]:
+            def run_if_allowed(value: Any) -> Any:
+                # 開始判定は各ステージの処理を実際に始める直前に行う
+                # （前段が速くても、後段の空き待ちの間に期限が来たアイテムは止める）
+                if not stopped[0] and can_start is not None and not can_start():
+                    stopped[0] = True
+                if stopped[0]:
+                    results[index] = NOT_STARTED
+                    return NOT_STARTED
+                return func(value)
+            return run_if_allowed
+
+        def submit(index: int, stage_index: int, item: Any, value: Any) -> None:
+            _, func, _ = self.stages[stage_index]
+            func = gated(func, index)
+            # 空きができるまで待つため、前段のワーカーや呼び出し元が止まって流入が抑えられる
+            slots[stage_index].acquire()
+            future: Future = executors[stage_index].submit(func, value)
+            future.add_done_callback(lambda f: advance(index, stage_index, item, f))
+
+        def advance(index: int, stage_index: int, item: Any, future: Future) -> None:
+            slots[stage_index].release()
+            try:
+                error: Optional[BaseException] = future.exception()
+                if error is not None:
+                    if self.on_error and isinstance(error, Exception):
+                        self.on_error(item, self.stages[stage_index][0], error)
+                    done()
+                elif results[index] is NOT_STARTED:
+                    done()
+                elif stage_index + 1 < len(self.stages):
+                    submit(index, stage_index + 1, item, future.result())
+                else:
+                    results[index] = future.result()
+                    done()
+            except Exception as e:
+                # エラーハンドラ自体の失敗で全体が止まらないようにする
+                print(f"Pipeline error: {e}")
+                done()
+
+        try:
+            for index, item in enumerate(items):
+                submit(index, 0, item, item)
+            with finished:
+                finished.wait_for(lambda: remaining[0] == 0)
+        finally:
+            for executor in executors:
+                executor.shutdown(wait=True)
+        return results
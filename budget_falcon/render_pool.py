@@ -0,0 +1,191 @@
+import os
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any, Callable, Optional
+
+# matplotlibの描画はGILを保持するCPU処理のため、複数プロセスに分散して描画する
+# Lambdaでは/dev/shmが使えずmultiprocessing.Pool/Queueが動かないため、Pipeのみで通信する
+# 呼び出し元はパイプラインなどのスレッドを動かしているため、forkではなくforkserverでワーカーを起動する
+# （他のスレッドが保持中のロックを子プロセスが引き継いでデッドロックしないようにする）
+_MP_CONTEXT = multiprocessing.get_context("forkserver")
+
+RenderFunc = Callable[..., Any]  # plot_graph互換: 出力パスか画像のバイト列（plot_graph_pagesではそのリスト）を返す
+
+
+def _read_output(output: Any) -> Any:
+    # 出力ファイルを読み込んで削除する（メモリ上で描画されたバイト列はそのまま）
+    if isinstance(output, list):
+        return [_read_output(item) for item in output]
+    if not isinstance(output, str):
+        return output
+    with open(output, "rb") as f:
+        data: bytes = f.read()
+    os.remove(output)
+    return data
+
+
+def _worker_loop(
+    conn: Connection,
+    render_func: RenderFunc,
+    initializer: Optional[Callable[[], None]],
+    return_bytes: bool,
+) -> None:
+    # フォントや設定の読み込みはプロセスごとに1回だけ行う
+    if initializer:
+        initializer()
+    while True:
+        try:
+            task: Optional[tuple[tuple[Any, ...], dict[str, Any]]] = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        args, kwargs = task
+        try:
+            result: Any = render_func(*args, **kwargs)
+            conn.send(("ok", _read_output(result) if return_bytes else result))
+        except Exception as e:
+            try:
+                conn.send(("error", e))
+            except Exception:
+                # 例外オブジェクトをpickleできない場合は文字列で返す
+                conn.send(("error", RuntimeError(f"{type(e).__name__}: {e}")))
+    conn.close()
+
+
+class RenderPool:
+    """
+    Pool of worker processes that render charts in parallel.
+
+    Each worker process runs the initializer once (e.g. to load the font and the service
+    configuration) and then renders the charts sent to it. Tasks are handed out through
+    a shared queue, so a free worker always takes the next chart. The results are what
+    the render function returns (an output path, or image bytes when it renders in
+    memory); with return_bytes, output files are read back and removed.
+    Workers are started from a fork server, so the render function and the initializer
+    are passed by reference and must be module-level functions.
+    Methods are thread-safe, so the pool can back a multi-worker pipeline stage.
+    """
+    def __init__(
+        self,
+        processes: int,
+        render_func: RenderFunc,
+        initializer: Optional[Callable[[], None]] = None,
+        return_bytes: bool = False,
+    ) -> None:
+        if processes < 1:
+            raise ValueError(f"RenderPool requires at least one process: {processes}")
+        self.processes: int = processes
+        self.render_func: RenderFunc = render_func
+        self.initializer: Optional[Callable[[], None]] = initializer
+        self.return_bytes: bool = return_bytes
+        self.tasks: queue.Queue = queue.Queue()
+        self.closed: bool = False
+        workers: list[tuple[BaseProcess, Connection]] = [
+            self._start_worker() for _ in range(processes)
+        ]
+        self.dispatchers: list[threading.Thread] = []
+        for slot, (process, conn) in enumerate(workers):
+            dispatcher = threading.Thread(
+                target=self._dispatch, args=(process, conn), name=f"render-pool-{slot}", daemon=True
+            )
+            dispatcher.start()
+            self.dispatchers.append(dispatcher)
+
+    def _start_worker(self) -> tuple[BaseProcess, Connection]:
+        parent_conn, child_conn = _MP_CONTEXT.Pipe()
+        process: BaseProcess = _MP_CONTEXT.Process(
+            target=_worker_loop,
+            args=(child_conn, self.render_func, self.initializer, self.return_bytes),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def _dispatch(self, process: BaseProcess, conn: Connection) -> None:
+        # ワーカープロセス1つにつき1スレッドで、キューからタスクを取り出して送る
+        try:
+            while True:
+                item: Optional[tuple[Future, tuple[Any, ...], dict[str, Any]]] = self.tasks.get()
+                if item is None:
+                    try:
+                        conn.send(None)
+                    except OSError:
+                        pass
+                    break
+                future, args, kwargs = item
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    conn.send((args, kwargs))
+                    status, value = conn.recv()
+                except (EOFError, OSError) as e:
+                    # ワーカーが異常終了した場合は作り直して続行する
+                    future.set_exception(RuntimeError(f"Render worker exited unexpectedly: {e}"))
+                    conn.close()
+                    process.join(timeout=1)
+                    process, conn = self._start_worker()
+                    continue
+                if status == "ok":
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+        finally:
+            conn.close()
+            process.join(timeout=5)
+            if process.is_alive():
+                process.kill()
+
+    def submit(self, *args: Any, **kwargs: Any) -> Future:
+        """
+        Queues a chart for rendering.
+
+        Args:
+            args, kwargs: Arguments passed to the render function in the worker process.
+
+        Returns:
+            Future: Resolves to the output path, or the image bytes if return_bytes is set.
+        """
+        if self.closed:
+            raise RuntimeError("RenderPool is closed")
+        future: Future = Future()
+        self.tasks.put((future, args, kwargs))
+        return future
+
+    def render(self, *args: Any, **kwargs: Any) -> Any:
+        """
+        Renders a chart in a worker process and waits for the result.
+
+        Returns:
+            The output path, or the image bytes if return_bytes is set.
+        """
+        return self.submit(*args, **kwargs).result()
+
+    def is_alive(self) -> bool:
+        """
+        Returns True while the pool accepts charts (used as a health check when reusing it).
+        """
+        return not self.closed and all(dispatcher.is_alive() for dispatcher in self.dispatchers)
+
+    def close(self) -> None:
+        """
+        Waits for the queued charts and stops the worker processes.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for _ in self.dispatchers:
+            self.tasks.put(None)
+        for dispatcher in self.dispatchers:
+            dispatcher.join()
+
+    def __enter__(self) -> "RenderPool":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,200 @@
+import json
+import time
+import hashlib
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Optional, TypedDict
+
+try:
+    from .cur_records import COLUMNS, CurRecords
+except ImportError:
+    from cur_records import COLUMNS, CurRecords
+
+# CurDAOのクエリ結果のキャッシュ
+# Lambdaのリトライや、チャンネル単位での再実行ではAthenaを呼ばずに前回の結果を返す
+# 保存先は S3ObjectStore（S3）か LocalObjectStore（/tmp）で、件数ではなく合計サイズでLRUに削除する
+
+JST = timezone(timedelta(hours=9))
+
+"""
+Index structure (one JSON object under the prefix, "_index.json"):
+    {
+        "3f2a...": {                  # Fingerprint of the query
+            "created": 1747700000.0,  # When the result was stored (epoch seconds)
+            "accessed": 1747700100.0, # When the result was last read
+            "size": 2048,             # Size of the stored result in bytes
+        },
+    }
+"""
+class IndexEntry(TypedDict):
+    created: float
+    accessed: float
+    size: int
+
+
+def fingerprint(account_ids: list[str], scope: list[str], days_range: int, today: Optional[date] = None) -> str:
+    """
+    Returns the key of a query result.
+
+    The account IDs are normalized (stripped, deduplicated and sorted), so the same
+    account set in any order gives the same key.
+
+    Args:
+        account_ids: AWS account IDs of the query.
+        scope: Settings that change the result (e.g. table and line item types).
+        days_range: Number of days queried.
+        today: Run date in JST (defaults to now).
+
+    Returns:
+        str: Hex digest identifying the query.
+    """
+    today = today or datetime.now(JST).date()
+    key: dict[str, Any] = {
+        "accounts": sorted({aid.strip() for aid in account_ids}),
+        "scope": scope,
+        "days_range": days_range,
+        "date": today.isoformat(),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+def _encode(records: CurRecords) -> bytes:
+    # 列ごとの辞書とインデックスのまま保存する（行ごとの文字列を繰り返さない）
+    data: dict[str, Any] = {"costs": list(records.costs), "service_max": records.service_max}
+    for name in COLUMNS:
+        values, codes = records.column(name)
+        data[name] = {"values": values, "codes": list(codes)}
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(body: bytes) -> CurRecords:
+    data: dict[str, Any] = json.loads(body)
+    records = CurRecords()
+    for name in COLUMNS:
+        dictionary = records.dictionaries[name]
+        for value in data[name]["values"]:
+            dictionary.encode(value)
+        records.codes[name].extend(data[name]["codes"])
+    records.costs.extend(data["costs"])
+    records.service_max = data.get("service_max")
+    return records
+
+
+class ResultCache:
+    """
+    TTL and size-bounded LRU cache of CurRecords keyed by a query fingerprint.
+
+    Results are stored in an object store (S3ObjectStore, or LocalObjectStore for /tmp)
+    under prefix_uri, together with an index of their creation time, last access and
+    size. Results older than ttl_seconds are not returned, and the least recently used
+    ones are deleted when the total size exceeds max_bytes.
+
+    The index is re-read before every update, so several Lambda invocations sharing the
+    prefix lose at most the access times of a concurrent update.
+
+    Subclasses can store other values by overriding _dumps, _loads and _describe
+    (see chart_cache.ImageCache).
+    """
+    # 保存するオブジェクトの拡張子
+    suffix: str = ".json"
+
+    def __init__(
+        self,
+        store: Any,
+        prefix_uri: str,
+        ttl_seconds: float = 3600.0,
+        max_bytes: int = 64 * 1024 * 1024,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.store: Any = store
+        self.prefix_uri: str = prefix_uri.rstrip("/")
+        self.ttl_seconds: float = ttl_seconds
+        self.max_bytes: int = max_bytes
+        self.clock: Callable[[], float] = clock
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the cached result, or None if it is missing or expired.
+        """
+        with self.lock:
+            index: dict[str, IndexEntry] = self._load_index()
+            entry: Optional[IndexEntry] = index.get(key)
+            now: float = self.clock()
+            if entry is None or now - entry["created"] > self.ttl_seconds:
+                return None
+            try:
+                value: Any = self._loads(self.store.get(self._uri(key)))
+            except FileNotFoundError:
+                return None
+            except Exception as e:
+                # 壊れた結果は使わずにクエリし直す
+                print(f"Error loading result cache {key}: {e}")
+                return None
+            entry["accessed"] = now
+            self._save_index(index)
+        print(f"{type(self).__name__} hit: {key} ({self._describe(value)})")
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """
+        Stores a result, then evicts expired and least recently used results.
+        """
+        body: bytes = self._dumps(value)
+        with self.lock:
+            try:
+                self.store.put(self._uri(key), body)
+                index: dict[str, IndexEntry] = self._load_index()
+                now: float = self.clock()
+                index[key] = {"created": now, "accessed": now, "size": len(body)}
+                self._evict(index, now)
+                self._save_index(index)
+            except Exception as e:
+                # キャッシュの保存に失敗しても通知は続ける
+                print(f"Error saving result cache {key}: {e}")
+
+    def _dumps(self, records: CurRecords) -> bytes:
+        return _encode(records)
+
+    def _loads(self, body: bytes) -> CurRecords:
+        return _decode(body)
+
+    def _describe(self, records: CurRecords) -> str:
+        return f"{len(records)} records"
+
+    def _evict(self, index: dict[str, IndexEntry], now: float) -> None:
+        expired: list[str] = [key for key, entry in index.items() if now - entry["created"] > self.ttl_seconds]
+        total: int = sum(entry["size"] for key, entry in index.items() if key not in expired)
+        # 最後に読まれたのが古い順に、合計サイズが上限に収まるまで削除する
+        for key in sorted(index, key=lambda k: index[k]["accessed"]):
+            if key in expired:
+                continue
+            if total <= self.max_bytes:
+                break
+            expired.append(key)
+            total -= index[key]["size"]
+        for key in expired:
+            self.store.delete(self._uri(key))
+            del index[key]
+
+    def _uri(self, key: str) -> str:
+        return f"{self.prefix_uri}/{key}{self.suffix}"
+
+    def _index_uri(self) -> str:
+        return f"{self.prefix_uri}/_index.json"
+
+    def _load_index(self) -> dict[str, IndexEntry]:
+        try:
+            index: dict[str, IndexEntry] = json.loads(self.store.get(self._index_uri()))
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error loading result cache index: {e}")
+            return {}
+        return index
+
+    def _save_index(self, index: dict[str, IndexEntry]) -> None:
+        try:
+            self.store.put(self._index_uri(), json.dumps(index).encode("utf-8"))
+        except Exception as e:
+            print(f"Error saving result cache index: {e}")
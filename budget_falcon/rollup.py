@@ -0,0 +1,149 @@
+import json
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Optional, TypedDict
+
+# CURの明細を日次で集計したロールアップテーブル（parquet）を作成・更新する
+# グラフ用のクエリは明細ではなくロールアップを読むため、スキャン量が数KB程度になる
+
+JST = timezone(timedelta(hours=9))
+
+"""
+Rollup state structure (stored next to the rollup data, ignored by Athena as it starts with "_"):
+    {
+        "settled_through": "2025-05-16",  # Last date materialized after it settled
+    }
+"""
+class RollupState(TypedDict):
+    settled_through: str
+
+
+class RollupBuilder:
+    """
+    Maintains the daily rollup table (date, account_id, product_code, line_item_type, cost).
+    Every line item type is kept, so the rollup does not depend on ATHENA_LINE_ITEM_TYPES.
+
+    Each date is written with UNLOAD as parquet to location/date=yyyy-MM-dd/, which
+    the rollup table maps with partition projection. A refresh rewrites only the dates
+    after the last settled one: on the first run the whole query window, and afterwards
+    the last settle_days days and today.
+
+    All refreshed dates are written by a single UNLOAD partitioned by date, so the raw
+    CUR table is scanned once per refresh. UNLOAD writes to a staging prefix
+    (location/_staging/, outside the projected partitions), and the dates are swapped
+    into the table only after the query succeeded; a failed refresh keeps the previous
+    rollup. A swap copies the new files in before deleting the previous ones, so a date
+    is never empty, but a reader may briefly see both and count that date twice.
+
+    Queries run through the CurDAO's query engine, so their status polling is shared,
+    and their statistics are added to the CurDAO's query log.
+    """
+    def __init__(self, dao: Any, store: Any, location: str, settle_days: int = 3) -> None:
+        self.dao: Any = dao
+        self.store: Any = store
+        self.location: str = location.rstrip("/") + "/"
+        self.settle_days: int = max(0, settle_days)
+
+    def refresh(self, today: Optional[date] = None) -> list[str]:
+        """
+        Rewrites the rollup for the dates that are not settled yet.
+
+        Args:
+            today: Current date in JST (defaults to now).
+
+        Returns:
+            list[str]: Refreshed dates (yyyy-MM-dd).
+        """
+        today = today or datetime.now(JST).date()
+        # 読み込み時の範囲（QUERY_DAYS_RANGE）の初日から用意する
+        first: date = today - timedelta(days=self.dao.query_days_range)
+        state: Optional[RollupState] = self._load_state()
+        if state is not None:
+            first = max(first, date.fromisoformat(state["settled_through"]) + timedelta(days=1))
+        dates: list[date] = [first + timedelta(days=i) for i in range((today - first).days + 1)]
+
+        # UNLOADの出力先は空である必要があるため、前回の残りを削除する
+        self._clear(self._staging_prefix())
+        # 明細のスキャンは1回で済むよう、対象の全日付を1つのUNLOADで日付ごとに書き出す
+        future: Future = self.dao.engine.submit(self._build_query(first, today), reuse=False)
+        try:
+            # スキャン量などの統計はグラフ用のクエリと同じくクエリのログに残す
+            self.dao.record_statistics(future.result())
+        except Exception:
+            # 失敗した場合は前回のロールアップのまま、状態も更新せずに次回の実行で作り直す
+            self._clear(self._staging_prefix())
+            raise
+        for day in dates:
+            self._swap(day)
+
+        settled_through: date = today - timedelta(days=self.settle_days + 1)
+        self._save_state({"settled_through": max(settled_through, first - timedelta(days=1)).isoformat()})
+        refreshed: list[str] = [day.isoformat() for day in dates]
+        print(f"Refreshed rollup for {len(refreshed)} dates: {refreshed[0]} - {refreshed[-1]}")
+        return refreshed
+
+    def _prefix(self, day: date) -> str:
+        return f"{self.location}date={day.isoformat()}/"
+
+    def _staging_prefix(self, day: Optional[date] = None) -> str:
+        # "_"で始まるプレフィックスはパーティションの投影の対象外のため、Athenaからは読まれない
+        if day is None:
+            return f"{self.location}_staging/"
+        return f"{self.location}_staging/date={day.isoformat()}/"
+
+    def _clear(self, prefix: str) -> None:
+        for uri in self.store.list(prefix):
+            self.store.delete(uri)
+
+    def _swap(self, day: date) -> None:
+        # 作り直した内容を先にテーブルの日付へコピーし、その後で前回のファイルだけを削除する
+        # （その間は前回と今回のファイルが両方読まれうるが、日付が空になることはない）
+        staging: str = self._staging_prefix(day)
+        previous: list[str] = self.store.list(self._prefix(day))
+        swapped: set[str] = set()
+        for uri in self.store.list(staging):
+            target: str = self._prefix(day) + uri[len(staging):]
+            self.store.copy(uri, target)
+            swapped.add(target)
+        for uri in previous:
+            if uri not in swapped:
+                self.store.delete(uri)
+        self._clear(staging)
+
+    def _build_query(self, first: date, today: date) -> str:
+        # 明細タイプでは絞り込まず、読み込み時に絞り込む（設定を変えても作り直さずに済む）
+        next_day: date = today + timedelta(days=1)
+        # partition_filter は today からの日数で対象の請求期間を決める
+        partition_filter: str = self.dao.partition_filter((today - first).days)
+        # partitioned_by の列は最後に置く必要がある
+        return f"""
+            UNLOAD (
+                SELECT
+                    line_item_usage_account_id AS account_id,
+                    line_item_product_code AS product_code,
+                    line_item_line_item_type AS line_item_type,
+                    SUM(line_item_unblended_cost) AS cost,
+                    date_format(date_add('hour', 9, line_item_usage_start_date), '%Y-%m-%d') AS date
+                FROM "{self.dao.table}"
+                WHERE
+                    date_add('hour', 9, line_item_usage_start_date) >= timestamp '{first.isoformat()} 00:00:00'
+                    AND date_add('hour', 9, line_item_usage_start_date) < timestamp '{next_day.isoformat()} 00:00:00'
+                    {partition_filter}
+                GROUP BY 1, 2, 3, 5
+            )
+            TO '{self._staging_prefix()}'
+            WITH (format = 'PARQUET', compression = 'SNAPPY', partitioned_by = ARRAY['date'])
+        """
+
+    def _state_uri(self) -> str:
+        return f"{self.location}_rollup_state.json"
+
+    def _load_state(self) -> Optional[RollupState]:
+        try:
+            state: RollupState = json.loads(self.store.get(self._state_uri()))
+        except FileNotFoundError:
+            return None
+        return state
+
+    def _save_state(self, state: RollupState) -> None:
+        self.store.put(self._state_uri(), json.dumps(state).encode("utf-8"))
@@ -0,0 +1,143 @@
+import json
+from typing import Any, Callable, Optional, TypedDict
+
+# Lambdaの残り実行時間を監視し、時間内に終わらないグループは継続実行（別のLambda呼び出し）に回す
+# また、コーディネーターとしてグループを複数のワーカー呼び出しに分配する
+
+GROUPS_KEY: str = "groups"
+
+"""
+Group event structure (worker and continuation invocations):
+    {
+        "groups": [                    # Account groups to process
+            {"name": "PROJECT X", "target_channel": "CXXXXXXXX", "accounts": [["123456789012", "dev-account"]]},
+        ],
+        "depth": 1,                    # Number of continuations before this one (0 for a worker)
+    }
+"""
+class GroupEventState(TypedDict):
+    groups: list[dict[str, Any]]  # 処理対象のAccountGroup
+    depth: int                    # 何回目の継続実行か（無限に呼び出し続けないための上限判定用）
+
+
+class DeadlineScheduler:
+    """
+    Decides whether there is enough time left in the Lambda invocation to start more work.
+
+    A group is only started while the remaining time is above the reserved time, which
+    should cover fetching, rendering and posting a single group. Without a Lambda context
+    (e.g. local runs) every group is started.
+    """
+    def __init__(self, context: Any, reserve_ms: int) -> None:
+        self.context: Any = context
+        self.reserve_ms: int = reserve_ms
+
+    def remaining_ms(self) -> Optional[int]:
+        if self.context is None or not hasattr(self.context, "get_remaining_time_in_millis"):
+            return None
+        return int(self.context.get_remaining_time_in_millis())
+
+    def can_start(self) -> bool:
+        remaining: Optional[int] = self.remaining_ms()
+        return remaining is None or remaining > self.reserve_ms
+
+
+class LambdaDispatcher:
+    """
+    Sends events to a Lambda function with asynchronous invocations.
+    """
+    def __init__(self, lambda_client: Any, function_name: str) -> None:
+        self.client: Any = lambda_client
+        self.function_name: str = function_name
+
+    def dispatch(self, event: dict[str, Any]) -> None:
+        self.client.invoke(
+            FunctionName=self.function_name,
+            InvocationType="Event",
+            Payload=json.dumps(event, ensure_ascii=False).encode("utf-8"),
+        )
+
+
+class LocalDispatcher:
+    """
+    In-process stand-in for LambdaDispatcher, for offline runs and tests.
+
+    Each event is encoded to JSON and decoded again like a real invocation payload,
+    then passed to the handler synchronously. Dispatched events are kept in order.
+    """
+    def __init__(self, handler: Callable[[dict[str, Any], Any], Any], context: Any = None) -> None:
+        self.handler: Callable[[dict[str, Any], Any], Any] = handler
+        self.context: Any = context
+        self.events: list[dict[str, Any]] = []
+
+    def dispatch(self, event: dict[str, Any]) -> None:
+        payload: dict[str, Any] = json.loads(json.dumps(event, ensure_ascii=False))
+        self.events.append(payload)
+        self.handler(payload, self.context)
+
+
+def group_event(groups: list[dict[str, Any]], depth: int = 0) -> dict[str, Any]:
+    """
+    Builds the event of a worker or continuation invocation.
+
+    Args:
+        groups: Account groups to process.
+        depth: Number of continuations before this one.
+
+    Returns:
+        Event dict that can be serialized to JSON.
+    """
+    return {GROUPS_KEY: groups, "depth": depth}
+
+
+def group_event_state(event: Any) -> Optional[GroupEventState]:
+    """
+    Extracts the account groups from a worker or continuation event.
+
+    Args:
+        event: Lambda event. Scheduled events do not carry any groups.
+
+    Returns:
+        GroupEventState, or None if the event does not carry groups.
+    """
+    if not isinstance(event, dict) or not isinstance(event.get(GROUPS_KEY), list):
+        return None
+    groups: list[dict[str, Any]] = []
+    for group in event[GROUPS_KEY]:
+        # JSONではタプルがリストになるため、(account_id, display_name) に戻す
+        groups.append({**group, "accounts": [tuple(account) for account in group["accounts"]]})
+    return {"groups": groups, "depth": int(event.get("depth", 0))}
+
+
+def start_continuation(dispatcher: Any, groups: list[dict[str, Any]], depth: int) -> None:
+    """
+    Dispatches the unfinished groups to a continuation invocation.
+
+    Args:
+        dispatcher: LambdaDispatcher, or LocalDispatcher for offline runs.
+        groups: Unfinished account groups.
+        depth: Number of continuations before the new one.
+    """
+    dispatcher.dispatch(group_event(groups, depth))
+    print(f"Started continuation #{depth} for {len(groups)} groups")
+
+
+def dispatch_groups(dispatcher: Any, groups: list[dict[str, Any]], chunk_size: int = 1) -> int:
+    """
+    Splits the groups into chunks and dispatches one worker event per chunk.
+
+    Args:
+        dispatcher: LambdaDispatcher, or LocalDispatcher for offline runs.
+        groups: Account groups to process.
+        chunk_size: Maximum number of groups per worker invocation.
+
+    Returns:
+        int: Number of dispatched worker events.
+    """
+    chunk_size = max(1, chunk_size)
+    count: int = 0
+    for i in range(0, len(groups), chunk_size):
+        dispatcher.dispatch(group_event(groups[i:i + chunk_size]))
+        count += 1
+    print(f"Dispatched {len(groups)} groups to {count} workers")
+    return count
@@ -1,5 +1,8 @@
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
+from typing import TYPE_CHECKING, Optional, Union
+
+# slack_sdkは読み込みに時間がかかるため、コールドスタートを短くするためにクライアントの生成時に読み込む
+if TYPE_CHECKING:
+    from slack_sdk import WebClient
 
 
 class SlackClient:
@@ -10,39 +13,64 @@ class SlackClient:
     Automatically attempts to join channels before posting and includes retry logic.
     """
     def __init__(self, token: str) -> None:
-        self.client: WebClient = WebClient(token=token)
+        from slack_sdk import WebClient
+
+        self.client: "WebClient" = WebClient(token=token)
 
-    def post_file(self, channel_id: str, file_path: str, title: str = "AWS Cost Breakdown (Daily)") -> None:
+    def post_file(
+        self,
+        channel_id: str,
+        file: Union[str, bytes],
+        title: str = "AWS Cost Breakdown (Daily)",
+        filename: Optional[str] = None,
+    ) -> bool:
         """
         Posts a file to a Slack channel.
 
         Args:
             channel_id: The ID of the Slack channel to post to
-            file_path: Path to the file to upload
+            file: Path to the file to upload, or its content (e.g. PNG bytes from plot_graph)
             title: Title of the file upload (default: "AWS Cost Breakdown (Daily)")
+            filename: Name of the uploaded file (default: the base name of the path, or
+                "chart.png" for bytes)
+
+        Returns:
+            bool: True if the file was uploaded
 
         Note:
             Attempts to join the channel before posting. Prints error messages if joining
             or uploading fails, but does not raise exceptions.
         """
+        from slack_sdk.errors import SlackApiError
+
         try:
             self.client.conversations_join(channel=channel_id)
         except SlackApiError as e:
             print(f"Error joining channel: {e.response['error']}")
-            return
+            return False
 
         # 失敗時に1回だけリトライする
         for _ in range(2):
             try:
-                with open(file_path, "rb") as f:
+                if isinstance(file, str):
+                    with open(file, "rb") as f:
+                        self.client.files_upload_v2(
+                            channel=channel_id,
+                            file=f,
+                            filename=filename or file.split("/")[-1],
+                            title=title,
+                        )
+                else:
+                    # メモリ上の画像はファイルに書かずにそのままアップロードする
                     self.client.files_upload_v2(
                         channel=channel_id,
-                        file=f,
-                        filename=file_path.split("/")[-1],
+                        file=bytes(file),
+                        filename=filename or "chart.png",
                         title=title,
                     )
-                    return
+                return True
             except SlackApiError as e:
                 print(f"Error uploading file: {e.response['error']}")
             except TimeoutError as e:
                 print(f"Timeout error while uploading file: {e}")
+        return False
@@ -0,0 +1,78 @@
+"""
+Chart encoding benchmark: save time (draw and encode) and image size of
+plot_graph's output formats, with the upload time they imply, for several
+account counts. build_s is the rest of plot_graph (aggregation and artists).
+
+    poetry run python tests/bench/bench_chart_encoding.py --accounts 1,12,40 --mbps 20
+"""
+import sys
+import time
+import warnings
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from bench_graph_render import generate  # noqa: E402
+from budget_falcon import graph_plotter  # noqa: E402
+
+# 比較する出力形式（名前 -> plot_graphのencoding）
+ENCODINGS: dict[str, dict] = {
+    "png": {},
+    "png_level1": {"compress_level": 1},
+    "png_level9": {"compress_level": 9},
+    "palette256": {"palette_colors": 256},
+    "palette64": {"palette_colors": 64},
+    "webp_lossless": {"format": "webp", "lossless": True},
+    "webp_q80": {"format": "webp", "quality": 80},
+    "png_dpi72": {"dpi": 72},
+    "png_max2000": {"max_pixels": 2000},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", default="1,12,40", help="comma separated account counts")
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--layout", default="tight", choices=graph_plotter.LAYOUTS)
+    parser.add_argument("--mbps", type=float, default=20.0, help="upload bandwidth used for the upload estimate")
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--encodings", default=",".join(ENCODINGS), help="comma separated encodings")
+    args = parser.parse_args()
+
+    graph_plotter.preload()
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    # plot_graphの中の保存（描画とエンコード）だけの時間を計る
+    save_figure = graph_plotter._save_figure
+    save_seconds: list[float] = []
+
+    def timed_save_figure(*a, **kw):
+        started = time.perf_counter()
+        save_figure(*a, **kw)
+        save_seconds.append(time.perf_counter() - started)
+
+    graph_plotter._save_figure = timed_save_figure
+
+    print("\t".join(["accounts", "encoding", "build_s", "save_s", "bytes", "upload_s", "end_to_end_s"]))
+    for accounts in [int(value) for value in args.accounts.split(",")]:
+        accounts_list, records = generate(accounts, args.services, args.days)
+        for name in args.encodings.split(","):
+            best_total, best_save, size = float("inf"), float("inf"), 0
+            for _ in range(args.repeat):
+                save_seconds.clear()
+                started = time.perf_counter()
+                data = graph_plotter.plot_graph(records, accounts_list, layout=args.layout, encoding=ENCODINGS[name])
+                best_total = min(best_total, time.perf_counter() - started)
+                best_save = min(best_save, save_seconds[0])
+                size = len(data)
+            upload = size * 8 / (args.mbps * 1_000_000)
+            print("\t".join([
+                str(accounts), name, f"{best_total - best_save:.3f}", f"{best_save:.3f}",
+                str(size), f"{upload:.3f}", f"{best_total + upload:.3f}",
+            ]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+CurDAO fetch benchmark on LocalAthena (no AWS account needed).
+
+Generates synthetic CUR line items for each account count, and measures the wall time,
+the peak Python memory (tracemalloc) and the result size of CurDAO.fetch().
+
+    poetry run python tests/bench/bench_cur_dao.py --accounts 1,10,100,1000
+"""
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from budget_falcon.athena_local import LocalAthena, account_ids, generate_cur  # noqa: E402
+from budget_falcon.cur_dao import CurDAO  # noqa: E402
+from budget_falcon.object_store import LocalObjectStore  # noqa: E402
+
+
+def bench(accounts: int, args: argparse.Namespace, base_dir: str) -> dict:
+    store = LocalObjectStore(base_dir)
+    athena = LocalAthena(store=store if args.mode == "s3" else None)
+    started = time.perf_counter()
+    line_items = generate_cur(
+        athena.conn, "cur", accounts=accounts, services=args.services, days=args.days, line_items=args.line_items
+    )
+    generate_seconds = time.perf_counter() - started
+
+    params = {
+        "AWS_REGION": "local",
+        "ATHENA_DATABASE": "local",
+        "ATHENA_TABLE": "cur",
+        "ATHENA_OUTPUT_URI": "s3://bench/output/",
+        "ATHENA_LINE_ITEM_TYPES": ["Usage", "DiscountedUsage"],
+        "QUERY_DAYS_RANGE": args.days,
+        "ATHENA_TOP_N_SERVICES": args.top_n,
+    }
+    dao = CurDAO(params, client=athena, result_store=store if args.mode == "s3" else None)
+    ids = account_ids(accounts)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    records = dao.fetch(ids)
+    fetch_seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = records.queries[0]
+    return {
+        "accounts": accounts,
+        "line_items": line_items,
+        "generate_s": generate_seconds,
+        "fetch_s": fetch_seconds,
+        "engine_s": stats["engine_execution_ms"] / 1000,
+        "read_s": stats["read_seconds"],
+        "records": len(records),
+        "pages": stats["result_pages"],
+        "peak_mib": peak / 1024 / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", default="1,10,100,1000", help="comma separated account counts")
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--line-items", type=int, default=4, help="line items per account, service and day")
+    parser.add_argument("--mode", choices=["api", "s3"], default="s3", help="read results by paging (api) or from the CSV (s3)")
+    parser.add_argument("--top-n", type=int, default=0, help="fold services into top N and Others in the query")
+    args = parser.parse_args()
+
+    columns = ["accounts", "line_items", "generate_s", "fetch_s", "engine_s", "read_s", "records", "pages", "peak_mib"]
+    print("\t".join(columns))
+    for accounts in [int(value) for value in args.accounts.split(",")]:
+        with tempfile.TemporaryDirectory() as base_dir:
+            result = bench(accounts, args, base_dir)
+        print("\t".join(f"{result[c]:.3f}" if isinstance(result[c], float) else str(result[c]) for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+plot_graph aggregation benchmark: the row-by-row loops it used before against the
+single-pass cost cube (graph_plotter._aggregate). Drawing is not included.
+
+    poetry run python tests/bench/bench_graph_plotter.py --accounts 12,36,120 --services 100
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from budget_falcon.cur_records import CurRecords  # noqa: E402
+from budget_falcon.graph_plotter import OTHERS, _aggregate  # noqa: E402
+
+
+def legacy_aggregate(records, account_ids, top_n_services):
+    # 以前の plot_graph の集計（全体の順序と、アカウントごとの積み上げる値）
+    records_by_account = {aid: [] for aid in account_ids}
+    for rec in records:
+        if rec[1] in records_by_account:
+            records_by_account[rec[1]].append(rec)
+    global_service_max_daily = defaultdict(float)
+    for recs in records_by_account.values():
+        tmp_daily = defaultdict(float)
+        for date_str, _, service, cost in recs:
+            try:
+                d = datetime.strptime(date_str, "%Y-%m-%d")
+            except Exception:
+                continue
+            tmp_daily[(service, d)] += cost
+            global_service_max_daily[service] = max(global_service_max_daily[service], tmp_daily[(service, d)])
+    global_service_order = [k for k, _ in sorted(global_service_max_daily.items(), key=lambda x: x[1], reverse=True)]
+
+    series = {}
+    for account_id in account_ids:
+        cost_dict = defaultdict(lambda: defaultdict(float))
+        service_totals = defaultdict(float)
+        service_max_daily = defaultdict(float)
+        dates = set()
+        for date_str, _, service, cost in records_by_account[account_id]:
+            try:
+                d = datetime.strptime(date_str, "%Y-%m-%d")
+            except Exception:
+                continue
+            cost_dict[d][service] += cost
+            service_totals[service] += cost
+            dates.add(d)
+            service_max_daily[service] = max(service_max_daily[service], cost_dict[d][service])
+        top_services = [k for k, _ in sorted(service_max_daily.items(), key=lambda x: x[1], reverse=True)[:top_n_services]]
+        services = top_services + ([OTHERS] if len(service_max_daily) > top_n_services else [])
+        values = {s: [] for s in services}
+        for d in sorted(dates):
+            others_sum = 0
+            for s in service_totals:
+                v = cost_dict[d].get(s, 0)
+                if s in top_services:
+                    values[s].append(v)
+                else:
+                    others_sum += v
+            if OTHERS in values:
+                values[OTHERS].append(others_sum)
+        series[account_id] = (services, values)
+    return global_service_order, series
+
+
+def generate(accounts, services, days, seed=0):
+    rng = random.Random(seed)
+    names = [f"Service{i:03d}" for i in range(services)]
+    ids = [f"{100000000000 + i:012d}" for i in range(accounts)]
+    today = date(2025, 5, 20)
+    rows = []
+    for offset in range(days, -1, -1):
+        day = (today - timedelta(days=offset)).isoformat()
+        for aid in ids:
+            for service in names:
+                rows.append((day, aid, service, rng.lognormvariate(0, 2)))
+    return ids, rows
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", default="12,36,120", help="comma separated account counts")
+    parser.add_argument("--services", type=int, default=100)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--top-n", type=int, default=8)
+    args = parser.parse_args()
+
+    print("accounts\trows\tlegacy_s\tcube_s\tcube_columnar_s\tspeedup")
+    for accounts in [int(value) for value in args.accounts.split(",")]:
+        ids, rows = generate(accounts, args.services, args.days)
+        columnar = CurRecords(rows)
+        legacy_s, (legacy_order, legacy_series) = timed(legacy_aggregate, rows, ids, args.top_n)
+        cube_s, (order, series) = timed(_aggregate, rows, ids, args.top_n)
+        columnar_s, _ = timed(_aggregate, columnar, ids, args.top_n)
+        # 結果が一致することを確認する
+        assert order == legacy_order
+        for aid in ids:
+            services, values = legacy_series[aid]
+            assert series[aid]["services"] == services
+            for s, row in zip(services, series[aid]["values"]):
+                assert all(abs(a - b) < 1e-9 for a, b in zip(row, values[s]))
+        print(f"{accounts}\t{len(rows)}\t{legacy_s:.3f}\t{cube_s:.3f}\t{columnar_s:.3f}\t{legacy_s / columnar_s:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
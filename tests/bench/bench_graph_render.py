@@ -0,0 +1,78 @@
+"""
+plot_graph render benchmark: wall time of whole charts (aggregation, drawing and
+savefig) for several account counts and rendering options.
+
+    poetry run python tests/bench/bench_graph_render.py --accounts 1,12,40
+"""
+import os
+import sys
+import time
+import warnings
+import random
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import date, timedelta
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+from budget_falcon.cur_records import CurRecords  # noqa: E402
+from budget_falcon.graph_plotter import SERVICE_LABEL_MAP, plot_graph, preload  # noqa: E402
+
+# 比較する描画オプション（名前 -> plot_graphの引数）
+VARIANTS: dict[str, dict] = {
+    "patches": {"bar_renderer": "patches"},
+    "collections": {"bar_renderer": "collections"},
+    "fixed": {"bar_renderer": "collections", "layout": "fixed"},
+}
+
+
+def generate(accounts, services, days, seed=0):
+    rng = random.Random(seed)
+    # 色・模様の割り当てを通すため、設定ファイルにあるサービスを使う
+    names = sorted(SERVICE_LABEL_MAP)[:services]
+    today = date(2025, 5, 20)
+    accounts_list = [(f"{100000000000 + i:012d}", f"アカウント {i}") for i in range(accounts)]
+    rows = []
+    for aid, _ in accounts_list:
+        used = rng.sample(names, min(len(names), rng.randint(5, services)))
+        for offset in range(days, -1, -1):
+            day = (today - timedelta(days=offset)).isoformat()
+            for service in used:
+                rows.append((day, aid, service, rng.lognormvariate(0, 2)))
+    return accounts_list, CurRecords(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", default="1,12,40", help="comma separated account counts")
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--top-n", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="comma separated variants")
+    args = parser.parse_args()
+
+    # フォントやmatplotlibの読み込みは計測に含めない
+    preload()
+    warnings.filterwarnings("ignore", category=UserWarning)
+    variants = args.variants.split(",")
+    print("\t".join(["accounts"] + [f"{v}_s" for v in variants] + [f"{v}_bytes" for v in variants]))
+    with tempfile.TemporaryDirectory() as out_dir:
+        for accounts in [int(value) for value in args.accounts.split(",")]:
+            accounts_list, records = generate(accounts, args.services, args.days)
+            seconds, sizes = [], []
+            for variant in variants:
+                output_path = os.path.join(out_dir, f"{variant}_{accounts}.png")
+                best = float("inf")
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    plot_graph(records, accounts_list, output_path, top_n_services=args.top_n, **VARIANTS[variant])
+                    best = min(best, time.perf_counter() - started)
+                seconds.append(f"{best:.3f}")
+                sizes.append(str(os.path.getsize(output_path)))
+            print("\t".join([str(accounts)] + seconds + sizes))
+
+
+if __name__ == "__main__":
+    main()
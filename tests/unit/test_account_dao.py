@@ -12,8 +12,8 @@ class TestAccountDAO(unittest.TestCase):
             "SPREADSHEET_RANGE": "test-range",
         }
 
-    @patch('budget_falcon.account_dao.build')
-    @patch('budget_falcon.account_dao.load_credentials_from_dict')
+    @patch('googleapiclient.discovery.build')
+    @patch('google.auth.load_credentials_from_dict')
     def test_list_data(self, mock_load_creds, mock_build):
         test_values = [
             ["Project A", "C12345678901", "123456789012", "dev", "234567890123", "prod"],
@@ -72,6 +72,29 @@ class TestAccountDAO(unittest.TestCase):
             ("345678901234", "test")
         ])
 
+    @patch('google.auth.transport.requests.Request')
+    @patch('googleapiclient.discovery.build')
+    @patch('google.auth.load_credentials_from_dict')
+    def test_ensure_credentials(self, mock_load_creds, mock_build, mock_request):
+        """
+        ウォームスタート時のヘルスチェックとして、期限切れの場合のみ認証情報が更新されることを検証します。
+        """
+        mock_creds = MagicMock()
+        mock_creds.expired = False
+        mock_load_creds.return_value = (mock_creds, 'test-project-id')
+
+        dao = AccountDAO(self.mock_params)
+
+        # 有効期限内であれば更新しない
+        self.assertTrue(dao.ensure_credentials())
+        mock_creds.refresh.assert_not_called()
+
+        # 期限切れの場合は更新する
+        mock_creds.expired = True
+        mock_creds.valid = True
+        self.assertTrue(dao.ensure_credentials())
+        mock_creds.refresh.assert_called_once_with(mock_request.return_value)
+
 
 if __name__ == '__main__':
     unittest.main()
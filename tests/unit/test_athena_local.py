@@ -0,0 +1,101 @@
+import tempfile
+import unittest
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from budget_falcon.athena_local import LocalAthena, account_ids, generate_cur
+from budget_falcon.cur_dao import CurDAO
+from budget_falcon.object_store import LocalObjectStore
+
+NOW = datetime(2025, 5, 20, 3, 0, tzinfo=timezone.utc)  # JSTで2025-05-20 12:00
+TODAY = date(2025, 5, 20)
+
+
+class TestLocalAthena(unittest.TestCase):
+    """
+    SQLiteでAthenaの代わりにクエリを実行するLocalAthenaと、CURの合成データをテストします。
+    テスト内容:
+    - test_fetch_matches_line_items:
+        - CurDAOのクエリの結果が、合成した明細をPythonで日付（JST）・アカウント・サービスごとに集計した結果と一致することを検証します。
+        - 結果がページに分かれて取得されることを確認します。
+    - test_top_n_query_from_result_csv:
+        - 上位N件のクエリの結果を出力CSVから読み込み、日付・アカウントごとの合計が全サービスの場合と一致することを検証します。
+    - test_latency_and_result_reuse:
+        - 実行中の状態を返す間は状態確認を続け、同じクエリの2回目は以前の結果を再利用する（スキャン量が0になる）ことを検証します。
+    """
+    def setUp(self):
+        self.params = {
+            "AWS_REGION": "ap-northeast-1",
+            "ATHENA_DATABASE": "test-db",
+            "ATHENA_TABLE": "cur",
+            "ATHENA_OUTPUT_URI": "s3://test-bucket/output/",
+            "ATHENA_LINE_ITEM_TYPES": ["Usage", "DiscountedUsage"],
+            "QUERY_DAYS_RANGE": 14,
+            "ATHENA_POLL_INITIAL_DELAY": 0.01,
+        }
+        self.ids = account_ids(5)
+
+    def test_fetch_matches_line_items(self):
+        athena = LocalAthena(now=NOW, page_size=50)
+        generate_cur(athena.conn, "cur", accounts=5, services=6, days=20, today=TODAY)
+
+        records = CurDAO(self.params, client=athena).fetch(self.ids)
+
+        # 14日前のJST 09:00（UTC 00:00）以降の明細を集計する
+        start = (TODAY - timedelta(days=14)).isoformat()
+        expected = defaultdict(float)
+        for start_date, aid, service, line_item_type, cost, _ in athena.conn.execute("SELECT * FROM cur"):
+            if start_date >= start and line_item_type in ("Usage", "DiscountedUsage"):
+                day = (datetime.fromisoformat(start_date) + timedelta(hours=9)).date().isoformat()
+                expected[(day, aid, service)] += cost
+        self.assertEqual(len(records), len(expected))
+        for day, aid, service, cost in records:
+            self.assertAlmostEqual(cost, expected[(day, aid, service)])
+        self.assertEqual([rec[:2] for rec in records], sorted(rec[:2] for rec in records))
+        self.assertEqual(records.queries[0]["result_pages"], len(expected) // 50 + 1)
+
+    def test_top_n_query_from_result_csv(self):
+        with tempfile.TemporaryDirectory() as base_dir:
+            store = LocalObjectStore(base_dir)
+            athena = LocalAthena(now=NOW, store=store)
+            generate_cur(athena.conn, "cur", accounts=5, services=8, days=20, today=TODAY)
+            full = CurDAO(self.params, client=athena, result_store=store).fetch(self.ids)
+            folded = CurDAO(
+                {**self.params, "ATHENA_TOP_N_SERVICES": 3, "ATHENA_OTHERS_LABEL": "Others"},
+                client=athena,
+                result_store=store,
+            ).fetch(self.ids)
+
+        def totals(records):
+            result = defaultdict(float)
+            for day, aid, _, cost in records:
+                result[(day, aid)] += cost
+            return result
+
+        full_totals, folded_totals = totals(full), totals(folded)
+        self.assertEqual(full_totals.keys(), folded_totals.keys())
+        for key, cost in full_totals.items():
+            self.assertAlmostEqual(folded_totals[key], cost)
+        for aid in self.ids:
+            services = {service for _, a, service, _ in folded if a == aid}
+            self.assertLessEqual(len(services - {"Others"}), 3)
+        self.assertEqual(set(folded.service_max), set(self.ids))
+
+    def test_latency_and_result_reuse(self):
+        athena = LocalAthena(now=NOW, latency=0.05)
+        generate_cur(athena.conn, "cur", accounts=2, services=3, days=10, today=TODAY)
+        dao = CurDAO(self.params, client=athena)
+        waits = []
+        dao.engine.on_wait = waits.append
+
+        first = dao.fetch_async(self.ids[:2]).result(timeout=5)
+        second = dao.fetch(self.ids[:2])
+
+        self.assertIn("QUEUED", [w["state"] for w in waits])
+        self.assertEqual(second, first)
+        self.assertGreater(first.queries[0]["data_scanned_bytes"], 0)
+        self.assertTrue(second.queries[0]["result_reused"])
+        self.assertEqual(second.queries[0]["data_scanned_bytes"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+from datetime import date
+from budget_falcon.chart_cache import ChartCache
+from budget_falcon.cur_records import CurRecords
+from budget_falcon.graph_plotter import aggregate_records, chart_fingerprint
+from budget_falcon.object_store import LocalObjectStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestChartCache(unittest.TestCase):
+    """
+    描画済み・投稿済みのグラフのキャッシュ（ChartCache）と、グラフのキー（chart_fingerprint）をテストします。
+    テスト内容:
+    - test_fingerprint:
+        - レコードの順序や合計の誤差程度のコストの違いはキーに影響せず、
+          コスト・アカウント名・描画オプション・実行日が異なる場合は別のキーになることを検証します。
+        - 集計済みの結果を渡しても同じキーになることを確認します。
+    - test_image_round_trip:
+        - 保存した画像が別のインスタンスからそのまま読み込めることを検証します。
+    - test_posted_per_channel:
+        - 投稿済みの記録はチャンネルごとで、TTLを過ぎると投稿済みとして扱われないことを検証します。
+        - skip_postedを無効にした場合は記録しないことを確認します。
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocalObjectStore(self.tmp.name)
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _cache(self, **kwargs):
+        return ChartCache(self.store, "s3://chart-cache/", clock=self.clock, **kwargs)
+
+    def test_fingerprint(self):
+        today = date(2025, 5, 20)
+        accounts = [("123456789012", "Test Account")]
+        rows = [
+            ("2025-05-15", "123456789012", "AmazonEC2", 1.5),
+            ("2025-05-15", "123456789012", "AmazonS3", 0.25),
+            ("2025-05-16", "123456789012", "AmazonEC2", 2.0),
+        ]
+        key = chart_fingerprint(rows, accounts, 8, today=today, layout="tight")
+        self.assertEqual(key, chart_fingerprint(CurRecords(rows[::-1]), accounts, 8, today=today, layout="tight"))
+        # 集計済みの結果を渡しても同じキーになる（集計結果は描画の設定としては扱わない）
+        aggregated = aggregate_records(rows, accounts, 8)
+        self.assertEqual(key, chart_fingerprint(rows, accounts, 8, today=today, aggregated=aggregated, layout="tight"))
+        nearly = [(d, a, s, c + 1e-9) for d, a, s, c in rows]
+        self.assertEqual(key, chart_fingerprint(nearly, accounts, 8, today=today, layout="tight"))
+
+        changed = rows[:2] + [("2025-05-16", "123456789012", "AmazonEC2", 2.5)]
+        self.assertNotEqual(key, chart_fingerprint(changed, accounts, 8, today=today, layout="tight"))
+        self.assertNotEqual(key, chart_fingerprint(rows, [("123456789012", "Renamed")], 8, today=today, layout="tight"))
+        self.assertNotEqual(key, chart_fingerprint(rows, accounts, 8, today=today, layout="fixed"))
+        self.assertNotEqual(key, chart_fingerprint(rows, accounts, 8, today=date(2025, 5, 21), layout="tight"))
+
+    def test_image_round_trip(self):
+        cache = self._cache()
+        self.assertIsNone(cache.get("chart"))
+        cache.put("chart", b"\x89PNG image")
+        self.assertEqual(self._cache().get("chart"), b"\x89PNG image")
+
+    def test_posted_per_channel(self):
+        cache = self._cache(ttl_seconds=60)
+        self.assertFalse(cache.is_posted("C1", "chart"))
+        cache.mark_posted("C1", "chart")
+        self.assertTrue(self._cache(ttl_seconds=60).is_posted("C1", "chart"))
+        self.assertFalse(cache.is_posted("C2", "chart"))
+
+        self.clock.now += 61
+        self.assertFalse(cache.is_posted("C1", "chart"))
+
+        disabled = self._cache(skip_posted=False)
+        disabled.mark_posted("C3", "chart")
+        self.assertFalse(disabled.is_posted("C3", "chart"))
+        self.assertEqual(self.store.list("s3://chart-cache/posted/C3"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
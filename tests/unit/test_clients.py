@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from budget_falcon.clients import ClientRegistry
+
+
+class TestClientRegistry(unittest.TestCase):
+    """
+    ウォームスタート時にクライアントを再利用するためのレジストリ（ClientRegistry）をテストします。
+    テスト内容:
+    - test_get_reuses_client:
+        - 初回のみファクトリでクライアントが生成され、以降は同じインスタンスが返ることを検証します。
+    - test_unhealthy_client_recreated:
+        - ヘルスチェックがFalseを返す、または例外を送出した場合に、クライアントが閉じられて作り直されることを検証します。
+    - test_max_age_recreates_client:
+        - 最大保持時間を超えたクライアントが作り直されることを検証します。
+    """
+    def test_get_reuses_client(self):
+        factory = MagicMock(side_effect=lambda: object())
+        registry = ClientRegistry()
+
+        first = registry.get("athena", factory)
+        second = registry.get("athena", factory, lambda client: True)
+
+        self.assertIs(first, second)
+        factory.assert_called_once()
+
+    def test_unhealthy_client_recreated(self):
+        clients = [MagicMock(name="client1"), MagicMock(name="client2"), MagicMock(name="client3")]
+        factory = MagicMock(side_effect=clients)
+        registry = ClientRegistry()
+
+        self.assertIs(registry.get("slack", factory), clients[0])
+        self.assertIs(registry.get("slack", factory, lambda client: False), clients[1])
+        clients[0].close.assert_called_once()
+
+        def failing_check(client):
+            raise RuntimeError("token expired")
+
+        with patch("builtins.print"):
+            self.assertIs(registry.get("slack", factory, failing_check), clients[2])
+        clients[1].close.assert_called_once()
+
+    @patch("budget_falcon.clients.time.monotonic")
+    def test_max_age_recreates_client(self, mock_monotonic):
+        factory = MagicMock(side_effect=lambda: object())
+        registry = ClientRegistry(max_age_seconds=60)
+
+        mock_monotonic.return_value = 1000.0
+        first = registry.get("sheets", factory)
+        mock_monotonic.return_value = 1059.0
+        self.assertIs(registry.get("sheets", factory), first)
+        mock_monotonic.return_value = 1061.0
+        with patch("builtins.print"):
+            self.assertIsNot(registry.get("sheets", factory), first)
+        self.assertEqual(factory.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
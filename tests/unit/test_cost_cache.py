@@ -0,0 +1,80 @@
+import tempfile
+import unittest
+from datetime import date, timedelta
+from budget_falcon.cost_cache import CostCache
+from budget_falcon.object_store import LocalObjectStore
+
+SCOPE = ["test-db", "test-table", "DiscountedUsage", "Usage"]
+
+
+def _records(today, days_range, account_ids):
+    # days_range日分のクエリ結果（初日は途中からの集計になるため半額にする）
+    records = []
+    for offset in range(days_range, -1, -1):
+        d = today - timedelta(days=offset)
+        for aid in account_ids:
+            cost = float(d.day + int(aid[-1]))
+            if offset == days_range:
+                cost /= 2
+            records.append((d.isoformat(), aid, "AmazonEC2", cost))
+    return records
+
+
+class TestCostCache(unittest.TestCase):
+    """
+    確定済みの日次コストのキャッシュ（CostCache）をテストします。
+    テスト内容:
+    - test_cold_run_queries_full_window:
+        - キャッシュがない場合、全期間（途中からの集計になる初日を除くため1日多く）を集計し、確定済みの日付をキャッシュすることを検証します。
+    - test_warm_run_queries_recent_days:
+        - 翌日の実行では直近の確定していない日数分だけを集計し、キャッシュと合わせて全期間を集計した場合と同じ結果になることを検証します。
+        - キャッシュにないアカウントは全期間を集計することを確認します。
+    - test_scope_change_ignores_cache:
+        - クエリの条件（明細タイプなど）が変わった場合、既存のキャッシュを使わないことを検証します。
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocalObjectStore(self.tmp.name)
+        self.cache = CostCache(self.store, "s3://bucket/cost-cache/", settle_days=3)
+        self.today = date(2025, 5, 20)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _run(self, account_ids, today, scope=SCOPE):
+        plan = self.cache.plan(account_ids, 14, scope, today=today)
+        results = {days: _records(today, days, ids) for days, ids in plan["queries"].items()}
+        return plan, self.cache.merge(plan, results)
+
+    def test_cold_run_queries_full_window(self):
+        plan, records = self._run(["111111111111"], self.today)
+
+        self.assertEqual(plan["queries"], {15: ["111111111111"]})
+        # 2025-05-06（14日前）から当日まで、いずれも1日分の集計
+        self.assertEqual(records[0], ("2025-05-06", "111111111111", "AmazonEC2", 7.0))
+        self.assertEqual(records[-1], ("2025-05-20", "111111111111", "AmazonEC2", 21.0))
+        self.assertEqual(len(records), 15)
+        self.assertEqual(len(self.store.list("s3://bucket/cost-cache/")), 1)
+
+    def test_warm_run_queries_recent_days(self):
+        self._run(["111111111111"], self.today)
+        next_day = self.today + timedelta(days=1)
+
+        plan, records = self._run(["111111111111", "222222222222"], next_day)
+
+        # キャッシュ済みのアカウントは確定していない3日分と当日（＋初日）だけを集計する
+        self.assertEqual(plan["queries"], {5: ["111111111111"], 15: ["222222222222"]})
+        expected = [rec for rec in _records(next_day, 15, ["111111111111", "222222222222"]) if rec[0] > "2025-05-06"]
+        self.assertEqual(records, expected)
+
+    def test_scope_change_ignores_cache(self):
+        self._run(["111111111111"], self.today)
+
+        plan, _ = self._run(["111111111111"], self.today, scope=["test-db", "test-table", "Usage"])
+
+        self.assertEqual(plan["queries"], {15: ["111111111111"]})
+        self.assertEqual(len(self.store.list("s3://bucket/cost-cache/")), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
+import tempfile
 import unittest
+from datetime import date
 from unittest.mock import MagicMock, patch
-from budget_falcon.cur_dao import CurDAO
+from budget_falcon.clients import ClientRegistry
+from budget_falcon.cur_dao import CurDAO, BackoffPolicy, billing_periods
+from budget_falcon.object_store import LocalObjectStore
+from budget_falcon.result_cache import ResultCache
 
 
 class TestCurDAO(unittest.TestCase):
@@ -13,6 +18,43 @@ class TestCurDAO(unittest.TestCase):
         - クエリ文字列にアカウントIDや日付範囲などのパラメータが正しく含まれているかも検証します。
     - test_fetch_with_empty_results:
         - Athenaクエリの結果がヘッダーのみ（データ行なし）の場合、fetch()が空リストを返すことを検証します。
+    - test_fetch_groups_single_query:
+        - 複数グループ分のアカウントIDを1回のクエリで取得し、グループごとに結果が分割されることを検証します。
+        - 複数のグループに属するアカウントの結果は、それぞれのグループに含まれることを確認します。
+    - test_fetch_async_batched_polling:
+        - 複数のクエリを同時に開始し、状態確認がbatch_get_query_executionでまとめて行われることを検証します。
+        - 各Futureがそれぞれのクエリの結果を返すことを確認します。
+    - test_fetch_async_failed_query:
+        - 失敗したクエリのFutureが例外を返すことを検証します。
+    - test_close_releases_threads:
+        - ClientRegistryでDAOを作り直す際にclose()が呼ばれ、状態確認のスレッドと結果の読み込み用のスレッドが終了することを検証します。
+        - 実行中のクエリのFutureは例外になり、閉じた後はクエリを開始できないことを確認します。
+    - test_execute_backoff_schedule:
+        - 状態確認の待ち時間が初回の値から倍々に増え、上限で止まることを検証します。
+        - 待ち時間の判断がすべてon_waitに通知されることを確認します。
+    - test_execute_timeout_stops_query:
+        - タイムアウトを超えたクエリがstop_query_executionで停止され、TimeoutErrorになることを検証します。
+    - test_fetch_async_timeout_stops_query:
+        - 非同期実行でもタイムアウトしたクエリが停止され、FutureがTimeoutErrorを返すことを検証します。
+    - test_fetch_streams_result_csv:
+        - 結果の読み込み先を指定した場合、GetQueryResultsを使わずにクエリの出力CSVを読み込んで変換することを検証します。
+    - test_fetch_async_streams_result_csv:
+        - 非同期実行では、状態確認のレスポンスに含まれる出力先からCSVを読み込むことを検証します。
+    - test_fetch_with_cost_cache:
+        - コストのキャッシュを指定した場合、キャッシュが決めた日数とアカウントごとにクエリを実行し、結果をキャッシュと合わせて返すことを検証します。
+        - 日数ごとのクエリは順に待たずにまとめて開始され、状態確認も一緒に行われることを確認します。
+    - test_billing_periods:
+        - クエリの期間（UTCで1日前から）にかかる請求期間（yyyy-MM）が列挙されることを検証します。
+    - test_query_prunes_billing_periods:
+        - パーティション分割されたテーブルでは、クエリに請求期間の絞り込み条件がリテラルで含まれることを検証します。
+    - test_query_reads_rollup_table:
+        - ロールアップテーブルを指定した場合、明細ではなくロールアップを日付のリテラルで絞り込んで読むことを検証します。
+    - test_fetch_groups_top_n_services:
+        - 上位N件のクエリでは、日付が空の行がサービスごとの日次の最大値（service_max）として分離され、グループごとの結果に引き継がれることを検証します。
+    - test_fetch_records_query_statistics:
+        - 取得結果とpop_query_log()に、状態確認時のStatistics（スキャン量・実行時間・結果の再利用）と、状態確認・読み込みの経過時間、結果のページ数・行数が記録されることを検証します。
+    - test_fetch_with_result_cache:
+        - クエリ結果のキャッシュを指定した場合、同じアカウントの2回目の取得（同期・非同期とも）ではAthenaを呼ばずにキャッシュから返すことを検証します。
     """
     def setUp(self):
         self.mock_params = {
@@ -138,6 +180,470 @@ class TestCurDAO(unittest.TestCase):
         # 結果の検証
         self.assertEqual(len(results), 0)
 
+    @patch('boto3.client')
+    def test_fetch_groups_single_query(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {
+            "QueryExecutionId": "test-execution-id"
+        }
+        mock_athena.get_query_execution.return_value = {
+            "QueryExecution": {"Status": {"State": "SUCCEEDED"}}
+        }
+
+        def row(*values):
+            return {"Data": [{"VarCharValue": v} for v in values]}
+
+        mock_athena.get_query_results.return_value = {
+            "ResultSet": {"Rows": [
+                row("date", "account_id", "service", "cost"),
+                row("2025-05-15", "123456789012", "AmazonEC2", "1.5"),
+                row("2025-05-15", "234567890123", "AmazonS3", "2.5"),
+                row("2025-05-16", "123456789012", "AmazonEC2", "3.5"),
+                row("2025-05-16", "345678901234", "AWSLambda", "4.5"),
+            ]}
+        }
+
+        dao = CurDAO(self.mock_params)
+        results = dao.fetch_groups([
+            ["123456789012", "234567890123"],
+            ["345678901234", "123456789012"],
+            ["456789012345"],
+        ])
+
+        # クエリは1回だけ実行され、全アカウントが含まれる
+        mock_athena.start_query_execution.assert_called_once()
+        query_string = mock_athena.start_query_execution.call_args[1]["QueryString"]
+        for aid in ["123456789012", "234567890123", "345678901234", "456789012345"]:
+            self.assertIn(f"'{aid}'", query_string)
+
+        # グループごとに分割される
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0], [
+            ("2025-05-15", "123456789012", "AmazonEC2", 1.5),
+            ("2025-05-15", "234567890123", "AmazonS3", 2.5),
+            ("2025-05-16", "123456789012", "AmazonEC2", 3.5),
+        ])
+        self.assertEqual(results[1], [
+            ("2025-05-15", "123456789012", "AmazonEC2", 1.5),
+            ("2025-05-16", "123456789012", "AmazonEC2", 3.5),
+            ("2025-05-16", "345678901234", "AWSLambda", 4.5),
+        ])
+        self.assertEqual(results[2], [])
+
+    @patch('boto3.client')
+    def test_fetch_async_batched_polling(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.side_effect = [
+            {"QueryExecutionId": "query-1"},
+            {"QueryExecutionId": "query-2"},
+        ]
+        # 1回目は実行中、2回目で両方成功
+        mock_athena.batch_get_query_execution.side_effect = [
+            {"QueryExecutions": [
+                {"QueryExecutionId": "query-1", "Status": {"State": "RUNNING"}},
+                {"QueryExecutionId": "query-2", "Status": {"State": "QUEUED"}},
+            ]},
+            {"QueryExecutions": [
+                {"QueryExecutionId": "query-1", "Status": {"State": "SUCCEEDED"}},
+                {"QueryExecutionId": "query-2", "Status": {"State": "SUCCEEDED"}},
+            ]},
+        ]
+
+        def get_query_results(QueryExecutionId, **kwargs):
+            account_id = "123456789012" if QueryExecutionId == "query-1" else "234567890123"
+            return {"ResultSet": {"Rows": [
+                {"Data": [{"VarCharValue": v} for v in ["date", "account_id", "service", "cost"]]},
+                {"Data": [{"VarCharValue": v} for v in ["2025-05-15", account_id, "AmazonEC2", "1.0"]]},
+            ]}}
+        mock_athena.get_query_results.side_effect = get_query_results
+
+        dao = CurDAO(self.mock_params)
+        future1 = dao.fetch_async(["123456789012"])
+        future2 = dao.fetch_async(["234567890123"])
+
+        self.assertEqual(future1.result(timeout=5), [("2025-05-15", "123456789012", "AmazonEC2", 1.0)])
+        self.assertEqual(future2.result(timeout=5), [("2025-05-15", "234567890123", "AmazonEC2", 1.0)])
+
+        # 状態確認は1回の呼び出しで2つのクエリをまとめて行う
+        mock_athena.get_query_execution.assert_not_called()
+        self.assertEqual(mock_athena.batch_get_query_execution.call_count, 2)
+        for call in mock_athena.batch_get_query_execution.call_args_list:
+            self.assertEqual(sorted(call[1]["QueryExecutionIds"]), ["query-1", "query-2"])
+
+    @patch('boto3.client')
+    def test_fetch_async_failed_query(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        mock_athena.batch_get_query_execution.return_value = {"QueryExecutions": [
+            {"QueryExecutionId": "query-1", "Status": {"State": "FAILED", "StateChangeReason": "syntax error"}},
+        ]}
+
+        dao = CurDAO(self.mock_params)
+        future = dao.fetch_async(["123456789012"])
+
+        with self.assertRaises(Exception) as cm:
+            future.result(timeout=5)
+        self.assertIn("syntax error", str(cm.exception))
+        mock_athena.get_query_results.assert_not_called()
+
+    @patch('boto3.client')
+    def test_close_releases_threads(self, mock_boto3):
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        # 閉じるまで実行中のまま
+        mock_athena.batch_get_query_execution.return_value = {"QueryExecutions": [
+            {"QueryExecutionId": "query-1", "Status": {"State": "RUNNING"}},
+        ]}
+
+        registry = ClientRegistry()
+        dao = registry.get("cur_dao", lambda: CurDAO({**self.mock_params, "ATHENA_POLL_MAX_DELAY": 0.01}))
+        future = dao.fetch_async(["123456789012"])
+        poller = dao.engine.poller
+        reader = dao.reader
+        self.assertTrue(poller.is_alive())
+
+        registry.invalidate("cur_dao")
+
+        self.assertFalse(poller.is_alive())
+        self.assertIsNone(dao.reader)
+        with self.assertRaises(RuntimeError):
+            reader.submit(lambda: None)
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=5)
+        with self.assertRaises(RuntimeError):
+            dao.fetch_async(["123456789012"])
+
+    def _fake_clock(self):
+        # time.sleep で進む仮想時計
+        clock = MagicMock()
+        now = [0.0]
+        clock.monotonic.side_effect = lambda: now[0]
+
+        def sleep(seconds):
+            now[0] += seconds
+        clock.sleep.side_effect = sleep
+        return clock
+
+    @patch('boto3.client')
+    def test_execute_backoff_schedule(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        running = {"QueryExecution": {"Status": {"State": "RUNNING"}}}
+        mock_athena.get_query_execution.side_effect = [running] * 6 + [
+            {"QueryExecution": {"Status": {"State": "SUCCEEDED"}}}
+        ]
+
+        waits = []
+        dao = CurDAO({**self.mock_params, "ATHENA_POLL_INITIAL_DELAY": 0.05, "ATHENA_POLL_MAX_DELAY": 0.5})
+        dao.engine.on_wait = waits.append
+        clock = self._fake_clock()
+        with patch('budget_falcon.cur_dao.time', clock):
+            self.assertEqual(dao.execute("SELECT 1"), "query-1")
+
+        # 初回の確認は待たずに行い、以降は 0.05 から倍々に増えて 0.5 で止まる
+        delays = [call[0][0] for call in clock.sleep.call_args_list]
+        self.assertEqual([round(d, 3) for d in delays], [0.05, 0.1, 0.2, 0.4, 0.5, 0.5])
+        self.assertEqual([w["attempt"] for w in waits], [0, 1, 2, 3, 4, 5])
+        self.assertEqual([w["delay"] for w in waits], delays)
+        self.assertTrue(all(w["state"] == "RUNNING" and not w["timed_out"] for w in waits))
+        mock_athena.stop_query_execution.assert_not_called()
+
+    @patch('boto3.client')
+    def test_execute_timeout_stops_query(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        mock_athena.get_query_execution.return_value = {"QueryExecution": {"Status": {"State": "RUNNING"}}}
+
+        waits = []
+        dao = CurDAO({**self.mock_params, "ATHENA_QUERY_TIMEOUT": 1.0})
+        dao.engine.on_wait = waits.append
+        clock = self._fake_clock()
+        with patch('budget_falcon.cur_dao.time', clock):
+            with self.assertRaises(TimeoutError):
+                dao.execute("SELECT 1")
+
+        mock_athena.stop_query_execution.assert_called_once_with(QueryExecutionId="query-1")
+        # 最後の待ちはタイムアウトまでの残り時間に切り詰められる
+        self.assertAlmostEqual(sum(call[0][0] for call in clock.sleep.call_args_list), 1.0)
+        self.assertTrue(waits[-1]["timed_out"])
+        self.assertFalse(any(w["timed_out"] for w in waits[:-1]))
+
+    @patch('boto3.client')
+    def test_fetch_async_timeout_stops_query(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        mock_athena.batch_get_query_execution.return_value = {"QueryExecutions": [
+            {"QueryExecutionId": "query-1", "Status": {"State": "RUNNING"}},
+        ]}
+
+        dao = CurDAO(self.mock_params)
+        dao.engine.policy = BackoffPolicy(initial_delay=0.01, max_delay=0.02, timeout=0.1)
+        future = dao.fetch_async(["123456789012"])
+
+        with self.assertRaises(TimeoutError):
+            future.result(timeout=5)
+        mock_athena.stop_query_execution.assert_called_once_with(QueryExecutionId="query-1")
+        mock_athena.get_query_results.assert_not_called()
+
+    def _csv(self, rows):
+        # Athenaの出力CSVと同じく、ヘッダー付きで全項目をダブルクォートで囲む
+        lines = ['"date","account_id","service","cost"']
+        lines += [",".join(f'"{v}"' for v in row) for row in rows]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    @patch('boto3.client')
+    def test_fetch_streams_result_csv(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        # 結果の再利用時は、元のクエリの出力先が返る
+        mock_athena.get_query_execution.return_value = {"QueryExecution": {
+            "QueryExecutionId": "query-1",
+            "Status": {"State": "SUCCEEDED"},
+            "ResultConfiguration": {"OutputLocation": "s3://test-bucket/output/query-0.csv"},
+        }}
+
+        with tempfile.TemporaryDirectory() as base_dir:
+            store = LocalObjectStore(base_dir)
+            # サービス名にカンマやダブルクォートを含む場合もCSVとして解釈する
+            store.put("s3://test-bucket/output/query-0.csv", (
+                '"date","account_id","service","cost"\n'
+                '"2025-05-15","123456789012","AmazonEC2","1.5"\n'
+                '"2025-05-16","123456789012","Amazon Simple Storage Service, ""S3""","0.25"\n'
+            ).encode("utf-8"))
+            dao = CurDAO(self.mock_params, result_store=store)
+            results = dao.fetch(["123456789012"])
+
+        self.assertEqual(results, [
+            ("2025-05-15", "123456789012", "AmazonEC2", 1.5),
+            ("2025-05-16", "123456789012", 'Amazon Simple Storage Service, "S3"', 0.25),
+        ])
+        mock_athena.get_query_results.assert_not_called()
+
+    @patch('boto3.client')
+    def test_fetch_async_streams_result_csv(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        mock_athena.batch_get_query_execution.return_value = {"QueryExecutions": [{
+            "QueryExecutionId": "query-1",
+            "Status": {"State": "SUCCEEDED"},
+            "ResultConfiguration": {"OutputLocation": "s3://test-bucket/output/query-1.csv"},
+        }]}
+
+        with tempfile.TemporaryDirectory() as base_dir:
+            store = LocalObjectStore(base_dir)
+            store.put("s3://test-bucket/output/query-1.csv", self._csv([
+                ("2025-05-15", "123456789012", "AmazonEC2", "2.0"),
+            ]))
+            dao = CurDAO(self.mock_params, result_store=store)
+            results = dao.fetch_async(["123456789012"]).result(timeout=5)
+
+        self.assertEqual(results, [("2025-05-15", "123456789012", "AmazonEC2", 2.0)])
+        mock_athena.get_query_execution.assert_not_called()
+        mock_athena.get_query_results.assert_not_called()
+
+    @patch('boto3.client')
+    def test_fetch_with_cost_cache(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.side_effect = [
+            {"QueryExecutionId": "query-1"},
+            {"QueryExecutionId": "query-2"},
+        ]
+        mock_athena.batch_get_query_execution.side_effect = lambda QueryExecutionIds: {"QueryExecutions": [
+            {"QueryExecutionId": qid, "Status": {"State": "SUCCEEDED"}} for qid in QueryExecutionIds
+        ]}
+        mock_athena.get_query_results.side_effect = lambda QueryExecutionId, **kwargs: {"ResultSet": {"Rows": [
+            {"Data": [{"VarCharValue": v} for v in ["date", "account_id", "service", "cost"]]},
+            {"Data": [{"VarCharValue": v} for v in ["2025-05-16", QueryExecutionId, "AmazonEC2", "1.0"]]},
+        ]}}
+
+        cost_cache = MagicMock()
+        plan = {"queries": {4: ["123456789012"], 16: ["234567890123"]}}
+        cost_cache.plan.return_value = plan
+        cost_cache.merge.return_value = [("2025-05-16", "123456789012", "AmazonEC2", 1.0)]
+
+        dao = CurDAO(self.mock_params, cost_cache=cost_cache)
+        results = dao.fetch(["123456789012", "234567890123"])
+
+        self.assertEqual(results, cost_cache.merge.return_value)
+        cost_cache.plan.assert_called_once_with(
+            ["123456789012", "234567890123"], 15, ["test-db", "test-table", "DiscountedUsage", "Usage"]
+        )
+        queries = [call[1]["QueryString"] for call in mock_athena.start_query_execution.call_args_list]
+        self.assertIn("'123456789012'", queries[0])
+        self.assertIn("date_add('day', -4,", queries[0])
+        self.assertIn("'234567890123'", queries[1])
+        self.assertIn("date_add('day', -16,", queries[1])
+        # 2つのクエリは同時に実行され、状態確認はまとめて行われる
+        mock_athena.get_query_execution.assert_not_called()
+        self.assertEqual(mock_athena.batch_get_query_execution.call_count, 1)
+        cost_cache.merge.assert_called_once_with(plan, {
+            4: [("2025-05-16", "query-1", "AmazonEC2", 1.0)],
+            16: [("2025-05-16", "query-2", "AmazonEC2", 1.0)],
+        })
+
+    def test_billing_periods(self):
+        self.assertEqual(billing_periods(14, today=date(2025, 5, 20)), ["2025-05"])
+        # 5/5の14日前（＋1日）は4/20
+        self.assertEqual(billing_periods(14, today=date(2025, 5, 5)), ["2025-04", "2025-05"])
+        # 期間の初日が月初の場合も、UTCでは前月にかかるため前月を含める
+        self.assertEqual(billing_periods(14, today=date(2025, 5, 15)), ["2025-04", "2025-05"])
+        self.assertEqual(billing_periods(30, today=date(2025, 1, 10)), ["2024-12", "2025-01"])
+
+    @patch('boto3.client')
+    def test_query_prunes_billing_periods(self, mock_boto3):
+        dao = CurDAO({**self.mock_params, "ATHENA_BILLING_PERIOD_PARTITION": True})
+        with patch('budget_falcon.cur_dao.billing_periods', return_value=["2025-04", "2025-05"]) as mock_periods:
+            query = dao._build_query(["123456789012"])
+
+        mock_periods.assert_called_once_with(15)
+        self.assertIn("billing_period IN ('2025-04','2025-05')", query)
+        self.assertNotIn("billing_period", CurDAO(self.mock_params)._build_query(["123456789012"]))
+
+    @patch('boto3.client')
+    def test_query_reads_rollup_table(self, mock_boto3):
+        dao = CurDAO({**self.mock_params, "ATHENA_ROLLUP_TABLE": "test-rollup"})
+        query = dao._build_query(["123456789012"])
+
+        self.assertIn('FROM "test-rollup"', query)
+        self.assertNotIn("test-table", query)
+        self.assertRegex(query, r"\"date\" >= '\d{4}-\d{2}-\d{2}'")
+        self.assertIn("line_item_type IN ('Usage','DiscountedUsage')", query)
+
+    @patch('boto3.client')
+    def test_fetch_groups_top_n_services(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        mock_athena.get_query_execution.return_value = {"QueryExecution": {"Status": {"State": "SUCCEEDED"}}}
+        rows = [
+            ["date", "account_id", "service", "cost"],
+            # 日付が空の行はサービスごとの日次の最大値
+            ["", "123456789012", "AmazonEC2", "3.0"],
+            ["", "123456789012", "AmazonS3", "0.5"],
+            ["", "123456789012", "AmazonSNS", "0.25"],
+            ["", "234567890123", "AWSLambda", "1.0"],
+            ["2025-05-15", "123456789012", "AmazonEC2", "3.0"],
+            ["2025-05-15", "123456789012", "Others", "0.75"],
+            ["2025-05-15", "234567890123", "AWSLambda", "1.0"],
+        ]
+        mock_athena.get_query_results.return_value = {"ResultSet": {"Rows": [
+            {"Data": [{"VarCharValue": v} for v in row]} for row in rows
+        ]}}
+
+        dao = CurDAO({**self.mock_params, "ATHENA_TOP_N_SERVICES": 1, "ATHENA_OTHERS_LABEL": "Others"})
+        results = dao.fetch_groups([["123456789012"], ["234567890123"]])
+
+        query = mock_athena.start_query_execution.call_args[1]["QueryString"]
+        self.assertIn("row_number() OVER (PARTITION BY account_id ORDER BY GREATEST(MAX(cost), 0) DESC, service)", query)
+        self.assertIn("CASE WHEN ranked.service_rank <= 1 THEN daily.service ELSE 'Others' END", query)
+        self.assertEqual(results[0], [
+            ("2025-05-15", "123456789012", "AmazonEC2", 3.0),
+            ("2025-05-15", "123456789012", "Others", 0.75),
+        ])
+        self.assertEqual(results[1], [("2025-05-15", "234567890123", "AWSLambda", 1.0)])
+        self.assertEqual(results[0].service_max["123456789012"], {"AmazonEC2": 3.0, "AmazonS3": 0.5, "AmazonSNS": 0.25})
+        self.assertIs(results[1].service_max, results[0].service_max)
+
+    @patch('boto3.client')
+    def test_fetch_with_result_cache(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        mock_athena.get_query_execution.return_value = {"QueryExecution": {"Status": {"State": "SUCCEEDED"}}}
+        mock_athena.get_query_results.return_value = {"ResultSet": {"Rows": [
+            {"Data": [{"VarCharValue": v} for v in ["date", "account_id", "service", "cost"]]},
+            {"Data": [{"VarCharValue": v} for v in ["2025-05-15", "123456789012", "AmazonEC2", "1.5"]]},
+        ]}}
+
+        with tempfile.TemporaryDirectory() as base_dir:
+            result_cache = ResultCache(LocalObjectStore(base_dir), "s3://result-cache/")
+            dao = CurDAO(self.mock_params, result_cache=result_cache)
+            first = dao.fetch(["123456789012"])
+            # リトライ・再実行（別のDAO）でもキャッシュから返す
+            retry = CurDAO(self.mock_params, result_cache=result_cache)
+            second = retry.fetch([" 123456789012"])
+            third = retry.fetch_async(["123456789012"]).result(timeout=5)
+
+        self.assertEqual(first, [("2025-05-15", "123456789012", "AmazonEC2", 1.5)])
+        self.assertEqual(second, first)
+        self.assertEqual(third, first)
+        mock_athena.start_query_execution.assert_called_once()
+
+    @patch('boto3.client')
+    def test_fetch_records_query_statistics(self, mock_boto3):
+        # モックの設定
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "query-1"}
+        mock_athena.get_query_execution.side_effect = [{"QueryExecution": {"Status": {"State": "RUNNING"}}}, {"QueryExecution": {
+            "Status": {"State": "SUCCEEDED"},
+            "Statistics": {
+                "DataScannedInBytes": 123456,
+                "EngineExecutionTimeInMillis": 1500,
+                "QueryQueueTimeInMillis": 200,
+                "QueryPlanningTimeInMillis": 80,
+                "ResultReuseInformation": {"ReusedPreviousResult": True},
+            },
+        }}]
+        header = {"Data": [{"VarCharValue": v} for v in ["date", "account_id", "service", "cost"]]}
+        row = {"Data": [{"VarCharValue": v} for v in ["2025-05-15", "123456789012", "AmazonEC2", "1.5"]]}
+        mock_athena.get_query_results.side_effect = [
+            {"ResultSet": {"Rows": [header, row]}, "NextToken": "page-2"},
+            {"ResultSet": {"Rows": [row]}},
+        ]
+
+        dao = CurDAO({**self.mock_params, "ATHENA_POLL_INITIAL_DELAY": 0.05})
+        with patch('budget_falcon.cur_dao.time', self._fake_clock()):
+            results = dao.fetch(["123456789012"])
+
+        stats = results.queries[0]
+        self.assertEqual(stats["query_execution_id"], "query-1")
+        self.assertEqual(stats["data_scanned_bytes"], 123456)
+        self.assertEqual(stats["engine_execution_ms"], 1500)
+        self.assertEqual(stats["queue_ms"], 200)
+        self.assertEqual(stats["planning_ms"], 80)
+        self.assertTrue(stats["result_reused"])
+        self.assertEqual(stats["result_pages"], 2)
+        self.assertEqual(stats["result_rows"], 2)
+        # 1回目の確認で実行中のため、0.05秒待って完了を確認する
+        self.assertAlmostEqual(stats["poll_seconds"], 0.05)
+        self.assertEqual(stats["read_seconds"], 0.0)
+        self.assertEqual(dao.pop_query_log(), [stats])
+        self.assertEqual(dao.pop_query_log(), [])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,69 @@
+import pickle
+import unittest
+from budget_falcon.cur_records import CurRecords
+
+
+class TestCurRecords(unittest.TestCase):
+    """
+    列ごとに保持するCURの集計結果のコンテナ（CurRecords）をテストします。
+    テスト内容:
+    - test_tuple_compatibility:
+        - 長さ・インデックス・スライス・イテレーション・タプルのリストとの比較が、タプルのリストと同じく動作することを検証します。
+    - test_dictionary_encoding:
+        - 文字列の列は重複のない値の一覧とインデックスで保持され、コストはfloat64のNumPy配列として参照できることを検証します。
+    - test_split_and_select_accounts:
+        - アカウントごとの分割と、指定アカウントの抽出が行の順序を保つことを検証します。
+    - test_pickle:
+        - ワーカープロセスへ渡せるよう、pickleで復元できることを検証します。
+    """
+    def setUp(self):
+        self.rows = [
+            ("2025-05-15", "123456789012", "AmazonEC2", 1.5),
+            ("2025-05-15", "234567890123", "AmazonS3", 0.25),
+            ("2025-05-16", "123456789012", "AmazonEC2", 2.0),
+            ("2025-05-16", "123456789012", "AmazonS3", 0.5),
+        ]
+        self.records = CurRecords(self.rows)
+
+    def test_tuple_compatibility(self):
+        self.assertEqual(len(self.records), 4)
+        self.assertEqual(self.records[1], self.rows[1])
+        self.assertEqual(self.records[-1], self.rows[-1])
+        self.assertEqual(self.records[1:3], self.rows[1:3])
+        self.assertEqual(list(self.records), self.rows)
+        self.assertEqual(self.records, self.rows)
+        self.assertNotEqual(self.records, self.rows[:3])
+        self.assertEqual(CurRecords(), [])
+        with self.assertRaises(IndexError):
+            self.records[4]
+
+    def test_dictionary_encoding(self):
+        dates, date_codes = self.records.column("date")
+        services, service_codes = self.records.column("service")
+
+        self.assertEqual(dates, ["2025-05-15", "2025-05-16"])
+        self.assertEqual(list(date_codes), [0, 0, 1, 1])
+        self.assertEqual(services, ["AmazonEC2", "AmazonS3"])
+        self.assertEqual(list(service_codes), [0, 1, 0, 1])
+        costs = self.records.cost_array()
+        self.assertEqual(costs.dtype.name, "float64")
+        self.assertEqual(costs.tolist(), [1.5, 0.25, 2.0, 0.5])
+
+    def test_split_and_select_accounts(self):
+        split = self.records.split_by_account(["123456789012", "999999999999"])
+
+        self.assertEqual(list(split), ["123456789012", "999999999999"])
+        self.assertEqual(split["123456789012"], [self.rows[0], self.rows[2], self.rows[3]])
+        self.assertEqual(split["999999999999"], [])
+        self.assertEqual(self.records.select_accounts(["234567890123", "123456789012"]), self.rows)
+        self.assertEqual(self.records.select_accounts(["234567890123"]), [self.rows[1]])
+        shuffled = CurRecords([self.rows[3], self.rows[1], self.rows[0]])
+        self.assertEqual(shuffled.sorted_by_date_account(), [self.rows[0], self.rows[1], self.rows[3]])
+
+    def test_pickle(self):
+        restored = pickle.loads(pickle.dumps(self.records))
+        self.assertEqual(restored, self.rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
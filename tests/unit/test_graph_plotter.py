@@ -1,7 +1,14 @@
 import os
+import json
+import hashlib
 import pytest
+import yaml
 from datetime import datetime, timedelta
-from budget_falcon.graph_plotter import plot_graph
+from budget_falcon.graph_plotter import (
+    plot_graph, plot_graph_pages, paginate_accounts, aggregate_records, service_config_path, service_config_cache_path,
+    _aggregate, _fixed_layout, OTHERS, SERVICE_LABEL_MAP,
+)
+from budget_falcon.cur_records import CurRecords
 
 def test_plot_graph_normal_accounts():
     """
@@ -108,5 +115,360 @@ def test_plot_graph_low_usage_account():
     assert os.path.exists(result_path)
     print(f"\nLow usage account graph has been generated at: {result_path}")
 
+def test_plot_graph_columnar_records():
+    """
+    テスト内容:
+    CurDAOが返す列ごとのコンテナ（CurRecords）からもグラフ画像を生成できるかテストします。
+    - 対象外のアカウントの行が含まれていても、画像ファイルが生成されていることを検証する。
+    """
+    accounts = [("123456789012", "Test Account 1")]
+    base_date = datetime.now()
+    rows = []
+    for i in range(14):
+        date = (base_date - timedelta(days=13-i)).strftime("%Y-%m-%d")
+        rows.extend([
+            (date, "123456789012", "AmazonEC2", 30.0 + i),
+            (date, "123456789012", "AmazonS3", 10.0),
+            (date, "987654321098", "AmazonRDS", 75.0),
+        ])
+
+    output_dir = os.path.join(os.path.dirname(__file__), "output")
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(output_dir, "test_cost_graph_columnar.png")
+
+    result_path = plot_graph(
+        records=CurRecords(rows),
+        accounts=accounts,
+        output_path=output_path,
+        top_n_services=5
+    )
+
+    assert os.path.exists(result_path)
+
+def _fetch_from_local_athena(rows, account_ids, top_n_services=0):
+    # 日次のレコードを明細としてLocalAthenaに登録し、CurDAOの実際のクエリで取得する
+    from budget_falcon.athena_local import LocalAthena, CUR_COLUMNS
+    from budget_falcon.cur_dao import CurDAO
+    from budget_falcon.graph_plotter import OTHERS
+
+    athena = LocalAthena(now=datetime.fromisoformat("2025-05-20T03:00:00+00:00"))
+    athena.conn.execute(f'CREATE TABLE "cur" ({CUR_COLUMNS})')
+    # JSTの12:00（UTCの03:00）に開始した明細とする
+    athena.conn.executemany(
+        'INSERT INTO "cur" VALUES (?, ?, ?, ?, ?, ?)',
+        [(f"{date} 03:00:00", aid, service, "Usage", cost, date[:7]) for date, aid, service, cost in rows],
+    )
+    params = {
+        "AWS_REGION": "ap-northeast-1",
+        "ATHENA_DATABASE": "test-db",
+        "ATHENA_TABLE": "cur",
+        "ATHENA_OUTPUT_URI": "s3://test-bucket/output/",
+        "ATHENA_LINE_ITEM_TYPES": ["Usage"],
+        "QUERY_DAYS_RANGE": 14,
+        "ATHENA_POLL_INITIAL_DELAY": 0.01,
+    }
+    if top_n_services:
+        params.update({"ATHENA_TOP_N_SERVICES": top_n_services, "ATHENA_OTHERS_LABEL": OTHERS})
+    return CurDAO(params, client=athena).fetch(account_ids)
+
+def test_plot_graph_folded_records_identical():
+    """
+    テスト内容:
+    CurDAOの上位N件のクエリ（ATHENA_TOP_N_SERVICES）でOthersにまとめたレコードから、全件のレコードと同じグラフ画像が生成されるかテストします。
+    - 色・模様の割り当て、Othersの積み上げ、凡例が一致し、画像の画素が同一であることを検証する。
+    - 日次の最大値が同じサービス（コストが0のサービスなど）が上位N件の境界にある場合も、同じサービスが選ばれることを確認する。
+    - 全件のレコードの順序によらず同じ結果になることを確認する。
+    - クレジットだけのサービス（日次の最大値が負）は最大値0として順位付けされ、全件と同じサービスが選ばれることを確認する。
+    """
+    import matplotlib.image as mpimg
+
+    accounts = [("123456789012", "Test Account 1"), ("987654321098", "テストアカウント 2")]
+    # 上位4件の境界に、最大値が同じサービスとコストが0のサービスを置く
+    costs = {
+        "123456789012": {"AmazonEC2": 50.0, "AmazonS3": 20.0, "AWSLambda": 20.0, "AmazonRDS": 0.0,
+                         "AmazonDynamoDB": 0.0, "AmazonCloudWatch": 0.0, "awskms": 0.0, "AmazonSNS": 0.0},
+        "987654321098": {"AmazonSQS": 8.0, "AmazonRoute53": 3.0, "AmazonEC2": 3.0, "AmazonS3": 3.0,
+                         "AWSLambda": 3.0, "AmazonRDS": 1.0},
+    }
+    rows = []
+    for i in range(14):
+        date = (datetime(2025, 5, 7) + timedelta(days=i)).strftime("%Y-%m-%d")
+        for aid, services in costs.items():
+            for service, cost in services.items():
+                # 最大値は最終日に揃え、それ以外の日は小さくする
+                rows.append((date, aid, service, cost if i == 13 else cost * i / 20))
+    account_ids = [aid for aid, _ in accounts]
+    full = _fetch_from_local_athena(rows, account_ids)
+    folded = _fetch_from_local_athena(rows, account_ids, top_n_services=4)
+
+    output_dir = os.path.join(os.path.dirname(__file__), "output")
+    os.makedirs(output_dir, exist_ok=True)
+    full_path = plot_graph(
+        CurRecords(reversed(list(full))), accounts,
+        os.path.join(output_dir, "test_cost_graph_full.png"), top_n_services=4,
+    )
+    folded_path = plot_graph(folded, accounts, os.path.join(output_dir, "test_cost_graph_folded.png"), top_n_services=4)
+
+    _, full_series = _aggregate(CurRecords(reversed(list(full))), account_ids, 4)
+    _, folded_series = _aggregate(folded, account_ids, 4)
+    for aid in account_ids:
+        assert full_series[aid]["services"] == folded_series[aid]["services"]
+    assert full_series["123456789012"]["services"] == ["AmazonEC2", "AWSLambda", "AmazonS3", "AmazonCloudWatch", OTHERS]
+    assert (mpimg.imread(full_path) == mpimg.imread(folded_path)).all()
+
+    # クレジットだけのサービスが上位N件の境界にある場合（最大値0の同順位はサービス名の順）
+    credits = {"AWSSupport": -5.0, "AmazonS3": 0.0, "AmazonEC2": 10.0, "AmazonSNS": 0.0}
+    rows = [
+        ((datetime(2025, 5, 7) + timedelta(days=i)).strftime("%Y-%m-%d"), "123456789012", service, cost)
+        for i in range(14) for service, cost in credits.items()
+    ]
+    full = _fetch_from_local_athena(rows, ["123456789012"])
+    folded = _fetch_from_local_athena(rows, ["123456789012"], top_n_services=2)
+    _, full_series = _aggregate(full, ["123456789012"], 2)
+    _, folded_series = _aggregate(folded, ["123456789012"], 2)
+    assert full_series["123456789012"]["services"] == ["AmazonEC2", "AWSSupport", OTHERS]
+    assert folded_series["123456789012"]["services"] == full_series["123456789012"]["services"]
+    assert [list(v) for v in folded_series["123456789012"]["values"]] == [list(v) for v in full_series["123456789012"]["values"]]
+
+def test_plot_graph_bar_renderers_identical():
+    """
+    テスト内容:
+    サービスごとに1つのコレクションで描く場合（collections）と、ax.barで描く場合（patches）で同じグラフ画像が生成されるかテストします。
+    - 模様付きの棒、負のコスト、記録のない日付を含むデータで、画像の画素が同一であることを検証する。
+    """
+    import matplotlib.image as mpimg
+
+    accounts = [("123456789012", "Test Account 1"), ("987654321098", "テストアカウント 2"), ("000000000000", "Empty")]
+    services = ["AmazonEC2", "AWSLambda", "AmazonECS", "AmazonEKS", "AmazonS3", "AmazonEFS", "AmazonRDS",
+                "AmazonDynamoDB", "AmazonCloudWatch", "awskms"]
+    base_date = datetime.now()
+    rows = []
+    for i in range(14):
+        date = (base_date - timedelta(days=13-i)).strftime("%Y-%m-%d")
+        for j, service in enumerate(services):
+            rows.append((date, "123456789012", service, 40.0 / (j + 1) + (i % 4)))
+            if i % 3 and j < 6:
+                rows.append((date, "987654321098", service, -1.0 if j == 5 else 3.0 * j + i * 0.5))
+
+    output_dir = os.path.join(os.path.dirname(__file__), "output")
+    os.makedirs(output_dir, exist_ok=True)
+    paths = [
+        plot_graph(rows, accounts, os.path.join(output_dir, f"test_cost_graph_{renderer}.png"),
+                   top_n_services=6, bar_renderer=renderer)
+        for renderer in ["patches", "collections"]
+    ]
+
+    assert (mpimg.imread(paths[0]) == mpimg.imread(paths[1])).all()
+
+def test_plot_graph_in_memory():
+    """
+    テスト内容:
+    出力パスを指定しない場合に、グラフ画像がファイルに書かれずPNGのバイト列として返るかテストします。
+    - ファイルに保存した場合と同じ画像になることを検証する。
+    """
+    import io
+    import matplotlib.image as mpimg
+
+    accounts = [("123456789012", "Test Account 1")]
+    base_date = datetime.now()
+    rows = [
+        ((base_date - timedelta(days=i)).strftime("%Y-%m-%d"), "123456789012", service, 10.0 + i)
+        for i in range(7) for service in ["AmazonEC2", "AmazonS3"]
+    ]
+
+    output_dir = os.path.join(os.path.dirname(__file__), "output")
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = plot_graph(rows, accounts, os.path.join(output_dir, "test_cost_graph_file.png"))
+    data = plot_graph(rows, accounts)
+
+    assert isinstance(data, bytes)
+    assert data.startswith(b"\x89PNG")
+    assert (mpimg.imread(io.BytesIO(data)) == mpimg.imread(output_path)).all()
+
+def test_plot_graph_encodings():
+    """
+    テスト内容:
+    出力形式の指定（encoding）に応じた画像が生成されるかテストします。
+    - パレット化したPNGが指定した色数以下のパレット画像になり、フルカラーより小さくなることを検証する。
+    - WebPで出力されることを検証する。
+    - 解像度と長辺の上限に応じて画像の大きさが変わることを検証する。
+    - 未知の形式を指定するとValueErrorになることを検証する。
+    """
+    import io
+    from PIL import Image
+
+    accounts = [("123456789012", "Test Account 1"), ("987654321098", "テストアカウント 2")]
+    services = ["AmazonEC2", "AWSLambda", "AmazonS3", "AmazonRDS", "AmazonDynamoDB"]
+    base_date = datetime.now()
+    rows = [
+        ((base_date - timedelta(days=i)).strftime("%Y-%m-%d"), aid, service, 10.0 * (k + 1) + i)
+        for i in range(14) for aid, _ in accounts for k, service in enumerate(services)
+    ]
+
+    full = plot_graph(rows, accounts, layout="fixed")
+    palette = plot_graph(rows, accounts, layout="fixed", encoding={"palette_colors": 64})
+    image = Image.open(io.BytesIO(palette))
+    assert image.format == "PNG" and image.mode == "P"
+    assert len(image.getcolors()) <= 64
+    assert image.size == Image.open(io.BytesIO(full)).size
+    assert len(palette) < len(full)
+
+    webp = plot_graph(rows, accounts, layout="fixed", encoding={"format": "webp", "lossless": True})
+    assert Image.open(io.BytesIO(webp)).format == "WEBP"
+
+    width, height = Image.open(io.BytesIO(full)).size
+    low = Image.open(io.BytesIO(plot_graph(rows, accounts, layout="fixed", encoding={"dpi": 50})))
+    assert low.size == (width // 2, height // 2)
+    limited = Image.open(io.BytesIO(plot_graph(rows, accounts, layout="fixed", encoding={"max_pixels": 500})))
+    assert max(limited.size) <= 500
+
+    with pytest.raises(ValueError):
+        plot_graph(rows, accounts, encoding={"format": "gif"})
+
+def test_plot_graph_fixed_layout():
+    """
+    テスト内容:
+    固定レイアウト（layout="fixed"）でグラフ画像が生成されるかテストします。
+    - 画像の大きさが、行・列数と凡例の項目から計算した図の寸法と一致することを検証する。
+    - 凡例がサブプロットの右に収まり、凡例の方が高い場合は図が凡例の高さまで広がることを検証する。
+    - 未知のレイアウトを指定するとValueErrorになることを検証する。
+    """
+    import matplotlib.image as mpimg
+
+    accounts = [(f"{100000000000 + i:012d}", f"アカウント {i}") for i in range(5)]
+    services = ["AmazonEC2", "AWSLambda", "AmazonS3", "AmazonRDS", "AmazonDynamoDB"]
+    base_date = datetime.now()
+    rows = []
+    for i in range(14):
+        date = (base_date - timedelta(days=13-i)).strftime("%Y-%m-%d")
+        for j, (aid, _) in enumerate(accounts):
+            for k, service in enumerate(services):
+                rows.append((date, aid, service, 10.0 * (k + 1) + i + j))
+
+    output_dir = os.path.join(os.path.dirname(__file__), "output")
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = plot_graph(rows, accounts, os.path.join(output_dir, "test_cost_graph_fixed.png"), layout="fixed")
+
+    # 5アカウントは3行2列、凡例はサービス5件
+    geometry = _fixed_layout(3, 2, [SERVICE_LABEL_MAP[s][0] for s in services], 10)
+    width, height = geometry["figsize"]
+    assert mpimg.imread(output_path).shape[:2] == (int(height * 100), int(width * 100))
+    params = geometry["subplot_params"]
+    assert 0 < params["left"] < params["right"] < geometry["legend_anchor"][0] < 1
+    assert 0 < params["bottom"] < params["top"] < 1
+
+    # 凡例の項目が多い1アカウントのグラフは、凡例に合わせて高くなる
+    tall = _fixed_layout(1, 1, [f"サービス {i}" for i in range(40)], 10)
+    assert tall["figsize"][1] > 4 * 1.5
+    assert tall["subplot_params"]["bottom"] > 0.3
+
+    with pytest.raises(ValueError):
+        plot_graph(rows, accounts, os.path.join(output_dir, "test_cost_graph_unknown.png"), layout="unknown")
+
+def test_plot_graph_pages():
+    """
+    テスト内容:
+    アカウント数の多いグループを複数ページのグラフに分けられるかテストします。
+    - アカウントが最少のページ数に均等に分けられることを検証する。
+    - ページごとの画像ファイルが連番で出力され、全ページに同じ凡例（グループ全体のサービス）が描かれることを検証する。
+    - ページ数の上限を指定しない場合は1ページになることを検証する。
+    - 集計済みの結果を渡した場合も同じ画像になることを検証する。
+    """
+    import matplotlib.image as mpimg
+
+    accounts = [(f"{100000000000 + i:012d}", f"アカウント {i}") for i in range(14)]
+    assert [len(page) for page in paginate_accounts(accounts, 12)] == [7, 7]
+    assert [len(page) for page in paginate_accounts(accounts[:13], 12)] == [7, 6]
+    assert [len(page) for page in paginate_accounts(accounts * 7, 12)] == [11] * 8 + [10]
+    assert paginate_accounts(accounts, 0) == [accounts]
+
+    # 2ページ目のアカウントは3つのサービスしか使わないが、凡例は全アカウントのサービスになる
+    services = ["AmazonEC2", "AWSLambda", "AmazonS3", "AmazonRDS", "AmazonDynamoDB", "AmazonECS", "AmazonEKS"]
+    base_date = datetime.now()
+    rows = []
+    for i in range(7):
+        date = (base_date - timedelta(days=6-i)).strftime("%Y-%m-%d")
+        for j, (aid, _) in enumerate(accounts):
+            rows.append((date, aid, services[j % (len(services) if j < 7 else 3)], 10.0 + i + j))
+
+    output_dir = os.path.join(os.path.dirname(__file__), "output")
+    os.makedirs(output_dir, exist_ok=True)
+    paths = plot_graph_pages(
+        rows, accounts, os.path.join(output_dir, "test_cost_graph_pages.png"), max_subplots=12, layout="fixed"
+    )
+    assert paths == [os.path.join(output_dir, f"test_cost_graph_pages_{page}.png") for page in (1, 2)]
+
+    # 7件ずつのページはどちらも4行2列のため同じ大きさになり、凡例の部分の画素が一致する
+    images = [mpimg.imread(path) for path in paths]
+    assert images[0].shape == images[1].shape
+    geometry = _fixed_layout(4, 2, [SERVICE_LABEL_MAP[s][0] for s in services], 10)
+    legend_x = int(geometry["legend_anchor"][0] * images[0].shape[1])
+    assert (images[0][:, legend_x:] == images[1][:, legend_x:]).all()
+
+    single = plot_graph_pages(rows, accounts, os.path.join(output_dir, "test_cost_graph_single.png"))
+    assert single == [os.path.join(output_dir, "test_cost_graph_single.png")]
+
+    # 集計済みの結果（chart_fingerprintと共有するもの）を渡しても同じ画像になる
+    aggregated = aggregate_records(rows, accounts, 8)
+    assert plot_graph_pages(rows, accounts, max_subplots=12, layout="fixed", aggregated=aggregated) == [
+        plot_graph_pages(rows, accounts, max_subplots=12, layout="fixed")[page] for page in (0, 1)
+    ]
+
+def test_aggregate_series():
+    """
+    テスト内容:
+    plot_graphの集計（_aggregate）が、全体のサービス順序とアカウントごとの積み上げる系列を正しく求めるかテストします。
+    - 日次の最大値の降順で並び、同じ値の場合はサービス名の順になることを検証する。
+    - 上位N件以外のサービスがOthersに合算され、積み上げの下端と日次合計の最大値が求まることを検証する。
+    - 日付として読めない行と対象外のアカウントの行が無視されることを検証する。
+    """
+    rows = [
+        ["2025-05-01", "111111111111", "AmazonS3", 2.0],
+        ["2025-05-01", "111111111111", "AmazonEC2", 2.0],
+        ["2025-05-01", "111111111111", "AWSLambda", 1.0],
+        ["2025-05-02", "111111111111", "AmazonEC2", 3.0],
+        ["2025-05-02", "111111111111", "AmazonEC2", 1.0],  # 同じ日付・サービスは合算する
+        ["2025-05-02", "111111111111", "AmazonSNS", 0.5],
+        ["", "111111111111", "AmazonRDS", 100.0],
+        ["2025-05-02", "222222222222", "AmazonRDS", 100.0],
+    ]
+
+    order, series = _aggregate(CurRecords(rows), ["111111111111"], 2)
+
+    assert order == ["AmazonEC2", "AmazonS3", "AWSLambda", "AmazonSNS"]
+    account = series["111111111111"]
+    assert account["dates"] == [datetime(2025, 5, 1), datetime(2025, 5, 2)]
+    assert account["services"] == ["AmazonEC2", "AmazonS3", OTHERS]
+    assert account["values"].tolist() == [[2.0, 4.0], [2.0, 0.0], [1.0, 0.5]]
+    assert account["bottoms"].tolist() == [[0.0, 0.0], [2.0, 4.0], [4.0, 4.0]]
+    assert account["max_total"] == 5.0
+    # リストで渡した場合も同じ結果になる
+    list_order, list_series = _aggregate(rows, ["111111111111"], 2)
+    assert list_order == order
+    assert list_series["111111111111"]["values"].tolist() == account["values"].tolist()
+    # 同じ値の場合は、現れた順ではなくサービス名の順（CurDAOの上位N件のクエリと同じ）
+    tie_rows = [
+        ["2025-05-01", "111111111111", "AmazonSNS", 0.0],
+        ["2025-05-01", "111111111111", "AmazonEC2", 1.0],
+        ["2025-05-01", "111111111111", "AWSLambda", 0.0],
+    ]
+    tie_order, tie_series = _aggregate(tie_rows, ["111111111111"], 2)
+    assert tie_order == ["AmazonEC2", "AWSLambda", "AmazonSNS"]
+    assert tie_series["111111111111"]["services"] == ["AmazonEC2", "AWSLambda", OTHERS]
+
+def test_service_config_cache_up_to_date():
+    """
+    テスト内容:
+    起動時に読み込まれる services.json が services.yml と一致していることをテストします。
+    失敗した場合は python budget_falcon/graph_plotter.py で services.json を再生成してください。
+    """
+    with open(service_config_path, "rb") as f:
+        source = f.read()
+    with open(service_config_cache_path, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+
+    assert cache["source_sha256"] == hashlib.sha256(source).hexdigest()
+    assert cache["config"] == yaml.safe_load(source)
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,66 @@
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+# Lambdaハンドラーのモジュール（main）の読み込み時間の上限（ミリ秒）
+IMPORT_TIME_BUDGET_MS: float = float(os.environ.get("IMPORT_TIME_BUDGET_MS", "200"))
+
+HANDLER_DIR: str = os.path.join(os.path.dirname(__file__), "..", "..", "budget_falcon")
+HANDLER_ENV: dict[str, str] = {
+    "GOOGLE_SPREADSHEET_ID": "test-spreadsheet",
+    "GOOGLE_SPREADSHEET_RANGE": "test-range",
+    "ATHENA_DATABASE": "test-db",
+    "ATHENA_TABLE": "test-table",
+    "ATHENA_OUTPUT_URI": "s3://test-bucket/output/",
+    "ATHENA_LINE_ITEM_TYPES": "Usage,DiscountedUsage",
+    "SLACK_TOKEN": "test-token",
+}
+
+
+def _run_in_handler_dir(*args):
+    # Lambdaと同じく budget_falcon ディレクトリをカレントにして実行する
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=HANDLER_DIR,
+        env={**os.environ, **HANDLER_ENV},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+class TestImportTime(unittest.TestCase):
+    """
+    コールドスタート時間の大部分を占めるハンドラーモジュールの読み込み時間をテストします。
+    テスト内容:
+    - test_handler_import_time_within_budget:
+        - python -X importtime で計測した main の読み込み時間（累積）が上限以内であることを検証します。
+        - .pycの生成を除外するため、一度読み込んでから3回計測した最小値で判定します。
+    - test_heavy_modules_not_loaded_at_import:
+        - main の読み込み時点では matplotlib・boto3・googleapiclient 等の重いモジュールが読み込まれないことを検証します。
+    """
+    def test_handler_import_time_within_budget(self):
+        _run_in_handler_dir("-c", "import main")
+        timings = []
+        for _ in range(3):
+            result = _run_in_handler_dir("-X", "importtime", "-c", "import main")
+            match = re.search(r"^import time:\s+\d+ \|\s+(\d+) \| main$", result.stderr, re.MULTILINE)
+            self.assertIsNotNone(match, result.stderr[-2000:])
+            timings.append(int(match.group(1)) / 1000)
+        import_time_ms = min(timings)
+        print(f"\nmain import time: {import_time_ms:.1f} ms (budget: {IMPORT_TIME_BUDGET_MS:.0f} ms)")
+        self.assertLessEqual(import_time_ms, IMPORT_TIME_BUDGET_MS)
+
+    def test_heavy_modules_not_loaded_at_import(self):
+        heavy_modules = ["matplotlib", "numpy", "boto3", "googleapiclient", "google.auth", "slack_sdk", "yaml", "pytz"]
+        result = _run_in_handler_dir(
+            "-c",
+            "import sys, main; print(','.join(m for m in %r if m in sys.modules))" % (heavy_modules,),
+        )
+        self.assertEqual(result.stdout.strip(), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+# mainはLambdaと同じくフラットなモジュールとして読み込む
+HANDLER_DIR: str = os.path.join(os.path.dirname(__file__), "..", "..", "budget_falcon")
+HANDLER_ENV: dict[str, str] = {
+    "GOOGLE_SPREADSHEET_ID": "test-spreadsheet",
+    "GOOGLE_SPREADSHEET_RANGE": "test-range",
+    "ATHENA_DATABASE": "test-db",
+    "ATHENA_TABLE": "test-table",
+    "ATHENA_OUTPUT_URI": "s3://test-bucket/output/",
+    "ATHENA_LINE_ITEM_TYPES": "Usage,DiscountedUsage",
+    "SLACK_TOKEN": "test-token",
+}
+
+with patch.dict(os.environ, HANDLER_ENV):
+    sys.path.insert(0, os.path.abspath(HANDLER_DIR))
+    import main
+    from clients import ClientRegistry
+    from cur_records import CurRecords
+    from object_store import LocalObjectStore
+
+
+class FakeContext:
+    # 描画のたびに時間が進むLambdaのコンテキスト
+    def __init__(self, remaining_ms: int) -> None:
+        self.remaining_ms: int = remaining_ms
+
+    def get_remaining_time_in_millis(self) -> int:
+        return self.remaining_ms
+
+
+class TestProcessGroups(unittest.TestCase):
+    """
+    取得・描画・投稿のパイプラインで、Lambdaの残り時間によりグループを継続実行に回す処理（process_groups）をテストします。
+    テスト内容:
+    - test_deadline_hands_unposted_groups_to_continuation:
+        - 描画に時間がかかり残り時間が予約時間を下回ると、以降のグループは描画・投稿されずに継続実行に回されることを検証します。
+        - 残り時間が尽きるまで処理が続かないことを確認します。
+        - 全グループを1回で取得するバッチモードと、グループごとに取得するモードの両方で確認します。
+    - test_run_metrics_only_with_queries:
+        - 実行ごとのクエリのメトリクスは、この実行でクエリを読み込んだ場合だけ出力されることを検証します。
+    - test_per_group_queries_start_up_front:
+        - グループごとに取得する場合、全グループのクエリが先に開始され、まとめて状態確認されることを検証します。
+    - test_render_aggregates_once:
+        - グラフのキャッシュを使う場合、グラフのキーを求めた集計が描画にも渡され、グループごとの集計が1回になることを検証します。
+    """
+    def setUp(self):
+        self.groups = [
+            {
+                "name": f"Project {i}",
+                "target_channel": f"C1234567890{i}",
+                "accounts": [(f"12345678901{i}", f"dev-{i}")],
+            }
+            for i in range(6)
+        ]
+
+    def _run(self, batch_fetch, remaining_ms=330_000, query_log=(), chart_cache_uri=""):
+        context = FakeContext(remaining_ms)
+        lowest_remaining = [context.remaining_ms]
+        queries_at_render = []
+        render_kwargs = []
+
+        posted = threading.Semaphore(0)
+        rendered = [0]
+
+        def render(records, **kwargs):
+            # 実際の描画と同じく、前のグループの投稿が始まってから時間が進むようにする
+            if rendered[0] > 0:
+                posted.acquire(timeout=5)
+            rendered[0] += 1
+            render_kwargs.append(kwargs)
+            queries_at_render.append(cur_dao.fetch_async.call_count)
+            context.remaining_ms -= 100_000
+            lowest_remaining[0] = min(lowest_remaining[0], context.remaining_ms)
+            return [b"\x89PNG"]
+
+        def post_file(*args, **kwargs):
+            posted.release()
+            return True
+
+        cur_dao = MagicMock()
+        cur_dao.fetch_groups.side_effect = lambda groups: [CurRecords() for _ in groups]
+        cur_dao.fetch_async.side_effect = lambda account_ids: MagicMock(result=lambda: CurRecords())
+        cur_dao.pop_query_log.return_value = list(query_log)
+        slack_client = MagicMock()
+        slack_client.post_file.side_effect = post_file
+        dispatcher = MagicMock()
+        emit_query_metrics = MagicMock()
+
+        with patch.multiple(
+            main,
+            CLIENTS=ClientRegistry(),
+            BATCH_FETCH=batch_fetch,
+            FETCH_WORKERS=1,
+            RENDER_PROCESSES=1,
+            DEADLINE_RESERVE_SECONDS=120,
+            CHART_CACHE_URI=chart_cache_uri,
+            plot_graph_pages=render,
+            _cur_dao=lambda: cur_dao,
+            SlackClient=lambda token: slack_client,
+            METRICS_NAMESPACE="BudgetFalcon",
+            emit_query_metrics=emit_query_metrics,
+        ):
+            main.process_groups(self.groups, context, dispatcher)
+        return SimpleNamespace(
+            slack_client=slack_client,
+            dispatcher=dispatcher,
+            lowest_remaining=lowest_remaining[0],
+            emit_query_metrics=emit_query_metrics,
+            queries_at_render=queries_at_render,
+            render_kwargs=render_kwargs,
+        )
+
+    def test_deadline_hands_unposted_groups_to_continuation(self):
+        for batch_fetch in (True, False):
+            with self.subTest(batch_fetch=batch_fetch):
+                run = self._run(batch_fetch)
+
+                # 330秒から1件100秒の描画で、予約時間120秒を下回る前に投稿できるのは2件
+                posted = [c.args[0] for c in run.slack_client.post_file.call_args_list]
+                self.assertEqual(posted, ["C12345678900", "C12345678901"])
+                self.assertGreater(run.lowest_remaining, 0)
+
+                run.dispatcher.dispatch.assert_called_once()
+                event = run.dispatcher.dispatch.call_args.args[0]
+                self.assertEqual(event["depth"], 1)
+                self.assertEqual([g["name"] for g in event["groups"]], [f"Project {i}" for i in range(2, 6)])
+
+    def test_run_metrics_only_with_queries(self):
+        # 全てキャッシュから返した場合は、0ばかりの行を出力しない
+        run = self._run(True, remaining_ms=10_000_000)
+        self.assertEqual(run.slack_client.post_file.call_count, 6)
+        run.dispatcher.dispatch.assert_not_called()
+        run.emit_query_metrics.assert_not_called()
+
+        stats = {"query_execution_id": "query-1", "data_scanned_bytes": 1024}
+        run = self._run(True, remaining_ms=10_000_000, query_log=[stats])
+        run.emit_query_metrics.assert_called_once_with("BudgetFalcon", [stats])
+
+    def test_per_group_queries_start_up_front(self):
+        run = self._run(False, remaining_ms=10_000_000)
+        # 取得ステージの並列数によらず、最初の描画の前に全グループのクエリが開始されている
+        self.assertEqual(run.queries_at_render[0], 6)
+        self.assertEqual(run.slack_client.post_file.call_count, 6)
+
+    def test_render_aggregates_once(self):
+        aggregated = []
+        main_aggregate_records = main.aggregate_records
+
+        def aggregate_records(*args, **kwargs):
+            aggregated.append(main_aggregate_records(*args, **kwargs))
+            return aggregated[-1]
+
+        with tempfile.TemporaryDirectory() as base_dir:
+            with patch.object(main, "aggregate_records", aggregate_records):
+                run = self._run(False, remaining_ms=10_000_000, chart_cache_uri=os.path.join(base_dir, "chart-cache"))
+
+        # グラフのキーを求めた集計が、そのまま描画に渡される
+        self.assertEqual(len(aggregated), 6)
+        self.assertEqual(len(run.render_kwargs), 6)
+        for expected, kwargs in zip(aggregated, run.render_kwargs):
+            self.assertIs(kwargs["aggregated"], expected)
+
+        # キャッシュを使わない場合は描画側で集計する
+        run = self._run(False, remaining_ms=10_000_000)
+        self.assertEqual([kwargs["aggregated"] for kwargs in run.render_kwargs], [None] * 6)
+
+
+class TestRefreshRollup(unittest.TestCase):
+    """
+    ロールアップテーブルの更新（_refresh_rollup）をテストします。
+    テスト内容:
+    - test_rollup_query_metrics:
+        - ロールアップのUNLOADのスキャン量などの統計が、ロールアップのメトリクスとして出力されることを検証します。
+        - グループを処理しないfanoutモードのコーディネーターでも出力されるよう、クエリのログから取り出されることを確認します。
+    """
+    @patch("boto3.client")
+    def test_rollup_query_metrics(self, mock_boto3):
+        mock_athena = MagicMock()
+        mock_boto3.return_value = mock_athena
+        mock_athena.start_query_execution.return_value = {"QueryExecutionId": "unload-1"}
+        mock_athena.batch_get_query_execution.return_value = {"QueryExecutions": [{
+            "QueryExecutionId": "unload-1",
+            "Status": {"State": "SUCCEEDED"},
+            "Statistics": {"DataScannedInBytes": 2048, "EngineExecutionTimeInMillis": 900},
+        }]}
+
+        with tempfile.TemporaryDirectory() as base_dir:
+            store = LocalObjectStore(base_dir)
+            dao = main.CurDAO({**main.CUR_DAO_PARAMS, "AWS_REGION": "ap-northeast-1"})
+            emit_query_metrics = MagicMock()
+            with patch.multiple(
+                main,
+                CLIENTS=ClientRegistry(),
+                ROLLUP_URI="s3://bucket/rollup/",
+                _cur_dao=lambda: dao,
+                _object_store=lambda: store,
+                METRICS_NAMESPACE="BudgetFalcon",
+                emit_query_metrics=emit_query_metrics,
+            ):
+                main._refresh_rollup()
+            dao.close()
+
+        emit_query_metrics.assert_called_once()
+        namespace, queries, dimensions = emit_query_metrics.call_args.args
+        self.assertEqual(namespace, "BudgetFalcon")
+        self.assertEqual(dimensions, {"Stage": "Rollup"})
+        self.assertEqual([stats["query_execution_id"] for stats in queries], ["unload-1"])
+        self.assertEqual(queries[0]["data_scanned_bytes"], 2048)
+        self.assertEqual(queries[0]["result_rows"], 0)
+        self.assertEqual(dao.pop_query_log(), [])
+
+
+class TestCacheLocation(unittest.TestCase):
+    """
+    キャッシュの保存先（S3のURIかローカルのディレクトリ）の解決をテストします。
+    テスト内容:
+    - test_cost_cache_in_local_directory:
+        - コストのキャッシュも、他のキャッシュと同じくローカルのディレクトリを保存先にできることを検証します。
+    """
+    def test_cost_cache_in_local_directory(self):
+        with tempfile.TemporaryDirectory() as base_dir:
+            with patch.multiple(main, CLIENTS=ClientRegistry(), COST_CACHE_URI=os.path.join(base_dir, "cost-cache")):
+                cost_cache = main._cost_cache()
+
+            self.assertIsInstance(cost_cache.store, LocalObjectStore)
+            self.assertEqual(cost_cache.store.base_dir, base_dir)
+            self.assertEqual(cost_cache.prefix_uri, "s3://cost-cache")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import json
+import unittest
+from budget_falcon.metrics import emf_line, emit_query_metrics
+
+
+def _stats(query_execution_id, scanned, reused=False):
+    return {
+        "query_execution_id": query_execution_id,
+        "data_scanned_bytes": scanned,
+        "engine_execution_ms": 1200,
+        "queue_ms": 100,
+        "planning_ms": 50,
+        "result_reused": reused,
+        "poll_seconds": 1.5,
+        "read_seconds": 0.25,
+        "result_pages": 2,
+        "result_rows": 1500,
+    }
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    CloudWatch Embedded Metric Format (EMF) でのメトリクス出力をテストします。
+    テスト内容:
+    - test_emf_line_format:
+        - 名前空間・ディメンション・メトリクスの単位が _aws に、値とディメンションとプロパティが最上位に出力されることを検証します。
+    - test_emit_query_metrics_totals:
+        - 複数クエリの統計が合計され、クエリ数とクエリIDも出力されることを検証します。
+        - ディメンションを指定しない場合は、ディメンションのないメトリクス（実行全体の合計）になることを確認します。
+    """
+    def test_emf_line_format(self):
+        line = json.loads(emf_line(
+            "BudgetFalcon",
+            {"Group": "team-a"},
+            {"DataScannedBytes": (1024, "Bytes")},
+            properties={"QueryExecutionIds": ["query-1"]},
+            timestamp=1747700000.5,
+        ))
+
+        self.assertEqual(line["_aws"], {
+            "Timestamp": 1747700000500,
+            "CloudWatchMetrics": [{
+                "Namespace": "BudgetFalcon",
+                "Dimensions": [["Group"]],
+                "Metrics": [{"Name": "DataScannedBytes", "Unit": "Bytes"}],
+            }],
+        })
+        self.assertEqual(line["Group"], "team-a")
+        self.assertEqual(line["DataScannedBytes"], 1024)
+        self.assertEqual(line["QueryExecutionIds"], ["query-1"])
+
+    def test_emit_query_metrics_totals(self):
+        line = json.loads(emit_query_metrics(
+            "BudgetFalcon", [_stats("query-1", 1000), _stats("query-2", 0, reused=True)]
+        ))
+
+        self.assertEqual(line["_aws"]["CloudWatchMetrics"][0]["Dimensions"], [[]])
+        self.assertEqual(line["Queries"], 2)
+        self.assertEqual(line["DataScannedBytes"], 1000)
+        self.assertEqual(line["ReusedResults"], 1)
+        self.assertEqual(line["PollTime"], 3.0)
+        self.assertEqual(line["ResultPages"], 4)
+        self.assertEqual(line["QueryExecutionIds"], ["query-1", "query-2"])
+
+
+if __name__ == '__main__':
+    unittest.main()
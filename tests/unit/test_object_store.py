@@ -0,0 +1,79 @@
+import io
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+from budget_falcon.object_store import LocalObjectStore, S3ObjectStore, parse_s3_uri
+
+
+class TestObjectStore(unittest.TestCase):
+    """
+    S3 URIでオブジェクトを読み書きするオブジェクトストアをテストします。
+    テスト内容:
+    - test_parse_s3_uri:
+        - S3 URIがバケットとキーに分割され、S3 URIでない場合は例外になることを検証します。
+    - test_local_store_round_trip:
+        - LocalObjectStoreで書き込んだオブジェクトを読み込み、一覧・行単位の読み込み・コピー・削除ができることを検証します。
+    - test_local_store_concurrent_put:
+        - 複数のスレッドが同じキーに書き込んでも内容が混ざらず、一時ファイルが残らないことを検証します。
+    - test_s3_store_iter_lines:
+        - S3ObjectStoreがget_objectのレスポンスを行単位でデコードして返し、読み終えたらBodyを閉じることを検証します。
+    """
+    def test_parse_s3_uri(self):
+        self.assertEqual(parse_s3_uri("s3://bucket/athena/query-1.csv"), ("bucket", "athena/query-1.csv"))
+        self.assertEqual(parse_s3_uri("s3://bucket"), ("bucket", ""))
+        with self.assertRaises(ValueError):
+            parse_s3_uri("/tmp/query-1.csv")
+
+    def test_local_store_round_trip(self):
+        with tempfile.TemporaryDirectory() as base_dir:
+            store = LocalObjectStore(base_dir)
+            store.put("s3://bucket/athena/query-1.csv", '"date","cost"\n"2025-05-15","1.5"\n'.encode("utf-8"))
+            store.put("s3://bucket/other/query-2.csv", b"x")
+
+            self.assertEqual(store.get("s3://bucket/athena/query-1.csv")[:6], b'"date"')
+            self.assertEqual(store.list("s3://bucket/athena/"), ["s3://bucket/athena/query-1.csv"])
+            self.assertEqual(
+                list(store.iter_lines("s3://bucket/athena/query-1.csv")),
+                ['"date","cost"\n', '"2025-05-15","1.5"\n'],
+            )
+
+            store.copy("s3://bucket/other/query-2.csv", "s3://bucket/copied/query-2.csv")
+            self.assertEqual(store.get("s3://bucket/copied/query-2.csv"), b"x")
+
+            store.delete("s3://bucket/athena/query-1.csv")
+            self.assertEqual(store.list("s3://bucket/athena/"), [])
+            with self.assertRaises(FileNotFoundError):
+                store.get("s3://bucket/athena/query-1.csv")
+
+    def test_local_store_concurrent_put(self):
+        with tempfile.TemporaryDirectory() as base_dir:
+            store = LocalObjectStore(base_dir)
+            payloads = [bytes([i]) * 256 * 1024 for i in range(8)]
+            threads = [
+                threading.Thread(target=store.put, args=("s3://bucket/charts/chart.png", payload))
+                for payload in payloads
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertIn(store.get("s3://bucket/charts/chart.png"), payloads)
+            self.assertEqual(store.list("s3://bucket/charts/"), ["s3://bucket/charts/chart.png"])
+
+    def test_s3_store_iter_lines(self):
+        client = MagicMock()
+        body = io.BytesIO('"service"\n"Amazon EC2 – Compute"\n'.encode("utf-8"))
+        client.get_object.return_value = {"Body": body}
+        store = S3ObjectStore(client)
+
+        lines = list(store.iter_lines("s3://bucket/athena/query-1.csv"))
+
+        self.assertEqual(lines, ['"service"\n', '"Amazon EC2 – Compute"\n'])
+        client.get_object.assert_called_once_with(Bucket="bucket", Key="athena/query-1.csv")
+        self.assertTrue(body.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,159 @@
+import threading
+import time
+import unittest
+from budget_falcon.pipeline import Pipeline, NOT_STARTED
+
+
+class TestPipeline(unittest.TestCase):
+    """
+    ステージごとに並列数を制限したパイプライン実行（Pipeline）をテストします。
+    テスト内容:
+    - test_run_passes_outputs_between_stages:
+        - 各ステージの出力が次のステージの入力になり、最終結果が入力順に返ることを検証します。
+    - test_stages_overlap:
+        - あるアイテムの後段の処理中に、次のアイテムの前段の処理が並行して実行されることを検証します。
+    - test_max_workers_per_stage:
+        - 各ステージの同時実行数が指定した上限を超えないことを検証します。
+    - test_slow_stage_holds_back_upstream:
+        - 後段が詰まっている間は前段が次のアイテムを処理せず、後段の前にアイテムが溜まらないことを検証します。
+    - test_error_isolated_to_item:
+        - 途中のステージで例外が発生したアイテムだけが後段から除外され、エラーハンドラに通知されることを検証します。
+    - test_can_start_stops_remaining_items:
+        - 開始判定がFalseになった以降のアイテムは開始されず、NOT_STARTEDが返ることを検証します。
+    - test_can_start_checked_before_each_stage:
+        - 前段を終えたアイテムも、後段に入る時点で開始判定がFalseならNOT_STARTEDになることを検証します。
+    """
+    def test_run_passes_outputs_between_stages(self):
+        pipeline = Pipeline([
+            ("double", lambda x: x * 2, 2),
+            ("increment", lambda x: x + 1, 2),
+        ])
+        results = pipeline.run([1, 2, 3, 4])
+        self.assertEqual(results, [3, 5, 7, 9])
+
+    def test_stages_overlap(self):
+        second_started = threading.Event()
+        overlapped = threading.Event()
+
+        def first(x):
+            if x == 1:
+                # 1つ目のアイテムが後段に入ってから2つ目の前段を実行する
+                if second_started.wait(timeout=5):
+                    overlapped.set()
+            return x
+
+        def second(x):
+            if x == 0:
+                second_started.set()
+                overlapped.wait(timeout=5)
+            return x
+
+        results = Pipeline([("first", first, 1), ("second", second, 1)]).run([0, 1])
+        self.assertEqual(results, [0, 1])
+        self.assertTrue(overlapped.is_set())
+
+    def test_max_workers_per_stage(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def tracked(x):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            return x
+
+        results = Pipeline([("limited", tracked, 3)]).run(list(range(20)))
+        self.assertEqual(results, list(range(20)))
+        self.assertLessEqual(peak[0], 3)
+
+    def test_slow_stage_holds_back_upstream(self):
+        started = []
+        release = threading.Event()
+
+        def fetch(x):
+            started.append(x)
+            return x
+
+        def render(x):
+            release.wait(timeout=5)
+            return x
+
+        results = []
+        pipeline = Pipeline([("fetch", fetch, 1), ("render", render, 1)])
+        runner = threading.Thread(target=lambda: results.extend(pipeline.run(list(range(10)))))
+        runner.start()
+        time.sleep(0.2)
+        # 描画中の1件と、描画の空きを待つ1件だけが取得済みになる
+        self.assertEqual(started, [0, 1])
+        release.set()
+        runner.join(timeout=5)
+        self.assertEqual(results, list(range(10)))
+
+    def test_error_isolated_to_item(self):
+        errors = []
+        uploaded = []
+
+        def fetch(x):
+            if x == 2:
+                raise RuntimeError("query failed")
+            return x
+
+        def upload(x):
+            uploaded.append(x)
+            return x
+
+        pipeline = Pipeline(
+            [("fetch", fetch, 2), ("upload", upload, 1)],
+            on_error=lambda item, stage, e: errors.append((item, stage, str(e))),
+        )
+        results = pipeline.run([1, 2, 3])
+
+        self.assertEqual(results, [1, None, 3])
+        self.assertEqual(sorted(uploaded), [1, 3])
+        self.assertEqual(errors, [(2, "fetch", "query failed")])
+
+    def test_can_start_stops_remaining_items(self):
+        started = []
+        budget = [2]
+
+        def can_start():
+            budget[0] -= 1
+            return budget[0] >= 0
+
+        def fetch(x):
+            started.append(x)
+            return x
+
+        results = Pipeline([("fetch", fetch, 1)]).run([1, 2, 3, 4], can_start=can_start)
+
+        self.assertEqual(started, [1, 2])
+        self.assertEqual(results[:2], [1, 2])
+        self.assertIs(results[2], NOT_STARTED)
+        self.assertIs(results[3], NOT_STARTED)
+
+    def test_can_start_checked_before_each_stage(self):
+        rendered = []
+        clock = [0]
+
+        def render(x):
+            # 描画1件ごとに時間が進み、2件目の描画後に期限を過ぎる
+            rendered.append(x)
+            clock[0] += 1
+            return x
+
+        results = Pipeline([("fetch", lambda x: x, 2), ("render", render, 1)]).run(
+            [1, 2, 3, 4], can_start=lambda: clock[0] < 2
+        )
+
+        self.assertEqual(rendered, [1, 2])
+        self.assertEqual(results[:2], [1, 2])
+        self.assertIs(results[2], NOT_STARTED)
+        self.assertIs(results[3], NOT_STARTED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+from budget_falcon.graph_plotter import plot_graph, preload
+from budget_falcon.render_pool import RenderPool
+
+
+def _write_text(text, output_path):
+    with open(output_path, "w", encoding="utf-8") as f:
+        f.write(f"{text}:{os.getpid()}")
+    return output_path
+
+
+def _fail(message):
+    raise ValueError(message)
+
+
+class TestRenderPool(unittest.TestCase):
+    """
+    ワーカープロセスでグラフを描画するプロセスプール（RenderPool）をテストします。
+    テスト内容:
+    - test_render_returns_paths:
+        - 複数のタスクがワーカープロセスで実行され、出力パスが返ることを検証します。
+    - test_render_returns_bytes:
+        - return_bytes指定時に、実際のplot_graphの出力がPNGのバイト列として返り、ファイルが削除されることを検証します。
+    - test_render_in_memory:
+        - 出力パスを指定しないplot_graphの描画結果が、ファイルを介さずにPNGのバイト列として返ることを検証します。
+    - test_render_error_propagates:
+        - ワーカー内の例外が呼び出し元に伝わり、その後のタスクも実行できることを検証します。
+    """
+    def setUp(self):
+        self.output_dir = os.path.join(os.path.dirname(__file__), "output")
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def test_render_returns_paths(self):
+        with RenderPool(2, _write_text) as pool:
+            futures = [
+                pool.submit(f"chart{i}", os.path.join(self.output_dir, f"test_render_pool_{i}.txt"))
+                for i in range(4)
+            ]
+            paths = [future.result(timeout=30) for future in futures]
+
+        for i, path in enumerate(paths):
+            with open(path, encoding="utf-8") as f:
+                text, pid = f.read().split(":")
+            self.assertEqual(text, f"chart{i}")
+            # 描画は親プロセス以外で行われる
+            self.assertNotEqual(int(pid), os.getpid())
+            os.remove(path)
+
+    def test_render_returns_bytes(self):
+        date = datetime.now().strftime("%Y-%m-%d")
+        prev_date = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+        records = [
+            (prev_date, "123456789012", "AmazonEC2", 10.0),
+            (date, "123456789012", "AmazonEC2", 12.0),
+            (date, "123456789012", "AmazonS3", 3.0),
+        ]
+        output_path = os.path.join(self.output_dir, "test_render_pool_chart.png")
+
+        with RenderPool(1, plot_graph, initializer=preload, return_bytes=True) as pool:
+            data = pool.render(
+                records,
+                accounts=[("123456789012", "Test Account")],
+                output_path=output_path,
+                top_n_services=5,
+            )
+
+        self.assertTrue(data.startswith(b"\x89PNG"))
+        self.assertFalse(os.path.exists(output_path))
+
+    def test_render_in_memory(self):
+        date = datetime.now().strftime("%Y-%m-%d")
+        records = [(date, "123456789012", "AmazonEC2", 12.0)]
+
+        with RenderPool(1, plot_graph, initializer=preload) as pool:
+            data = pool.render(records, accounts=[("123456789012", "Test Account")], top_n_services=5)
+
+        self.assertIsInstance(data, bytes)
+        self.assertTrue(data.startswith(b"\x89PNG"))
+
+    def test_render_error_propagates(self):
+        with RenderPool(1, _fail) as pool:
+            with self.assertRaises(ValueError) as cm:
+                pool.render("broken chart")
+            self.assertEqual(str(cm.exception), "broken chart")
+            with self.assertRaises(ValueError):
+                pool.render("still running")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+from datetime import date
+from budget_falcon.cur_records import CurRecords
+from budget_falcon.object_store import LocalObjectStore
+from budget_falcon.result_cache import ResultCache, fingerprint
+
+SCOPE = ["test-db", "test-table", "DiscountedUsage", "Usage"]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(unittest.TestCase):
+    """
+    クエリ結果のキャッシュ（ResultCache）をテストします。
+    テスト内容:
+    - test_round_trip_and_fingerprint:
+        - 保存した結果（service_maxを含む）がそのまま読み込めることを検証します。
+        - アカウントIDの順序や重複・空白はキーに影響せず、日数や実行日が異なる場合は別のキーになることを確認します。
+    - test_expired_result_is_not_returned:
+        - TTLを過ぎた結果は返されず、次の保存時に削除されることを検証します。
+    - test_evicts_least_recently_used:
+        - 合計サイズが上限を超えた場合、最後に読まれたのが最も古い結果から削除されることを検証します。
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocalObjectStore(self.tmp.name)
+        self.clock = FakeClock()
+        self.records = CurRecords([
+            ("2025-05-15", "123456789012", "AmazonEC2", 1.5),
+            ("2025-05-15", "123456789012", "AmazonS3", 0.25),
+            ("2025-05-16", "234567890123", "AmazonEC2", 2.0),
+        ])
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _cache(self, **kwargs):
+        return ResultCache(self.store, "s3://result-cache/", clock=self.clock, **kwargs)
+
+    def test_round_trip_and_fingerprint(self):
+        today = date(2025, 5, 20)
+        key = fingerprint(["234567890123", "123456789012"], SCOPE, 14, today=today)
+        self.assertEqual(key, fingerprint([" 123456789012", "234567890123", "123456789012"], SCOPE, 14, today=today))
+        self.assertNotEqual(key, fingerprint(["123456789012", "234567890123"], SCOPE, 7, today=today))
+        self.assertNotEqual(key, fingerprint(["123456789012", "234567890123"], SCOPE, 14, today=date(2025, 5, 21)))
+
+        self.records.service_max = {"123456789012": {"AmazonEC2": 1.5, "AmazonS3": 0.25}}
+        cache = self._cache()
+        self.assertIsNone(cache.get(key))
+        cache.put(key, self.records)
+
+        # 別のインスタンス（別のLambdaの実行）からも読み込める
+        cached = self._cache().get(key)
+        self.assertEqual(cached, self.records)
+        self.assertEqual(cached.service_max, self.records.service_max)
+
+    def test_expired_result_is_not_returned(self):
+        cache = self._cache(ttl_seconds=60)
+        cache.put("old", self.records)
+        self.clock.now += 61
+        self.assertIsNone(cache.get("old"))
+
+        cache.put("new", self.records)
+        self.assertEqual(self.store.list("s3://result-cache/old"), [])
+        self.assertEqual(cache.get("new"), self.records)
+
+    def test_evicts_least_recently_used(self):
+        # 2件分だけ保持できる上限にする
+        size = len(self.store.get(self._probe()))
+        cache = self._cache(max_bytes=size * 2)
+        cache.put("a", self.records)
+        self.clock.now += 1
+        cache.put("b", self.records)
+        self.clock.now += 1
+        # aを読むと、bが最も古くなる
+        self.assertIsNotNone(cache.get("a"))
+        self.clock.now += 1
+        cache.put("c", self.records)
+
+        self.assertIsNotNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("c"))
+
+    def _probe(self):
+        ResultCache(self.store, "s3://probe/").put("probe", self.records)
+        return "s3://probe/probe.json"
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,126 @@
+import re
+import tempfile
+import unittest
+from concurrent.futures import Future
+from datetime import date, timedelta
+from unittest.mock import MagicMock
+from budget_falcon.object_store import LocalObjectStore
+from budget_falcon.rollup import RollupBuilder
+
+
+def _unload(store, query, error=None):
+    # UNLOADの代わりに、出力先に日付ごとのparquetのファイルを書き込む
+    if not error:
+        location = re.search(r"TO '([^']+)'", query).group(1)
+        first = date.fromisoformat(re.search(r">= timestamp '(\S+) 00:00:00'", query).group(1))
+        end = date.fromisoformat(re.search(r"< timestamp '(\S+) 00:00:00'", query).group(1))
+        for i in range((end - first).days):
+            store.put(f"{location}date={first + timedelta(days=i)}/new.parquet", b"new")
+    future = Future()
+    if error:
+        future.set_exception(error)
+    else:
+        future.set_result("query-id")
+    return future
+
+
+class TestRollupBuilder(unittest.TestCase):
+    """
+    日次のロールアップテーブルを更新するRollupBuilderをテストします。
+    テスト内容:
+    - test_first_refresh_covers_window:
+        - 初回は読み込み範囲の全日付を1つのUNLOADで一時的な出力先に日付ごとに書き出してからテーブルの日付と置き換え、確定済みの日付を記録することを検証します。
+        - UNLOADの統計がCurDAOのクエリのログに記録されることを確認します。
+        - 置き換えでは新しいファイルをコピーしてから前回のファイルを削除し、日付が空になる瞬間がないことを確認します。
+    - test_next_refresh_only_recent_days:
+        - 2回目以降は確定していない直近の日付だけを作り直すことを検証します。
+    - test_failed_refresh_keeps_state:
+        - UNLOADが失敗した場合は例外となり、確定済みの日付が更新されないことを検証します。
+        - 前回のロールアップは削除されずに残り、一時的な出力先も空になることを確認します。
+    """
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = LocalObjectStore(self.tmp.name)
+        self.dao = MagicMock()
+        self.dao.query_days_range = 14
+        self.dao.table = "cur-table"
+        self.dao.partition_filter.return_value = "AND billing_period IN ('2025-05')"
+        self.dao.engine.submit.side_effect = lambda query, reuse=True: _unload(self.store, query)
+        self.builder = RollupBuilder(self.dao, self.store, "s3://bucket/rollup/", settle_days=3)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_first_refresh_covers_window(self):
+        self.store.put("s3://bucket/rollup/date=2025-05-19/old.parquet", b"old")
+        delete = self.store.delete
+        emptied = []
+
+        def delete_live(uri):
+            # テーブルの日付のファイルを削除する時点で、新しいファイルが既にあること
+            prefix = uri[:uri.rindex("/") + 1]
+            if "/_staging/" not in uri and self.store.list(prefix) == [uri]:
+                emptied.append(uri)
+            delete(uri)
+
+        self.store.delete = delete_live
+
+        refreshed = self.builder.refresh(today=date(2025, 5, 20))
+
+        self.assertEqual(refreshed[0], "2025-05-06")
+        self.assertEqual(refreshed[-1], "2025-05-20")
+        self.assertEqual(len(refreshed), 15)
+        self.assertEqual(
+            self.store.list("s3://bucket/rollup/date=2025-05-19/"),
+            ["s3://bucket/rollup/date=2025-05-19/new.parquet"],
+        )
+        self.assertEqual(emptied, [])
+        self.assertEqual(len(self.store.list("s3://bucket/rollup/date=")), 15)
+        self.assertEqual(self.store.list("s3://bucket/rollup/_staging/"), [])
+        # 明細のスキャンは1回だけ
+        self.assertEqual(self.dao.engine.submit.call_count, 1)
+        query = self.dao.engine.submit.call_args_list[0][0][0]
+        self.assertIn("TO 's3://bucket/rollup/_staging/'", query)
+        self.assertIn("partitioned_by = ARRAY['date']", query)
+        self.assertIn("timestamp '2025-05-06 00:00:00'", query)
+        self.assertIn("timestamp '2025-05-21 00:00:00'", query)
+        self.assertIn("AND billing_period IN ('2025-05')", query)
+        self.dao.partition_filter.assert_called_once_with(14)
+        # UNLOADは結果を再利用しない
+        self.assertFalse(self.dao.engine.submit.call_args_list[0][1]["reuse"])
+        # UNLOADの統計はクエリのログに残す
+        self.dao.record_statistics.assert_called_once_with("query-id")
+        self.assertEqual(self.store.get("s3://bucket/rollup/_rollup_state.json"), b'{"settled_through": "2025-05-16"}')
+
+    def test_next_refresh_only_recent_days(self):
+        self.builder.refresh(today=date(2025, 5, 20))
+
+        refreshed = self.builder.refresh(today=date(2025, 5, 21))
+
+        self.assertEqual(refreshed, ["2025-05-17", "2025-05-18", "2025-05-19", "2025-05-20", "2025-05-21"])
+        self.assertEqual(self.store.get("s3://bucket/rollup/_rollup_state.json"), b'{"settled_through": "2025-05-17"}')
+
+    def test_failed_refresh_keeps_state(self):
+        self.builder.refresh(today=date(2025, 5, 20))
+        self.store.put("s3://bucket/rollup/date=2025-05-19/new.parquet", b"previous")
+        self.store.put("s3://bucket/rollup/_staging/date=2025-05-19/partial.parquet", b"partial")
+        self.dao.engine.submit.side_effect = lambda query, reuse=True: _unload(
+            self.store, query, Exception("Query failed: FAILED")
+        )
+
+        self.dao.record_statistics.reset_mock()
+
+        with self.assertRaises(Exception):
+            self.builder.refresh(today=date(2025, 5, 21))
+
+        self.dao.record_statistics.assert_not_called()
+        self.assertEqual(self.store.get("s3://bucket/rollup/_rollup_state.json"), b'{"settled_through": "2025-05-16"}')
+        self.assertEqual(
+            self.store.list("s3://bucket/rollup/date=2025-05-19/"),
+            ["s3://bucket/rollup/date=2025-05-19/new.parquet"],
+        )
+        self.assertEqual(self.store.get("s3://bucket/rollup/date=2025-05-19/new.parquet"), b"previous")
+        self.assertEqual(self.store.list("s3://bucket/rollup/_staging/"), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import json
+import unittest
+from unittest.mock import MagicMock
+from budget_falcon.scheduler import (
+    DeadlineScheduler,
+    LambdaDispatcher,
+    LocalDispatcher,
+    dispatch_groups,
+    group_event_state,
+    start_continuation,
+)
+
+
+class TestScheduler(unittest.TestCase):
+    """
+    Lambdaの残り実行時間による開始判定と、ワーカー・継続実行のイベント生成・分配をテストします。
+    テスト内容:
+    - test_can_start_with_remaining_time:
+        - 残り時間が予約時間を上回る間だけ開始可能と判定されることを検証します。
+        - contextがない場合（ローカル実行）は常に開始可能であることを確認します。
+    - test_continuation_round_trip:
+        - 継続実行の呼び出しが非同期で行われ、そのイベントから未処理のグループが復元できることを検証します。
+    - test_group_event_state_for_scheduled_event:
+        - スケジュール実行のイベントはグループを持つイベントとして扱われないことを検証します。
+    - test_dispatch_groups_to_local_workers:
+        - コーディネーターがグループをチャンクに分割し、ローカルのディスパッチャー経由でワーカーに渡すことを検証します。
+    """
+    def setUp(self):
+        self.groups = [
+            {
+                "name": f"Project {i}",
+                "target_channel": f"C1234567890{i}",
+                "accounts": [(f"12345678901{i}", f"dev-{i}")],
+            }
+            for i in range(5)
+        ]
+
+    def test_can_start_with_remaining_time(self):
+        context = MagicMock()
+        context.get_remaining_time_in_millis.side_effect = [120000, 60001, 60000, 1000]
+        scheduler = DeadlineScheduler(context, reserve_ms=60000)
+
+        self.assertTrue(scheduler.can_start())
+        self.assertTrue(scheduler.can_start())
+        self.assertFalse(scheduler.can_start())
+        self.assertFalse(scheduler.can_start())
+
+        self.assertTrue(DeadlineScheduler(None, reserve_ms=60000).can_start())
+
+    def test_continuation_round_trip(self):
+        lambda_client = MagicMock()
+        dispatcher = LambdaDispatcher(lambda_client, "arn:aws:lambda:ap-northeast-1:123456789012:function:test")
+
+        start_continuation(dispatcher, self.groups[:2], 2)
+
+        lambda_client.invoke.assert_called_once()
+        kwargs = lambda_client.invoke.call_args[1]
+        self.assertEqual(kwargs["FunctionName"], "arn:aws:lambda:ap-northeast-1:123456789012:function:test")
+        self.assertEqual(kwargs["InvocationType"], "Event")
+
+        # Lambdaが受け取るイベントと同じくJSONをデコードしてから復元する
+        event = json.loads(kwargs["Payload"].decode("utf-8"))
+        state = group_event_state(event)
+        self.assertEqual(state["depth"], 2)
+        self.assertEqual(state["groups"], self.groups[:2])
+
+    def test_group_event_state_for_scheduled_event(self):
+        event = {"source": "aws.events", "detail-type": "Scheduled Event", "detail": {}}
+        self.assertIsNone(group_event_state(event))
+        self.assertIsNone(group_event_state(None))
+
+    def test_dispatch_groups_to_local_workers(self):
+        processed = []
+
+        def worker(event, context):
+            state = group_event_state(event)
+            processed.append([group["name"] for group in state["groups"]])
+            # アカウントは (account_id, display_name) のタプルに復元される
+            self.assertIsInstance(state["groups"][0]["accounts"][0], tuple)
+
+        dispatcher = LocalDispatcher(worker)
+        count = dispatch_groups(dispatcher, self.groups, chunk_size=2)
+
+        self.assertEqual(count, 3)
+        self.assertEqual(processed, [
+            ["Project 0", "Project 1"],
+            ["Project 2", "Project 3"],
+            ["Project 4"],
+        ])
+        self.assertEqual([event["depth"] for event in dispatcher.events], [0, 0, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,6 +16,9 @@ class TestSlackClient(unittest.TestCase):
             異常系。チャンネル参加時にエラーが発生した場合の挙動を検証する。
             ・エラーメッセージがprintされること
             ・ファイルアップロードが実行されないこと
+        - test_post_file_bytes:
+            正常系。メモリ上の画像（バイト列）をファイルを開かずにアップロードできることを検証する。
+            ・files_upload_v2にバイト列と指定したファイル名が渡されること
         - test_post_file_upload_error:
             異常系。ファイルアップロード時にエラーが発生した場合の挙動を検証する。
             ・エラーメッセージがprintされること
@@ -27,7 +30,7 @@ class TestSlackClient(unittest.TestCase):
         self.file_path = "/tmp/test.png"
         self.title = "Test Title"
 
-    @patch('budget_falcon.slack_notice.WebClient')
+    @patch('slack_sdk.WebClient')
     def test_post_file_success(self, mock_web_client):
         # モックのWebClientインスタンスを設定
         mock_client = mock_web_client.return_value
@@ -51,7 +54,7 @@ class TestSlackClient(unittest.TestCase):
         self.assertEqual(upload_args["title"], self.title)
         self.assertEqual(upload_args["file"], mock_file.return_value)
 
-    @patch('budget_falcon.slack_notice.WebClient')
+    @patch('slack_sdk.WebClient')
     @patch('builtins.print')
     def test_post_file_channel_join_error(self, mock_print, mock_web_client):
         # モックの設定
@@ -74,7 +77,24 @@ class TestSlackClient(unittest.TestCase):
         mock_client.conversations_join.assert_called_once_with(channel=self.channel)
         mock_client.files_upload_v2.assert_not_called()
 
-    @patch('budget_falcon.slack_notice.WebClient')
+    @patch('slack_sdk.WebClient')
+    def test_post_file_bytes(self, mock_web_client):
+        mock_client = mock_web_client.return_value
+        mock_client.conversations_join.return_value = {"ok": True}
+        mock_client.files_upload_v2.return_value = {"ok": True}
+
+        with patch("builtins.open") as mock_file:
+            client = SlackClient(self.token)
+            client.post_file(self.channel, b"\x89PNG data", self.title, filename="chart_0.png")
+
+        mock_file.assert_not_called()
+        upload_args = mock_client.files_upload_v2.call_args[1]
+        self.assertEqual(upload_args["channel"], self.channel)
+        self.assertEqual(upload_args["file"], b"\x89PNG data")
+        self.assertEqual(upload_args["filename"], "chart_0.png")
+        self.assertEqual(upload_args["title"], self.title)
+
+    @patch('slack_sdk.WebClient')
     @patch('builtins.print')
     def test_post_file_upload_error(self, mock_print, mock_web_client):
         # モックの設定